@@ -0,0 +1,263 @@
+"""Offline benchmark of the ``YahooFinanceSpider`` parse callbacks
+
+Every callback parses the checked-in fixture page of its page type, freshly
+wrapped in a response on each iteration so the DOM is built every time, the
+way it is during a crawl. No browser nor network is involved.
+
+Usage, from the project root::
+
+    python -m benchmarks.parse_callbacks --iterations 200 --output baseline.json
+    python -m benchmarks.parse_callbacks --compare baseline.json
+
+The JSON results hold, per callback, the latency percentiles in milliseconds
+and the peak and retained memory allocated per call, plus the throughput of
+whole components (all the pages of one ticker) and the peak memory of a crawl
+keeping ``--in-flight`` tickers pending in the aggregator. ``--compare`` exits with
+status 1 when a median latency regressed by more than ``--threshold``.
+"""
+
+import argparse
+import gc
+import json
+import logging
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+import scrapy
+from scrapy import Request
+from scrapy.crawler import Crawler
+from scrapy.http import HtmlResponse
+from scrapy.utils.project import get_project_settings
+
+from leovendo.spiders.yahoo_finance import YahooFinanceSpider
+
+FIXTURES = Path(__file__).parent / 'fixtures'
+TICKER = 'AAPL'
+
+
+class CallbackBenchmark:
+    """Runs the parse callbacks of one engine over the fixture pages"""
+
+    def __init__(self, engine='selenium'):
+        settings = get_project_settings()
+        # the callbacks are measured without writing checkpoints
+        settings.set('CHECKPOINT_PATH', None)
+        self.spider = YahooFinanceSpider.from_crawler(Crawler(YahooFinanceSpider, settings), engine=engine)
+        self.engine = engine
+        self.pages = {}
+        for page_type, path in YahooFinanceSpider.PAGES.items():
+            fixture = 'embedded' if engine == 'http' else page_type
+            url = f"{YahooFinanceSpider.base_url}{path.format(ticker=TICKER)}"
+            self.pages[page_type] = (url, (FIXTURES / f'{fixture}.html').read_bytes())
+
+    def response(self, page_type, ticker=TICKER):
+        url, body = self.pages[page_type]
+        request = Request(url, meta={'page_type': page_type, 'ticker': ticker}, cb_kwargs={'ticker': ticker})
+        return HtmlResponse(url, body=body, encoding='utf-8', request=request)
+
+    def parse(self, page_type, ticker=TICKER):
+        """Run the callback of a page type, return the items it yielded"""
+
+        callback = getattr(self.spider, YahooFinanceSpider.CALLBACKS[page_type])
+        return list(callback(self.response(page_type, ticker), ticker=ticker))
+
+    def parse_page(self, page_type):
+        items = self.parse(page_type)
+        # keep the aggregator from completing the component across iterations
+        self.spider.aggregator.pending.clear()
+        return items
+
+    def latency(self, page_type, iterations):
+        timings = []
+        for _ in range(iterations):
+            started = time.perf_counter()
+            self.parse_page(page_type)
+            timings.append((time.perf_counter() - started) * 1000)
+        return summarize(timings)
+
+    def allocations(self, page_type, iterations):
+        peaks, retained = [], []
+        tracemalloc.start()
+        try:
+            for _ in range(iterations):
+                tracemalloc.clear_traces()
+                before, _ = tracemalloc.get_traced_memory()
+                tracemalloc.reset_peak()
+                self.parse_page(page_type)
+                _, peak = tracemalloc.get_traced_memory()
+                # responses and selectors reference each other
+                gc.collect()
+                current, _ = tracemalloc.get_traced_memory()
+                peaks.append(peak - before)
+                retained.append(current - before)
+        finally:
+            tracemalloc.stop()
+        return {
+            'peak_kib': statistics.mean(peaks) / 1024,
+            'retained_kib': statistics.mean(retained) / 1024
+        }
+
+    def components(self, iterations):
+        """Parse every page of a ticker per iteration, return the components throughput"""
+
+        items = 0
+        started = time.perf_counter()
+        for iteration in range(iterations):
+            # a ticker is only built into a component once
+            for page_type in self.pages:
+                items += len(self.parse(page_type, f"C{iteration}"))
+        elapsed = time.perf_counter() - started
+        return {
+            'items': items,
+            'seconds': elapsed,
+            'items_per_second': items / elapsed
+        }
+
+    def in_flight(self, tickers):
+        """Parse the pages of ``tickers`` tickers one page type after the other
+
+        Every ticker stays pending in the aggregator until its last page, the
+        way they do in a crawl with that many tickers in flight. Returns the
+        peak memory of the run and the memory kept per pending ticker.
+        """
+
+        page_types = list(self.pages)
+        self.spider.aggregator.pending.clear()
+        gc.collect()
+        tracemalloc.start()
+        try:
+            before, _ = tracemalloc.get_traced_memory()
+            for page_type in page_types[:-1]:
+                for number in range(tickers):
+                    self.parse(page_type, f"T{number}")
+            gc.collect()
+            pending, peak = tracemalloc.get_traced_memory()
+            items = sum(len(self.parse(page_types[-1], f"T{number}")) for number in range(tickers))
+        finally:
+            tracemalloc.stop()
+        return {
+            'tickers': tickers,
+            'items': items,
+            'peak_kib': (peak - before) / 1024,
+            'pending_kib_per_ticker': (pending - before) / tickers / 1024
+        }
+
+    def run(self, iterations, alloc_iterations, warmup, in_flight=200):
+        for page_type in self.pages:
+            for _ in range(warmup):
+                self.parse_page(page_type)
+        callbacks = {}
+        for page_type in self.pages:
+            callbacks[YahooFinanceSpider.CALLBACKS[page_type]] = {
+                'page_type': page_type,
+                'latency_ms': self.latency(page_type, iterations),
+                'memory': self.allocations(page_type, alloc_iterations)
+            }
+        return {
+            'commit': git_commit(),
+            'python': platform.python_version(),
+            'scrapy': scrapy.__version__,
+            'engine': self.engine,
+            'iterations': iterations,
+            'callbacks': callbacks,
+            'component': self.components(iterations),
+            'in_flight': self.in_flight(in_flight)
+        }
+
+
+def summarize(timings):
+    timings = sorted(timings)
+    return {
+        'mean': statistics.mean(timings),
+        'min': timings[0],
+        'p50': percentile(timings, 50),
+        'p95': percentile(timings, 95),
+        'p99': percentile(timings, 99),
+        'max': timings[-1]
+    }
+
+
+def percentile(ordered, percent):
+    return ordered[min(len(ordered) - 1, int(len(ordered) * percent / 100))]
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def report(results):
+    print(f"{results['engine']} engine, {results['iterations']} iterations, commit {results['commit']}")
+    print(f"{'callback':<24}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'peak KiB':>12}{'kept KiB':>12}")
+    for name, result in results['callbacks'].items():
+        latency, memory = result['latency_ms'], result['memory']
+        print(f"{name:<24}{latency['p50']:>10.2f}{latency['p95']:>10.2f}{latency['p99']:>10.2f}"
+              f"{memory['peak_kib']:>12.1f}{memory['retained_kib']:>12.1f}")
+    print(f"components: {results['component']['items_per_second']:.1f} items/s")
+    in_flight = results['in_flight']
+    print(f"{in_flight['tickers']} tickers in flight: peak {in_flight['peak_kib']:.1f} KiB, "
+          f"{in_flight['pending_kib_per_ticker']:.1f} KiB kept per pending ticker")
+
+
+def compare(results, baseline, threshold):
+    """Print the median latency changes against a baseline, return the regressed callbacks"""
+
+    regressions = []
+    print(f"against commit {baseline.get('commit')}:")
+    for name, result in results['callbacks'].items():
+        if name not in baseline['callbacks']:
+            continue
+        before = baseline['callbacks'][name]['latency_ms']['p50']
+        after = result['latency_ms']['p50']
+        change = after / before - 1
+        regressed = change > threshold
+        if regressed:
+            regressions.append(name)
+        print(f"{name:<24}{before:>10.2f} -> {after:>8.2f} ms {change:>+8.1%}{'  REGRESSION' if regressed else ''}")
+    before = baseline['component']['items_per_second']
+    after = results['component']['items_per_second']
+    print(f"{'components':<24}{before:>10.1f} -> {after:>8.1f} items/s {after / before - 1:>+8.1%}")
+    if 'in_flight' in baseline:
+        before = baseline['in_flight']['peak_kib']
+        after = results['in_flight']['peak_kib']
+        print(f"{'in flight peak':<24}{before:>10.1f} -> {after:>8.1f} KiB {after / before - 1:>+8.1%}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--engine', choices=YahooFinanceSpider.ENGINES, default='selenium')
+    parser.add_argument('--iterations', type=int, default=100)
+    parser.add_argument('--alloc-iterations', type=int, default=20)
+    parser.add_argument('--warmup', type=int, default=5)
+    parser.add_argument('--in-flight', type=int, default=200,
+                        help='tickers kept pending while measuring the peak memory')
+    parser.add_argument('--output', help='write the results to this JSON file')
+    parser.add_argument('--compare', help='JSON results of a previous run to compare against')
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help='relative increase of a median latency reported as a regression')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.WARNING)
+    results = CallbackBenchmark(args.engine).run(args.iterations, args.alloc_iterations, args.warmup,
+                                                 args.in_flight)
+    report(results)
+    if args.output:
+        Path(args.output).write_text(json.dumps(results, indent=2))
+    if args.compare:
+        baseline = json.loads(Path(args.compare).read_text())
+        if compare(results, baseline, args.threshold):
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,60 @@
+"""This module contains the ``ItemAggregator`` class"""
+
+import time
+
+
+class ItemAggregator:
+    """Merges the fields scraped from several pages into one item per key
+
+    Each key is built into an item once, the parts arriving for a key after its
+    item was built, e.g. once its timeout passed, are dropped.
+    """
+
+    def __init__(self, parts, build_item, timeout):
+        """Initialize an empty aggregator
+
+        Parameters
+        ----------
+        parts: iterable
+            The names of the parts an item is made of.
+        build_item: callable
+            Called with the key and a dict of the fields received for each part,
+            returns the merged item.
+        timeout: float
+            Seconds after the first part of a key arrived after which its item is
+            built with the parts received so far.
+        """
+
+        self.parts = frozenset(parts)
+        self.build_item = build_item
+        self.timeout = timeout
+        self.pending = {}
+        self.built = set()
+
+    def add(self, key, part, fields):
+        """Record the fields of one part, return the item once all parts arrived"""
+
+        if key in self.built:
+            return None
+        deadline, received = self.pending.setdefault(key, (time.monotonic() + self.timeout, {}))
+        received[part] = fields
+        if received.keys() >= self.parts:
+            return self._build(key)
+        return None
+
+    def expired(self):
+        """Build the items of the keys whose timeout passed"""
+
+        now = time.monotonic()
+        keys = [key for key, (deadline, _) in self.pending.items() if deadline <= now]
+        return [self._build(key) for key in keys]
+
+    def flush(self):
+        """Build the items of every pending key"""
+
+        keys = list(self.pending)
+        return [self._build(key) for key in keys]
+
+    def _build(self, key):
+        self.built.add(key)
+        return self.build_item(key, self.pending.pop(key)[1])
@@ -0,0 +1,136 @@
+"""This module contains the ``PageArchive`` class"""
+
+import json
+import os
+import struct
+import zlib
+from pathlib import Path
+from zipfile import ZIP_DEFLATED, ZIP_STORED, BadZipFile, ZipFile
+
+from .cache import PageCache
+
+# the fixed part of a local file header of a zip entry
+LOCAL_HEADER = struct.Struct('<4s2B4HL2L2H')
+LOCAL_HEADER_SIGNATURE = b'PK\x03\x04'
+
+
+class PageArchive:
+    """Zip archive of the pages of a crawl, recorded once and replayed at will
+
+    Each page is stored as a deflated entry followed by an entry holding its
+    URL, status and headers, both written to disk as soon as the page is
+    recorded. The index of the pages is rebuilt from these entries when the
+    archive is opened, and the archive of a recording which was killed
+    before closing it is repaired up to its last complete page.
+    """
+
+    MODES = ('record', 'replay')
+
+    def __init__(self, path, mode):
+        """Open an archive
+
+        Parameters
+        ----------
+        path: str
+            The zip file of the archive.
+        mode: str
+            "record" to create the archive, "replay" to read it.
+        """
+
+        if mode not in self.MODES:
+            raise ValueError(f"Unknown archive mode {mode!r}, expected one of {self.MODES}")
+        self.mode = mode
+        self.index = {}
+        if mode == 'record':
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+            self.zip = ZipFile(path, 'w', compression=ZIP_DEFLATED, compresslevel=9)
+            return
+        try:
+            self.zip = ZipFile(path)
+        except BadZipFile:
+            # the recording was killed before the zip directory was written
+            repair(path)
+            self.zip = ZipFile(path)
+        for name in self.zip.namelist():
+            if name.startswith('entries/'):
+                entry = json.loads(self.zip.read(name))
+                self.index[entry['key']] = entry
+
+    key = staticmethod(PageCache.key)
+
+    def __contains__(self, key):
+        return key in self.index
+
+    def __len__(self):
+        return len(self.index)
+
+    def record(self, key, url, status, headers, body):
+        """Store a page, the first one recorded under a key is kept
+
+        ``headers`` is a dict of header names to a value or a list of values.
+        """
+
+        if key in self.index:
+            return False
+        entry = {'key': key, 'name': f'pages/{key}', 'url': url, 'status': status, 'headers': headers}
+        self.zip.writestr(entry['name'], body)
+        # written after its page, a page is only replayed once both are complete
+        self.zip.writestr(f'entries/{key}.json', json.dumps(entry))
+        self.zip.fp.flush()
+        self.index[key] = entry
+        return True
+
+    def replay(self, key):
+        """Return the index entry and the body of a page"""
+
+        entry = self.index[key]
+        return entry, self.zip.read(entry['name'])
+
+    def close(self):
+        self.zip.close()
+
+
+def repair(path):
+    """Rewrite a zip file without its directory from the complete entries found in it"""
+
+    with open(path, 'rb') as file:
+        data = file.read()
+    repaired = Path(f'{path}.repaired')
+    with ZipFile(repaired, 'w', compression=ZIP_DEFLATED, compresslevel=9) as archive:
+        for name, body in _local_entries(data):
+            archive.writestr(name, body)
+    os.replace(repaired, path)
+
+
+def _local_entries(data):
+    """Yield the name and the content of the entries of a zip file read from their local headers
+
+    The headers of the entries written to a file are completed once their
+    content is written, so the first entry whose sizes or CRC do not match
+    its content, and every entry after it, are left out.
+    """
+
+    offset = 0
+    while data[offset:offset + 4] == LOCAL_HEADER_SIGNATURE:
+        if offset + LOCAL_HEADER.size > len(data):
+            return
+        (_, _, _, _, compress_type, _, _, crc, compress_size, file_size, name_length,
+         extra_length) = LOCAL_HEADER.unpack_from(data, offset)
+        start = offset + LOCAL_HEADER.size + name_length + extra_length
+        name = data[offset + LOCAL_HEADER.size:offset + LOCAL_HEADER.size + name_length].decode()
+        compressed = data[start:start + compress_size]
+        if len(compressed) < compress_size:
+            return
+        try:
+            if compress_type == ZIP_DEFLATED:
+                body = zlib.decompress(compressed, -zlib.MAX_WBITS)
+            elif compress_type == ZIP_STORED:
+                body = compressed
+            else:
+                return
+        except zlib.error:
+            return
+        if len(body) != file_size or zlib.crc32(body) != crc:
+            return
+        yield name, body
+        offset = start + compress_size
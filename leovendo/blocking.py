@@ -0,0 +1,72 @@
+"""This module contains the ``ResourceBlocklist`` class"""
+
+# URL patterns of the subresources of each kind, Chrome's ``Network.setBlockedURLs``
+# matches on URLs only
+RESOURCE_TYPE_PATTERNS = {
+    'image': ['*.png', '*.jpg', '*.jpeg', '*.gif', '*.webp', '*.svg', '*.ico'],
+    'font': ['*.woff', '*.woff2', '*.ttf', '*.otf', '*.eot'],
+    'media': ['*.mp4', '*.webm', '*.m3u8', '*.ts', '*.mp3'],
+    'stylesheet': ['*.css'],
+}
+
+# ad servers and trackers loaded by finance.yahoo.com pages
+YAHOO_BLOCKED_URLS = [
+    '*doubleclick.net*',
+    '*googlesyndication.com*',
+    '*googletagservices.com*',
+    '*google-analytics.com*',
+    '*googletagmanager.com*',
+    '*amazon-adsystem.com*',
+    '*adnxs.com*',
+    '*advertising.com*',
+    '*rubiconproject.com*',
+    '*pubmatic.com*',
+    '*casalemedia.com*',
+    '*criteo.com*',
+    '*taboola.com*',
+    '*outbrain.com*',
+    '*scorecardresearch.com*',
+    '*moatads.com*',
+    '*3lift.com*',
+    '*s.yimg.com/rq/darla*',
+    '*s.yimg.com/aaq/vzm/*',
+    '*beap.gemini.yahoo.com*',
+    '*analytics.yahoo.com*',
+]
+YAHOO_BLOCKED_RESOURCE_TYPES = ['image', 'font', 'media']
+
+
+class ResourceBlocklist:
+    """The subresources a browser must not load while rendering a page"""
+
+    def __init__(self, urls=(), resource_types=()):
+        """Initialize a blocklist
+
+        Parameters
+        ----------
+        urls: iterable
+            URL patterns where "*" matches any characters.
+        resource_types: iterable
+            Kinds of subresources to block, keys of ``RESOURCE_TYPE_PATTERNS``.
+        """
+
+        unknown = set(resource_types) - RESOURCE_TYPE_PATTERNS.keys()
+        if unknown:
+            raise ValueError(f"Unknown resource types {sorted(unknown)}, expected some of "
+                             f"{sorted(RESOURCE_TYPE_PATTERNS)}")
+        patterns = set(urls)
+        for resource_type in resource_types:
+            patterns.update(RESOURCE_TYPE_PATTERNS[resource_type])
+        self.patterns = tuple(sorted(patterns))
+
+    def __eq__(self, other):
+        return isinstance(other, ResourceBlocklist) and self.patterns == other.patterns
+
+    def __hash__(self):
+        return hash(self.patterns)
+
+    def __bool__(self):
+        return bool(self.patterns)
+
+    def __repr__(self):
+        return f"{type(self).__name__}({len(self.patterns)} patterns)"
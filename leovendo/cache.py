@@ -0,0 +1,125 @@
+"""This module contains the ``PageCache`` class"""
+
+import hashlib
+import sqlite3
+import time
+import zlib
+from pathlib import Path
+
+# entries expiring on earnings are never kept longer than this, in seconds
+EARNINGS_MAX_AGE = 120 * 86400
+
+
+class PageCache:
+    """Size-bounded SQLite store of rendered pages with per-page-type TTLs"""
+
+    def __init__(self, path, max_size, ttls, earnings_fallback_ttl=86400):
+        """Open or create the cache
+
+        Parameters
+        ----------
+        path: str
+            The SQLite database file.
+        max_size: int
+            Bytes of compressed pages above which the least recently used are evicted.
+        ttls: dict
+            Seconds a page type stays fresh, 0 to never cache it or "earnings" to keep
+            it until the next earnings date of its ticker.
+        earnings_fallback_ttl: int
+            Seconds an "earnings" page stays fresh while the earnings date is unknown.
+        """
+
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.db = sqlite3.connect(path)
+        self.db.executescript('''
+            CREATE TABLE IF NOT EXISTS pages (
+                key TEXT PRIMARY KEY,
+                url TEXT,
+                page_type TEXT,
+                ticker TEXT,
+                stored_at REAL,
+                accessed_at REAL,
+                size INTEGER,
+                body BLOB
+            );
+            CREATE INDEX IF NOT EXISTS pages_accessed_at ON pages (accessed_at);
+            CREATE TABLE IF NOT EXISTS earnings (
+                ticker TEXT,
+                earnings_at REAL,
+                PRIMARY KEY (ticker, earnings_at)
+            );
+        ''')
+        self.max_size = max_size
+        self.ttls = ttls
+        self.earnings_fallback_ttl = earnings_fallback_ttl
+        self.size = self.db.execute('SELECT COALESCE(SUM(size), 0) FROM pages').fetchone()[0]
+
+    @staticmethod
+    def key(url, variant=None):
+        return hashlib.sha1(f"{url}|{variant or ''}".encode()).hexdigest()
+
+    def cacheable(self, page_type):
+        return bool(self.ttls.get(page_type))
+
+    def get(self, key, page_type, ticker, now=None):
+        """Return the body of a fresh entry or ``None``"""
+
+        now = now or time.time()
+        row = self.db.execute('SELECT stored_at, body FROM pages WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            return None
+        stored_at, body = row
+        if not self._fresh(page_type, ticker, stored_at, now):
+            return None
+        self.db.execute('UPDATE pages SET accessed_at = ? WHERE key = ?', (now, key))
+        return zlib.decompress(body)
+
+    def _fresh(self, page_type, ticker, stored_at, now):
+        ttl = self.ttls.get(page_type)
+        if not ttl:
+            return False
+        if ttl != 'earnings':
+            return now - stored_at < ttl
+        upcoming, reported = self.db.execute(
+            'SELECT COALESCE(SUM(earnings_at > ?), 0), COALESCE(SUM(earnings_at > ? AND earnings_at <= ?), 0) '
+            'FROM earnings WHERE ticker = ?', (now, stored_at, now, ticker)
+        ).fetchone()
+        if not upcoming and not reported:
+            return now - stored_at < self.earnings_fallback_ttl
+        # stale once the ticker reported since the page was stored
+        return not reported and now - stored_at < EARNINGS_MAX_AGE
+
+    def set(self, key, url, page_type, ticker, body, now=None):
+        """Store a page and return the number of entries evicted to make room"""
+
+        now = now or time.time()
+        compressed = zlib.compress(body)
+        previous = self.db.execute('SELECT size FROM pages WHERE key = ?', (key,)).fetchone()
+        self.size -= previous[0] if previous else 0
+        self.db.execute('INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                        (key, url, page_type, ticker, now, now, len(compressed), compressed))
+        self.size += len(compressed)
+        evicted = self._evict()
+        self.db.commit()
+        return evicted
+
+    def _evict(self):
+        evicted = 0
+        while self.size > self.max_size:
+            row = self.db.execute('SELECT key, size FROM pages ORDER BY accessed_at LIMIT 1').fetchone()
+            if row is None:
+                break
+            self.db.execute('DELETE FROM pages WHERE key = ?', (row[0],))
+            self.size -= row[1]
+            evicted += 1
+        return evicted
+
+    def set_earnings_date(self, ticker, earnings_at):
+        """Record an earnings date of a ticker, as a timestamp"""
+
+        self.db.execute('INSERT OR IGNORE INTO earnings VALUES (?, ?)', (ticker, earnings_at))
+        self.db.commit()
+
+    def close(self):
+        self.db.commit()
+        self.db.close()
@@ -0,0 +1,79 @@
+"""This module contains the ``CheckpointStore`` class"""
+
+import json
+import sqlite3
+from datetime import date, timedelta
+from pathlib import Path
+
+
+class CheckpointStore:
+    """SQLite store of the fields scraped from each page of a ticker, by run date
+
+    A page is checkpointed once its fields were extracted. A run of the same
+    date only requests the pages of a ticker which were not checkpointed, and
+    skips the tickers whose component was exported with every page. The
+    checkpoints of the run dates older than ``keep_days`` are deleted.
+    """
+
+    def __init__(self, path, run_date, keep_days=7):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        # autocommit, each checkpoint is durable on its own
+        self.db = sqlite3.connect(path, timeout=60, isolation_level=None)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute('PRAGMA synchronous=NORMAL')
+        self.db.execute('''
+            CREATE TABLE IF NOT EXISTS pages (
+                run_date TEXT NOT NULL,
+                ticker TEXT NOT NULL,
+                page_type TEXT NOT NULL,
+                fields TEXT NOT NULL,
+                PRIMARY KEY (run_date, ticker, page_type)
+            )
+        ''')
+        self.db.execute('''
+            CREATE TABLE IF NOT EXISTS components (
+                run_date TEXT NOT NULL,
+                ticker TEXT NOT NULL,
+                PRIMARY KEY (run_date, ticker)
+            )
+        ''')
+        self.run_date = run_date.isoformat()
+        oldest = (run_date - timedelta(days=keep_days)).isoformat()
+        self.db.execute('DELETE FROM pages WHERE run_date < ?', (oldest,))
+        self.db.execute('DELETE FROM components WHERE run_date < ?', (oldest,))
+
+    def save(self, ticker, page_type, fields):
+        """Checkpoint the fields extracted from a page"""
+
+        self.db.execute('INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?)',
+                        (self.run_date, ticker, page_type, json.dumps(fields, default=_encode)))
+
+    def pages(self, ticker):
+        """The fields of each page of ``ticker`` checkpointed on the run date, by page type
+
+        The dates come back as ISO strings, ``Component.from_fields`` parses them.
+        The pages checkpointed without any field are left out, they are missing.
+        """
+
+        return {page_type: json.loads(fields) for page_type, fields in self.db.execute(
+            "SELECT page_type, fields FROM pages WHERE run_date = ? AND ticker = ? AND fields != '{}'",
+            (self.run_date, ticker)
+        )}
+
+    def complete(self, ticker):
+        """Record that the component of ``ticker`` was exported with every page"""
+
+        self.db.execute('INSERT OR IGNORE INTO components VALUES (?, ?)', (self.run_date, ticker))
+
+    def is_complete(self, ticker):
+        return self.db.execute('SELECT EXISTS (SELECT 1 FROM components WHERE run_date = ? AND ticker = ?)',
+                               (self.run_date, ticker)).fetchone()[0] == 1
+
+    def close(self):
+        self.db.close()
+
+
+def _encode(value):
+    if isinstance(value, date):
+        return value.isoformat()
+    raise TypeError(f"Cannot checkpoint {value!r}")
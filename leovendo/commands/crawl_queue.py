@@ -0,0 +1,69 @@
+"""This module contains the ``crawl_queue`` scrapy command"""
+
+import os
+import socket
+import subprocess
+import sys
+
+from scrapy.commands import ScrapyCommand
+from scrapy.exceptions import UsageError
+from scrapy.utils.conf import arglist_to_dict
+
+from leovendo.universe import load_universe
+from leovendo.workqueue import WorkQueue
+
+
+class Command(ScrapyCommand):
+    """Crawl the tickers with several spider processes pulling from one work queue"""
+
+    requires_project = True
+
+    def syntax(self):
+        return "[options] <spider>"
+
+    def short_desc(self):
+        return "Run several processes of a spider leasing the tickers from a shared work queue"
+
+    def add_options(self, parser):
+        super().add_options(parser)
+        parser.add_argument('-w', '--workers', type=int, default=os.cpu_count(),
+                            help="number of spider processes (default: one per core)")
+        parser.add_argument('--queue', default=None,
+                            help="the SQLite work queue (default: the WORK_QUEUE_PATH setting)")
+        parser.add_argument('--reset', action='store_true',
+                            help="queue every ticker again, even the ones done by a previous run")
+        parser.add_argument('-a', dest='spargs', action='append', default=[], metavar="NAME=VALUE",
+                            help="set a spider argument of every process (may be repeated)")
+
+    def run(self, args, opts):
+        if len(args) != 1:
+            raise UsageError()
+        spider = args[0]
+        path = opts.queue or self.settings.get('WORK_QUEUE_PATH')
+        try:
+            spider_arguments = arglist_to_dict(opts.spargs)
+        except ValueError:
+            raise UsageError("Invalid -a value, use -a NAME=VALUE", print_help=False)
+
+        queue = WorkQueue(path, self.settings.getfloat('WORK_QUEUE_LEASE_TIMEOUT', 300))
+        # the workers lease their tickers from the queue, "-a universe=" is the universe queued
+        queue.fill(load_universe(self.settings, spider_arguments.get('universe')), reset=opts.reset)
+        print(f"Queue {path}: {queue.counts()}")
+
+        command = [sys.executable, '-m', 'scrapy', 'crawl', spider, '-a', f'queue={path}']
+        for spider_argument in opts.spargs:
+            command += ['-a', spider_argument]
+        # the settings given to this command apply to every process
+        for setting in opts.set:
+            command += ['-s', setting]
+        workers = [
+            subprocess.Popen(command + ['-a', f'worker={socket.gethostname()}-{number}'])
+            for number in range(opts.workers)
+        ]
+        codes = [worker.wait() for worker in workers]
+
+        counts = queue.counts()
+        queue.close()
+        print(f"Queue {path}: {counts}, worker exit codes {codes}")
+        if any(codes) or counts.get('pending') or counts.get('leased'):
+            self.exitcode = 1
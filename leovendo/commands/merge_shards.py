@@ -0,0 +1,56 @@
+"""This module contains the ``merge_shards`` scrapy command"""
+
+from datetime import date
+from pathlib import Path
+
+from scrapy.commands import ScrapyCommand
+from scrapy.exceptions import UsageError
+
+from leovendo.sharding import merge_shards
+from leovendo.universe import load_universe
+
+
+class Command(ScrapyCommand):
+    """Merge the Parquet exports of the shards of a run into one dated file"""
+
+    requires_project = True
+
+    def syntax(self):
+        return "[options]"
+
+    def short_desc(self):
+        return "Merge the Parquet exports of the crawl shards and report their completeness"
+
+    def add_options(self, parser):
+        super().add_options(parser)
+        parser.add_argument('--date', default=date.today().isoformat(),
+                            help="run date of the exports to merge, YYYY-MM-DD (default: today)")
+        parser.add_argument('--shards', type=int, default=1,
+                            help="number of shards the run was split into (default: 1)")
+        parser.add_argument('--spider', default='yahoo_finance',
+                            help="spider whose exports are merged (default: yahoo_finance)")
+
+    def run(self, args, opts):
+        export_dir = self.settings.get('PARQUET_EXPORT_DIR')
+        if not export_dir:
+            raise UsageError("PARQUET_EXPORT_DIR must be set")
+
+        partition = f"date={opts.date}"
+        output_path = Path(self.settings.get('PARQUET_MERGED_DIR')) / partition / f"{opts.spider}.parquet"
+        try:
+            report = merge_shards(Path(export_dir) / partition, output_path, list(load_universe(self.settings)),
+                                  opts.shards)
+        except FileNotFoundError as error:
+            raise UsageError(str(error))
+
+        print(f"Merged {len(report['files'])} files into {output_path}: {report['rows']} tickers "
+              f"of {report['expected']}, {report['duplicates']} duplicates dropped")
+        for shard, shard_report in report['shards'].items():
+            print(f"  shard {shard}: {shard_report['exported']}/{shard_report['expected']}"
+                  + (f", missing {', '.join(shard_report['missing'])}" if shard_report['missing'] else ''))
+        for ticker, pages in report['incomplete'].items():
+            print(f"  {ticker} is missing the {', '.join(pages)} pages")
+        if report['unexpected']:
+            print(f"  not in TICKERS: {', '.join(report['unexpected'])}")
+        if not report['complete']:
+            self.exitcode = 1
@@ -0,0 +1,65 @@
+"""This module contains the ``screen`` scrapy command"""
+
+import time
+from datetime import date
+
+from scrapy.commands import ScrapyCommand
+from scrapy.exceptions import UsageError
+
+from leovendo.history import SnapshotStore
+from leovendo.screening import parse_filter, screen
+
+
+class Command(ScrapyCommand):
+    """Screen the snapshots of the local history store"""
+
+    requires_project = True
+
+    def syntax(self):
+        return "[options] <filter> ..."
+
+    def short_desc(self):
+        return "List the tickers whose stored figures match every filter, e.g. 'pe_ratio < 15'"
+
+    def long_desc(self):
+        return ("List the tickers whose latest snapshot in HISTORY_STORE_DIR matches every filter, or every "
+                "matching daily snapshot with --since. A filter is '<column> <operator> <value>' with one of "
+                "the operators <, <=, >, >=, =, and a value such as 15, 2%, 1.5B or yes. Percentages are "
+                "stored as fractions.")
+
+    def add_options(self, parser):
+        super().add_options(parser)
+        parser.add_argument('--date', default=date.today().isoformat(),
+                            help="date of the snapshots screened, YYYY-MM-DD (default: today)")
+        parser.add_argument('--since', default=None,
+                            help="screen every daily snapshot from this date, YYYY-MM-DD")
+        parser.add_argument('--within', type=int, default=7,
+                            help="days before --date the latest snapshot of a ticker may be taken (default: 7)")
+
+    def run(self, args, opts):
+        directory = self.settings.get('HISTORY_STORE_DIR')
+        if not directory:
+            raise UsageError("HISTORY_STORE_DIR must be set")
+        try:
+            day = date.fromisoformat(opts.date)
+            since = date.fromisoformat(opts.since) if opts.since else None
+        except ValueError as error:
+            raise UsageError(str(error))
+
+        store = SnapshotStore(directory)
+        try:
+            filters = [parse_filter(text, store.columns) for text in args]
+        except ValueError as error:
+            raise UsageError(str(error))
+
+        start = time.perf_counter()
+        rows = screen(store, filters, day, since, opts.within)
+        elapsed = time.perf_counter() - start
+
+        columns = list(dict.fromkeys(condition.column for condition in filters))
+        print('\t'.join(['ticker', 'date', *columns]))
+        for row in rows:
+            values = (f"{store.column(column)[row]:g}" for column in columns)
+            print('\t'.join([store.tickers[store.ticker_ids[row]], date.fromordinal(int(store.days[row])).isoformat(),
+                             *values]))
+        print(f"{len(rows)} snapshots of {len(store)} matched in {elapsed * 1000:.1f} ms")
@@ -0,0 +1,132 @@
+"""Metrics derived from the scraped figures, computed on whole columns with NumPy
+
+The spider only extracts the figures displayed on the pages. The metrics
+derived from them are computed here on one array per column, for a batch of
+components at a time or for the whole universe once the crawl is over. The
+cross-sectional metrics compare each ticker with the rest of the universe, so
+they are only computed on complete universes.
+"""
+
+import numpy as np
+import pyarrow as pa
+from itemadapter import ItemAdapter
+
+PERIODS = ('ttm', 'q1', 'q2', 'q3', 'q4')
+# the figures the per ticker metrics are derived from
+FIGURES = (
+    'previous_close',
+    'fiftytwo_week_high',
+    'one_year_target_est',
+    *(f"{period}_{figure}" for period in PERIODS for figure in ('total_revenue', 'net_income')),
+    'total_assets',
+    'total_liabilities',
+    'total_stockholders_equity'
+)
+DERIVED = (
+    'diff_to_52_week_high',
+    'diff_to_1y_target_est',
+    *(f"{period}_net_income_percentage" for period in PERIODS),
+    'net_tangible_assets',
+    'debt_to_equity_ratio'
+)
+# columns ranked across the universe into "<column>_rank" percentiles
+RANKED = ('market_cap', 'pe_ratio', 'forward_pe', 'peg_ratio', 'price_over_book', 'return_on_equity')
+CROSS_SECTIONAL = (*(f"{column}_rank" for column in RANKED), 'sector_relative_pe')
+
+
+def columns_of(items, names):
+    """Gather the fields of records into float arrays, NaN for the missing values"""
+
+    adapters = [ItemAdapter(item) for item in items]
+    return {name: np.array([adapter.get(name) for adapter in adapters], dtype=float) for name in names}
+
+
+def round_up(values):
+    """Round away from zero to hundredths, ignoring the floating point noise"""
+
+    return np.copysign(np.ceil(np.round(np.abs(values) * 100, 6)) / 100, values)
+
+
+def divide(numerators, denominators):
+    """Element-wise ratios, NaN where the denominator is zero or missing"""
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ratios = numerators / denominators
+    return np.where(np.isfinite(ratios), ratios, np.nan)
+
+
+def derive(columns):
+    """Add the per ticker metrics to a dict of ``FIGURES`` arrays and return it
+
+    The differences and the net margins are fractions, -0.1 when the price is
+    10% below its 52 week high, the debt to equity ratio is a plain ratio.
+    """
+
+    columns['diff_to_52_week_high'] = divide(columns['previous_close'], columns['fiftytwo_week_high']) - 1
+    columns['diff_to_1y_target_est'] = divide(columns['one_year_target_est'], columns['previous_close']) - 1
+    for period in PERIODS:
+        columns[f"{period}_net_income_percentage"] = divide(
+            columns[f"{period}_net_income"], columns[f"{period}_total_revenue"])
+    columns['net_tangible_assets'] = columns['total_assets'] - columns['total_liabilities']
+    columns['debt_to_equity_ratio'] = divide(columns['total_liabilities'], columns['total_stockholders_equity'])
+    return columns
+
+
+def percentile_rank(values):
+    """Average rank of each value as a fraction of the values present, NaN stays NaN"""
+
+    present = np.sort(values[~np.isnan(values)])
+    if not present.size:
+        return np.full(values.shape, np.nan)
+    below = np.searchsorted(present, values, 'left')
+    through = np.searchsorted(present, values, 'right')
+    ranks = (below + through + 1) / 2 / present.size
+    return np.where(np.isnan(values), np.nan, ranks)
+
+
+def group_median(values, groups):
+    """Median of the values present in the group of each row, NaN for rows without group"""
+
+    medians = np.full(values.shape, np.nan)
+    keys, inverse = np.unique(groups, return_inverse=True)
+    for index, key in enumerate(keys):
+        if not key:
+            continue
+        members = inverse == index
+        present = values[members & ~np.isnan(values)]
+        if present.size:
+            medians[members] = np.median(present)
+    return medians
+
+
+def cross_sectional(columns, sectors):
+    """Add the metrics comparing each ticker with the universe to a dict of arrays"""
+
+    for column in RANKED:
+        columns[f"{column}_rank"] = percentile_rank(columns[column])
+    # the P/E of loss-making companies is not meaningful
+    pe_ratio = np.where(columns['pe_ratio'] > 0, columns['pe_ratio'], np.nan)
+    columns['sector_relative_pe'] = divide(pe_ratio, group_median(pe_ratio, sectors))
+    return columns
+
+
+def derive_table(table, universe=True):
+    """Return ``table`` with its derived columns, and the cross-sectional ones if it holds a universe"""
+
+    names = FIGURES + (RANKED if universe else ())
+    columns = {name: table.column(name).to_numpy(zero_copy_only=False).astype(float) for name in names}
+    derive(columns)
+    added = DERIVED
+    if universe:
+        sectors = np.array([sector or '' for sector in table.column('sector').to_pylist()])
+        cross_sectional(columns, sectors)
+        added += CROSS_SECTIONAL
+    for name in added:
+        # NaN are written as nulls
+        values = pa.array(columns[name], type=pa.float64(), from_pandas=True)
+        index = table.schema.get_field_index(name)
+        if index < 0:
+            table = table.append_column(name, values)
+        else:
+            table = table.set_column(index, name, values)
+    return table
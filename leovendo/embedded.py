@@ -0,0 +1,180 @@
+"""This module reads the data store Yahoo embeds in its pages
+
+Every finance.yahoo.com quote page ships the state of its React app as a
+``root.App.main`` JSON assignment. The functions below turn the stores of that
+state into the fields the spider scrapes from the rendered pages. The numbers
+are the ``raw`` values of the stores, in base units, rather than the rounded
+strings the pages display, so they are not parsed back into numbers.
+"""
+
+import json
+import re
+from datetime import datetime
+
+STORE_PATTERN = re.compile(r'root\.App\.main\s*=\s*(\{.*\});')
+
+
+def page_stores(response):
+    """Return the ``stores`` dict embedded in the page of ``response``"""
+
+    match = STORE_PATTERN.search(response.text)
+    if match is None:
+        raise ValueError(f"No embedded data store in {response.url}")
+    return json.loads(match.group(1))['context']['dispatcher']['stores']
+
+
+def raw(node):
+    """Return the value of a ``{"raw": ..., "fmt": ...}`` node as a number"""
+
+    if isinstance(node, dict):
+        return node.get('raw')
+    return node
+
+
+def _quote_summary(response):
+    # pages of delisted tickers come without some of the stores
+    return page_stores(response).get('QuoteSummaryStore') or {}
+
+
+def _time_series(response, *keys):
+    """Return the non-empty data points of each time series, latest first"""
+
+    time_series = (page_stores(response).get('QuoteTimeSeriesStore') or {}).get('timeSeries') or {}
+    series = {}
+    for key in keys:
+        points = [point for point in time_series.get(key) or [] if point]
+        series[key] = sorted(points, key=lambda point: point['asOfDate'], reverse=True)
+    return series
+
+
+def _reported(point):
+    return raw(point['reportedValue'])
+
+
+def _date(node):
+    """Return the date of a timestamp node, None when it is missing"""
+
+    timestamp = raw(node)
+    if not timestamp:
+        return None
+    return datetime.utcfromtimestamp(timestamp).date()
+
+
+def _statement_date(point):
+    date = datetime.strptime(point['asOfDate'], '%Y-%m-%d')
+    return f"{date.month}/{date.day}/{date.year}"
+
+
+def summary(response):
+    """Fields of the quote page"""
+
+    store = _quote_summary(response)
+    price = store.get('price') or {}
+    summary_detail = store.get('summaryDetail') or {}
+    financial_data = store.get('financialData') or {}
+    return {
+        'company_name': price.get('shortName') or price.get('longName') or '',
+        'previous_close': raw(summary_detail.get('previousClose')),
+        'pe_ratio': raw(summary_detail.get('trailingPE')),
+        'one_year_target_est': raw(financial_data.get('targetMeanPrice')),
+    }
+
+
+def earnings_date(response):
+    """Next earnings date shown on the quote page, as a ``date``"""
+
+    calendar_events = _quote_summary(response).get('calendarEvents') or {}
+    dates = (calendar_events.get('earnings') or {}).get('earningsDate') or []
+    if not dates:
+        return None
+    return _date(dates[0])
+
+
+def statistics(response):
+    """Fields of the key-statistics page"""
+
+    store = _quote_summary(response)
+    summary_detail = store.get('summaryDetail') or {}
+    key_statistics = store.get('defaultKeyStatistics') or {}
+    financial_data = store.get('financialData') or {}
+    return {
+        'fiftytwo_week_high': raw(summary_detail.get('fiftyTwoWeekHigh')),
+        'forward_pe': raw(key_statistics.get('forwardPE')),
+        'market_cap': raw(summary_detail.get('marketCap')),
+        'peg_ratio': raw(key_statistics.get('pegRatio')),
+        'price_over_sales': raw(summary_detail.get('priceToSalesTrailing12Months')),
+        'price_over_book': raw(key_statistics.get('priceToBook')),
+        'return_on_assets': raw(financial_data.get('returnOnAssets')),
+        'return_on_equity': raw(financial_data.get('returnOnEquity')),
+        'diluted_eps': raw(key_statistics.get('trailingEps')),
+        'quarterly_earnings_growth': raw(key_statistics.get('earningsQuarterlyGrowth')),
+        'fwd_annual_dividend_rate': raw(summary_detail.get('dividendRate')),
+        'fwd_annual_dividend_yield': raw(summary_detail.get('dividendYield')),
+        'ex_dividend_date': _date(summary_detail.get('exDividendDate')),
+    }
+
+
+def profile(response):
+    """Fields of the profile page"""
+
+    asset_profile = _quote_summary(response).get('assetProfile') or {}
+    return {'country': asset_profile.get('country'), 'sector': asset_profile.get('sector')}
+
+
+def holders(response):
+    """Fields of the holders page"""
+
+    ownership = _quote_summary(response).get('institutionOwnership') or {}
+    top_holders = ownership.get('ownershipList') or [{}]
+    vanguard = 'Vanguard' in (top_holders[0].get('organization') or '')
+    return {'vanguard_holder': vanguard}
+
+
+def income_statement(response):
+    """TTM and quarterly revenue and net income of the financials page"""
+
+    series = _time_series(response, 'trailingTotalRevenue', 'trailingNetIncome',
+                          'quarterlyTotalRevenue', 'quarterlyNetIncome')
+    statement = {}
+    if series['trailingTotalRevenue'] and series['trailingNetIncome']:
+        statement['TTM'] = {
+            'date': 'ttm',
+            'total_revenue': _reported(series['trailingTotalRevenue'][0]),
+            'net_income': _reported(series['trailingNetIncome'][0])
+        }
+    periods = zip(series['quarterlyTotalRevenue'], series['quarterlyNetIncome'])
+    for number, (total_revenue, net_income) in enumerate(periods, 1):
+        statement[f"Q{number}"] = {
+            'date': _statement_date(total_revenue),
+            'total_revenue': _reported(total_revenue),
+            'net_income': _reported(net_income)
+        }
+    return statement
+
+
+def balance_sheet(response):
+    """Quarterly assets, liabilities and equity of the balance sheet page"""
+
+    series = _time_series(response, 'quarterlyTotalAssets', 'quarterlyTotalLiabilitiesNetMinorityInterest',
+                          'quarterlyStockholdersEquity')
+    periods = zip(series['quarterlyTotalAssets'], series['quarterlyTotalLiabilitiesNetMinorityInterest'],
+                  series['quarterlyStockholdersEquity'])
+    return {
+        f"Q{number}": {
+            'date': _statement_date(total_assets),
+            'total_assets': _reported(total_assets),
+            'total_liabilities': _reported(total_liabilities),
+            'total_stockholders_equity': _reported(total_stockholders_equity)
+        }
+        for number, (total_assets, total_liabilities, total_stockholders_equity) in enumerate(periods, 1)
+    }
+
+
+def cash_flow(response):
+    """TTM fields of the cash flow page"""
+
+    series = _time_series(response, 'trailingChangesInCash', 'trailingFreeCashFlow')
+    return {
+        'net_change_in_cash': _reported(series['trailingChangesInCash'][0]) if series['trailingChangesInCash'] else None,
+        'free_cash_flow': _reported(series['trailingFreeCashFlow'][0]) if series['trailingFreeCashFlow'] else None,
+    }
@@ -1,57 +1,320 @@
 import logging
+import os
+from datetime import datetime
+from pathlib import Path
 
 import gspread
+import pyarrow as pa
+import pyarrow.parquet as pq
+from itemadapter import ItemAdapter
 from oauth2client.service_account import ServiceAccountCredentials
 from scrapy.exporters import BaseItemExporter
+from twisted.internet import defer, task, threads
+from twisted.python.failure import Failure
+
+from leovendo.derived import DERIVED, FIGURES, columns_of, derive, derive_table, round_up
+from leovendo.sharding import EXPORTED_AT
+from leovendo.timing import timed
 
 logger = logging.getLogger(__name__)
 
+
+def format_number(value):
+    return f"{value:,.2f}"
+
+
+def format_percentage(value):
+    return f"{value * 100:.2f}%"
+
+
+def format_ratio(value):
+    # the net margins and the debt to equity ratio have always been shown rounded up
+    # and followed by a percent sign, "0.26%" for a ratio of 0.2563
+    return f"{round_up(value):.2f}%"
+
+
+def format_thousands(value):
+    # as displayed on the statement pages
+    return f"{value / 1000:,.0f}"
+
+
+def format_millions(value):
+    return value / 1e6
+
+
 class GoogleSheetItemExporter(BaseItemExporter):
-    def __init__(self, spreadsheet, worksheet):
-        scope = ['https://spreadsheets.google.com/feeds', 'https://www.googleapis.com/auth/drive']
-        self.credentials = ServiceAccountCredentials.from_json_keyfile_name('google_client_secret.json', scope)
-        self.client = gspread.authorize(self.credentials)
+    """Appends items to a worksheet in batches written from a background thread
+
+    Rows are buffered and sent with one ``append_rows`` call once
+    ``batch_size`` rows are pending or every ``flush_interval`` seconds. A
+    batch that fails, e.g. on the Sheets API rate limit, stays buffered and is
+    retried with the next flush. ``export_item`` returns a ``Deferred`` which
+    only fires while fewer than ``max_pending`` rows are buffered.
+
+    The typed values of the ``Component`` records are formatted the way the
+    sheet has always shown them, or written as numbers with ``native_numbers``.
+    The derived columns are computed for a whole batch of items at once.
+    """
+
+    COLUMNS = [
+        'date',
+        'ticker',
+        'company_name',
+        'previous_close',
+        'pe_ratio',
+        'fiftytwo_week_high',
+        'diff_to_52_week_high',
+        'fair_value',
+        'one_year_target_est',
+        'diff_to_1y_target_est',
+        'forward_pe',
+        'ttm_net_income_percentage',
+        'q1_net_income_percentage',
+        'q2_net_income_percentage',
+        'q3_net_income_percentage',
+        'q4_net_income_percentage',
+        'net_tangible_assets',
+        'debt_to_equity_ratio',
+        'net_change_in_cash',
+        'free_cash_flow',
+        'market_cap',
+        'peg_ratio',
+        'price_over_sales',
+        'price_over_book',
+        'return_on_assets',
+        'return_on_equity',
+        'diluted_eps',
+        'quarterly_earnings_growth',
+        'fwd_annual_dividend_rate',
+        'fwd_annual_dividend_yield',
+        'ex_dividend_date',
+        'vanguard_holder',
+        'country'
+    ]
+    FORMATS = {
+        'date': lambda value: f"{value:%d/%m/%Y}",
+        'previous_close': format_number,
+        'pe_ratio': format_number,
+        'fiftytwo_week_high': format_number,
+        'diff_to_52_week_high': format_percentage,
+        'one_year_target_est': format_number,
+        'diff_to_1y_target_est': format_percentage,
+        'forward_pe': format_number,
+        'ttm_net_income_percentage': format_ratio,
+        'q1_net_income_percentage': format_ratio,
+        'q2_net_income_percentage': format_ratio,
+        'q3_net_income_percentage': format_ratio,
+        'q4_net_income_percentage': format_ratio,
+        'net_tangible_assets': format_thousands,
+        'debt_to_equity_ratio': format_ratio,
+        'net_change_in_cash': format_thousands,
+        'free_cash_flow': format_thousands,
+        # the market cap has always been a number of millions
+        'market_cap': format_millions,
+        'peg_ratio': format_number,
+        'price_over_sales': format_number,
+        'price_over_book': format_number,
+        'return_on_assets': format_percentage,
+        'return_on_equity': format_percentage,
+        'diluted_eps': format_number,
+        'quarterly_earnings_growth': format_percentage,
+        'fwd_annual_dividend_rate': format_number,
+        'fwd_annual_dividend_yield': format_percentage,
+        'ex_dividend_date': lambda value: f"{value:%b %d, %Y}",
+        'vanguard_holder': lambda value: 'Y' if value else 'N/A'
+    }
+
+    def __init__(self, spreadsheet, worksheet, client=None, batch_size=100, flush_interval=10, max_pending=1000,
+                 stats=None, native_numbers=False):
+        if client is None:
+            scope = ['https://spreadsheets.google.com/feeds', 'https://www.googleapis.com/auth/drive']
+            self.credentials = ServiceAccountCredentials.from_json_keyfile_name('google_client_secret.json', scope)
+            client = gspread.authorize(self.credentials)
+        else:
+            self.credentials = None
+        self.client = client
         self.spreadsheet = self.client.open(spreadsheet)
         self.worksheet = self.spreadsheet.worksheet(worksheet)
 
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.stats = stats
+        self.native_numbers = native_numbers
+        self.items = []
+        self.rows = []
+        self.writing = None
+        self.waiters = []
+        self.flush_loop = task.LoopingCall(self.flush)
+
+    def start_exporting(self):
+        self.flush_loop.start(self.flush_interval, now=False)
+
+    def finish_exporting(self):
+        """Write every buffered row, returns a ``Deferred`` firing once done"""
+
+        if self.flush_loop.running:
+            self.flush_loop.stop()
+        return self._drain()
+
+    @defer.inlineCallbacks
+    def _drain(self):
+        while self.items or self.rows or self.writing:
+            yield self.flush()
+
     def export_item(self, item):
-        q4_net_income_perc = item['q4_net_income_percentage']
-        company = item['company_name']
-        logger.debug(f"Q4 Net income percentage of {company}: {q4_net_income_perc}")
-        if self.credentials.access_token_expired:
+        self.items.append(item)
+        if len(self.items) >= self.batch_size:
+            self.flush()
+        if len(self.items) + len(self.rows) < self.max_pending:
+            return defer.succeed(None)
+        # backpressure: hold the item until the buffer has room again
+        waiter = defer.Deferred()
+        self.waiters.append(waiter)
+        return waiter
+
+    def serialize_rows(self, items):
+        derived = derive(columns_of(items, FIGURES))
+        rows = []
+        for index, item in enumerate(items):
+            adapter = ItemAdapter(item)
+            rows.append([
+                self.serialize_value(column, derived[column][index] if column in DERIVED else adapter.get(column))
+                for column in self.COLUMNS
+            ])
+        return rows
+
+    def serialize_value(self, column, value):
+        # NaN marks the missing derived values
+        if value is None or value != value:
+            return ''
+        if self.native_numbers and isinstance(value, float):
+            return float(value)
+        return self.FORMATS.get(column, str)(value)
+
+    def flush(self):
+        """Send the buffered rows unless a batch is already being written"""
+
+        if self.items:
+            self.rows.extend(self.serialize_rows(self.items))
+            self.items = []
+        if self.writing is not None:
+            return self.writing
+        if not self.rows:
+            return defer.succeed(None)
+        batch, self.rows = self.rows, []
+        self.writing = threads.deferToThread(self._append_rows, batch)
+        self.writing.addBoth(self._written, batch)
+        return self.writing
+
+    def _append_rows(self, rows):
+        if self.credentials is not None and self.credentials.access_token_expired:
             self.client.login()
-        self.worksheet.append_row([
-            item['date'],
-            item['ticker'],
-            item['company_name'],
-            item['previous_close'],
-            item['pe_ratio'],
-            item['fiftytwo_week_high'],
-            item['diff_to_52_week_high'],
-            item['fair_value'],
-            item['one_year_target_est'],
-            item['diff_to_1y_target_est'],
-            item['forward_pe'],
-            item['ttm_net_income_percentage'],
-            item['q1_net_income_percentage'],
-            item['q2_net_income_percentage'],
-            item['q3_net_income_percentage'],
-            item['q4_net_income_percentage'],
-            item['balance_sheet']['Q1']['net_tangible_assets'],
-            item['balance_sheet']['Q1']['debt_to_equity_ratio'],
-            item['net_change_in_cash'],
-            item['free_cash_flow'],
-            item['market_cap'],
-            item['peg_ratio'],
-            item['price_over_sales'],
-            item['price_over_book'],
-            item['return_on_assets'],
-            item['return_on_equity'],
-            item['diluted_eps'],
-            item['quarterly_earnings_growth'],
-            item['fwd_annual_dividend_rate'],
-            item['fwd_annual_dividend_yield'],
-            item['ex_dividend_date'],
-            item['vanguard_holder'],
-            item['country']
-        ])
\ No newline at end of file
+        with timed(self.stats, 'sheet_append_rows'):
+            self.worksheet.append_rows(rows)
+
+    def _written(self, result, batch):
+        self.writing = None
+        failed = isinstance(result, Failure)
+        if failed:
+            logger.error(f"Failed to append {len(batch)} rows, retrying with the next flush: {result.value!r}")
+            self.rows[:0] = batch
+            if not self.flush_loop.running:
+                # nothing would retry the batch, give up instead of spinning
+                logger.error(f"Dropping {len(self.rows)} rows")
+                self.rows = []
+        else:
+            logger.debug(f"Appended {len(batch)} rows")
+
+        while self.waiters and len(self.rows) < self.max_pending:
+            self.waiters.pop(0).callback(None)
+        if not failed and len(self.rows) >= self.batch_size and self.flush_loop.running:
+            self.flush()
+
+
+
+class ParquetItemExporter(BaseItemExporter):
+    """Streams items into a Parquet file with typed columns
+
+    The ``Component`` records already hold numbers in base units, they are
+    written as they are, a row group of ``row_group_size`` items at a time, so
+    memory stays flat whatever the size of the universe. Once every item is
+    written, the derived columns are computed on the whole file at once, with
+    the cross-sectional ones when it holds a ``universe``.
+    """
+
+    STRING_COLUMNS = ['ticker', 'company_name', 'fair_value', 'country', 'sector']
+    DATE_COLUMNS = ['date', 'ex_dividend_date']
+    NUMBER_COLUMNS = [
+        'previous_close',
+        'pe_ratio',
+        'fiftytwo_week_high',
+        'one_year_target_est',
+        'forward_pe',
+        *FIGURES[3:],
+        'net_change_in_cash',
+        'free_cash_flow',
+        'market_cap',
+        'peg_ratio',
+        'price_over_sales',
+        'price_over_book',
+        'return_on_assets',
+        'return_on_equity',
+        'diluted_eps',
+        'quarterly_earnings_growth',
+        'fwd_annual_dividend_rate',
+        'fwd_annual_dividend_yield'
+    ]
+    SCHEMA = pa.schema(
+        [(column, pa.string()) for column in STRING_COLUMNS]
+        + [(column, pa.date32()) for column in DATE_COLUMNS]
+        + [(column, pa.float64()) for column in NUMBER_COLUMNS]
+        + [('vanguard_holder', pa.bool_()), ('missing_pages', pa.list_(pa.string()))]
+    )
+
+    def __init__(self, path, row_group_size=1000, compression='snappy', stats=None, universe=True):
+        self.path = Path(path)
+        self.stats = stats
+        self.universe = universe
+        self.row_group_size = row_group_size
+        self.compression = compression
+        self.columns = {name: [] for name in self.SCHEMA.names}
+        self.writer = None
+
+    def start_exporting(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.writer = pq.ParquetWriter(str(self.path), self.SCHEMA, compression=self.compression)
+
+    def export_item(self, item):
+        adapter = ItemAdapter(item)
+        for column, values in self.columns.items():
+            values.append(adapter.get(column))
+
+        if len(self.columns['ticker']) >= self.row_group_size:
+            self._write_row_group()
+
+    def finish_exporting(self):
+        self._write_row_group()
+        self.writer.close()
+        with timed(self.stats, 'parquet_derive'):
+            table = derive_table(pq.read_table(str(self.path)), self.universe)
+        # tells which of the files of a date partition is the latest export of a ticker
+        table = table.replace_schema_metadata({**(table.schema.metadata or {}),
+                                               EXPORTED_AT: datetime.now().isoformat().encode()})
+        derived_path = self.path.with_suffix('.derived')
+        pq.write_table(table, str(derived_path), row_group_size=self.row_group_size, compression=self.compression)
+        os.replace(derived_path, self.path)
+
+    def _write_row_group(self):
+        if not self.columns['ticker']:
+            return
+        with timed(self.stats, 'parquet_write_row_group'):
+            self.writer.write_table(pa.Table.from_pydict(self.columns, schema=self.SCHEMA))
+        self.columns = {name: [] for name in self.SCHEMA.names}
+
+    @staticmethod
+    def partition_path(base_dir, name, run_date=None):
+        """Hive style path of a run's file, partitioned by run date"""
+
+        run_date = run_date or datetime.today()
+        return Path(base_dir) / f"date={run_date:%Y-%m-%d}" / f"{name}-{run_date:%H%M%S}.parquet"
@@ -0,0 +1,88 @@
+"""Helpers reading label/value tables from rendered Yahoo pages"""
+
+import re
+
+QUALIFIER = re.compile(r'\s*\([^)]*\)')
+FOOTNOTE = re.compile(r'\s*\d+$')
+WHITESPACE = re.compile(r'\s+')
+
+
+def normalize_label(label):
+    """Normalize a label such as "Market Cap (intraday) 5" into "market cap"
+
+    Qualifiers in parentheses and trailing footnote numbers are dropped and
+    whitespace is collapsed, so a label matches whatever the page annotates.
+    """
+
+    label = WHITESPACE.sub(' ', label or '').strip()
+    return FOOTNOTE.sub('', QUALIFIER.sub('', label)).strip().lower()
+
+
+def label_value_index(selector, rows='//tr'):
+    """Walk the table rows of a page once and map each normalized label to its value
+
+    Parameters
+    ----------
+    selector: scrapy.Selector or scrapy.http.TextResponse
+        The page to read.
+    rows: str
+        XPath of the rows holding a label cell followed by a value cell.
+
+    Returns
+    -------
+    dict
+        The text of the value cells by normalized label, the first row wins
+        when a label is repeated.
+    """
+
+    index = {}
+    for row in selector.xpath(rows):
+        cells = row.xpath('./td')
+        if len(cells) < 2:
+            continue
+        label = normalize_label(cells[0].xpath('string()').get())
+        value = WHITESPACE.sub(' ', cells[1].xpath('string()').get()).strip()
+        if label and label not in index:
+            index[label] = value
+    return index
+
+
+def _cell_text(cell):
+    return WHITESPACE.sub(' ', cell.xpath('string()').get()).strip()
+
+
+def statement_columns(selector, fields):
+    """Read every column of a financial statement table in one pass over its rows
+
+    The statement pages lay out a "Breakdown" header row followed by one row
+    per line item, each titled by its first cell. Any number of period columns
+    is supported.
+
+    Parameters
+    ----------
+    selector: scrapy.Selector or scrapy.http.TextResponse
+        The rendered statement page.
+    fields: dict
+        The field names to read by line item title, e.g. ``{'Net Income': 'net_income'}``.
+
+    Returns
+    -------
+    list
+        One dict per period column, from left to right, holding the column
+        header as ``date`` and the value of each line item found.
+    """
+
+    header = selector.xpath("//div[span[contains(text(), 'Breakdown')]]")
+    if not header:
+        return []
+    columns = [{'date': _cell_text(cell)} for cell in header[0].xpath('following-sibling::div')]
+    remaining = dict(fields)
+    for label in selector.xpath('//div[@title]'):
+        field = remaining.pop(label.attrib['title'], None)
+        if field is None:
+            continue
+        for column, cell in zip(columns, label.xpath('parent::div/following-sibling::div')):
+            column[field] = _cell_text(cell)
+        if not remaining:
+            break
+    return columns
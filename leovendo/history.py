@@ -0,0 +1,343 @@
+"""This module contains the ``SnapshotStore`` class"""
+
+import bisect
+import os
+from contextlib import contextmanager
+from dataclasses import fields
+from datetime import date
+from pathlib import Path
+
+import numpy as np
+from itemadapter import ItemAdapter
+
+from leovendo.derived import DERIVED, FIGURES, columns_of, derive
+from leovendo.items import Component
+
+
+class SnapshotStore:
+    """Append-only store of the daily figures of every ticker, read through memory maps
+
+    Each numeric field is a file of float64 values, NaN when missing, with one
+    value per row, and each row is the snapshot of one ticker on one day. The
+    ticker ids and the days of the rows are two int32 files, the days file is
+    written last so its length is the number of rows committed. Rows are only
+    ever appended, several processes may append at the same time, and a
+    ticker exported twice on the same day keeps its latest row. The metrics
+    derived from the figures are computed and stored with them.
+
+    The rows are indexed by (ticker, day) through their keys sorted once, so
+    the snapshot of the whole universe as of any date is a binary search per
+    ticker and gathers from the memory-mapped columns. Each column can also
+    be indexed by the rows sorted on its values, so the rows within a range
+    of values are found by a binary search as well.
+    """
+
+    # booleans are stored as 1 and 0
+    COLUMNS = (
+        *(field.name for field in fields(Component) if field.type is float),
+        'vanguard_holder',
+        *DERIVED
+    )
+
+    def __init__(self, directory, columns=COLUMNS):
+        """Open a store, creating it if needed
+
+        Parameters
+        ----------
+        directory: str
+            The directory holding the files of the store.
+        columns: tuple
+            The numeric fields stored, a column added later is NaN in the
+            rows written before.
+        """
+
+        self.directory = Path(directory)
+        (self.directory / 'columns').mkdir(parents=True, exist_ok=True)
+        (self.directory / 'index').mkdir(exist_ok=True)
+        self.columns = tuple(columns)
+        self.refresh()
+
+    def __len__(self):
+        return len(self.days)
+
+    def _path(self, name):
+        if name in ('ticker', 'day'):
+            return self.directory / f'{name}.i4'
+        return self.directory / 'columns' / f'{name}.f8'
+
+    @contextmanager
+    def _locked(self):
+        # serializes the writers, readers only map what the days file commits
+        with open(self.directory / '.lock', 'a+b') as lock:
+            _lock(lock)
+            try:
+                yield
+            finally:
+                _unlock(lock)
+
+    def refresh(self):
+        """Map the rows appended since the store was opened, by this process or others"""
+
+        self._read_tickers()
+        self.days = _map(self._path('day'), np.int32)
+        rows = len(self.days)
+        self.ticker_ids = _map(self._path('ticker'), np.int32, rows)
+        self._columns = {}
+        self._index = None
+        self._latest = None
+        self._field_indexes = {}
+
+    def column(self, name):
+        """The values of a numeric field for every row"""
+
+        if name not in self._columns:
+            if name not in self.columns:
+                raise KeyError(f"Unknown column {name!r}, expected one of {self.columns}")
+            values = _map(self._path(name), np.float64, len(self))
+            if len(values) < len(self):
+                # the column was added after these rows were written
+                values = np.concatenate([values, np.full(len(self) - len(values), np.nan)])
+            self._columns[name] = values
+        return self._columns[name]
+
+    def append(self, items):
+        """Append the snapshot of each ``Component``, dated by its ``date`` field"""
+
+        if not items:
+            return
+        adapters = [ItemAdapter(item) for item in items]
+        derived = derive(columns_of(items, FIGURES))
+        with self._locked():
+            self._add_tickers(adapter['ticker'] for adapter in adapters)
+            rows = os.path.getsize(self._path('day')) // 4 if self._path('day').exists() else 0
+            for name in self.columns:
+                if name in derived:
+                    values = derived[name]
+                else:
+                    values = np.array([adapter.get(name) for adapter in adapters], dtype=np.float64)
+                _append(self._path(name), values, rows, np.nan)
+            ticker_ids = np.array([self.ids[adapter['ticker']] for adapter in adapters], dtype=np.int32)
+            _append(self._path('ticker'), ticker_ids, rows, -1)
+            days = np.array([(adapter.get('date') or date.today()).toordinal() for adapter in adapters],
+                            dtype=np.int32)
+            # committing the rows
+            _append(self._path('day'), days, rows, 0)
+        self.refresh()
+
+    def _add_tickers(self, tickers):
+        # other processes may have added tickers since this one read them
+        self._read_tickers()
+        added = []
+        for ticker in tickers:
+            if ticker not in self.ids:
+                self.ids[ticker] = len(self.tickers)
+                self.tickers.append(ticker)
+                added.append(ticker)
+        if added:
+            with open(self.directory / 'tickers.txt', 'a') as file:
+                file.write(''.join(f'{ticker}\n' for ticker in added))
+
+    def _read_tickers(self):
+        path = self.directory / 'tickers.txt'
+        text = path.read_text() if path.exists() else ''
+        # a line still being written is not a ticker yet
+        self.tickers = text[:text.rfind('\n') + 1].splitlines()
+        self.ids = {ticker: index for index, ticker in enumerate(self.tickers)}
+
+    def _keys(self, rows):
+        return (self.ticker_ids[rows].astype(np.int64) << 32) | self.days[rows].astype(np.int64)
+
+    def index(self):
+        """The keys of the rows sorted by (ticker, day) and the rows they belong to
+
+        The index is written next to the rows so the other readers map it
+        instead of sorting again, it is rebuilt once rows were appended.
+        """
+
+        if self._index is not None:
+            return self._index
+        keys = _map(self.directory / 'index' / 'keys.i8', np.int64)
+        order = _map(self.directory / 'index' / 'rows.i8', np.int64)
+        if len(keys) != len(self) or len(order) != len(self):
+            # a stable sort keeps the latest row last among those of the same ticker and day
+            order = np.argsort(self._keys(slice(None)), kind='stable')
+            keys = self._keys(order)
+            with self._locked():
+                _replace(self.directory / 'index' / 'rows.i8', order)
+                _replace(self.directory / 'index' / 'keys.i8', keys)
+        self._index = keys, order
+        return self._index
+
+    def latest(self):
+        """Whether each row is the latest snapshot of its ticker on its day, the one kept"""
+
+        if self._latest is None:
+            keys, order = self.index()
+            latest = np.zeros(len(self), dtype=bool)
+            if len(keys):
+                # the latest row of a (ticker, day) is the last of its keys
+                latest[order[np.append(keys[1:] != keys[:-1], True)]] = True
+            self._latest = latest
+        return self._latest
+
+    def field_index(self, name):
+        """The rows sorted by the values of a column, the rows without value last
+
+        Like the (ticker, day) index it is written next to the rows and
+        rebuilt once rows were appended.
+        """
+
+        if name not in self._field_indexes:
+            path = self.directory / 'index' / 'columns' / f'{name}.i8'
+            order = _map(path, np.int64)
+            if len(order) != len(self):
+                # NaN are sorted last
+                order = np.argsort(self.column(name), kind='stable')
+                path.parent.mkdir(exist_ok=True)
+                with self._locked():
+                    _replace(path, order)
+            self._field_indexes[name] = order
+        return self._field_indexes[name]
+
+    def build_indexes(self):
+        """Build the (ticker, day) index and the index of every column"""
+
+        self.index()
+        for name in self.columns:
+            self.field_index(name)
+
+    def rows_between(self, name, low=-np.inf, high=np.inf, include_low=True, include_high=True):
+        """The rows whose value of a column is between ``low`` and ``high``, in the order of the values"""
+
+        values = self.column(name)
+        order = self.field_index(name)
+        key = values.__getitem__
+        present = bisect.bisect_left(order, True, key=lambda row: np.isnan(values[row]))
+        start = (bisect.bisect_left if include_low else bisect.bisect_right)(order, low, 0, present, key=key)
+        end = (bisect.bisect_right if include_high else bisect.bisect_left)(order, high, start, present, key=key)
+        return order[start:end]
+
+    def rows_as_of(self, day, within=None):
+        """The row of the latest snapshot of each ticker on or before ``day``
+
+        Parameters
+        ----------
+        day: datetime.date
+            The date of the snapshot.
+        within: int
+            Days before ``day`` a snapshot may be taken to count, no limit when None.
+
+        Returns
+        -------
+        numpy.ndarray
+            The row of each ticker, by ticker id, -1 for the tickers without snapshot.
+        """
+
+        keys, order = self.index()
+        ids = np.arange(len(self.tickers), dtype=np.int64)
+        if not len(keys):
+            return np.full(len(ids), -1)
+        day = day.toordinal()
+        positions = np.searchsorted(keys, (ids << 32) | day, 'right') - 1
+        found = positions >= 0
+        positions = np.maximum(positions, 0)
+        found &= keys[positions] >> 32 == ids
+        if within is not None:
+            found &= (keys[positions] & 0xFFFFFFFF) >= day - within
+        return np.where(found, order[positions], -1)
+
+    def snapshot(self, day, columns=None, within=None):
+        """The figures of every ticker as of ``day``
+
+        Returns
+        -------
+        dict
+            An array per column, by ticker id as in ``tickers``, NaN for the
+            tickers without snapshot.
+        """
+
+        rows = self.rows_as_of(day, within)
+        missing = rows < 0
+        snapshot = {}
+        for name in columns or self.columns:
+            values = self.column(name)[np.maximum(rows, 0)] if len(self) else np.full(len(rows), np.nan)
+            snapshot[name] = np.where(missing, np.nan, values)
+        return snapshot
+
+    def lookup(self, ticker, day):
+        """The figures of ``ticker`` on ``day``, None when it has no snapshot that day"""
+
+        if ticker not in self.ids:
+            return None
+        keys, order = self.index()
+        key = (self.ids[ticker] << 32) | day.toordinal()
+        position = np.searchsorted(keys, key, 'right') - 1
+        if position < 0 or keys[position] != key:
+            return None
+        row = order[position]
+        return {name: float(self.column(name)[row]) for name in self.columns}
+
+
+def _lock(file):
+    """Block until the exclusive lock of an open file is taken"""
+
+    if os.name == 'nt':
+        import msvcrt
+
+        # locks the first byte, retrying every second while another process holds it
+        file.seek(0)
+        while True:
+            try:
+                msvcrt.locking(file.fileno(), msvcrt.LK_LOCK, 1)
+                return
+            except OSError:
+                continue
+    else:
+        import fcntl
+
+        fcntl.flock(file, fcntl.LOCK_EX)
+
+
+def _unlock(file):
+    if os.name == 'nt':
+        import msvcrt
+
+        file.seek(0)
+        msvcrt.locking(file.fileno(), msvcrt.LK_UNLCK, 1)
+    else:
+        import fcntl
+
+        fcntl.flock(file, fcntl.LOCK_UN)
+
+
+def _map(path, dtype, rows=None):
+    """Map the first ``rows`` values of a file read-only, every complete value when None"""
+
+    size = os.path.getsize(path) // np.dtype(dtype).itemsize if path.exists() else 0
+    rows = size if rows is None else min(rows, size)
+    if not rows:
+        # an empty file cannot be mapped
+        return np.empty(0, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode='r', shape=(rows,))
+
+
+def _append(path, values, rows, fill):
+    """Append ``values`` after the first ``rows`` values of a file
+
+    The values past ``rows``, left by a writer that died before committing,
+    are dropped and a file shorter than ``rows`` is padded with ``fill``.
+    """
+
+    itemsize = values.dtype.itemsize
+    with open(path, 'ab') as file:
+        size = file.tell() // itemsize
+        file.truncate(min(size, rows) * itemsize)
+        if size < rows:
+            np.full(rows - size, fill, dtype=values.dtype).tofile(file)
+        values.tofile(file)
+
+
+def _replace(path, values):
+    temporary = path.with_suffix('.tmp')
+    values.tofile(temporary)
+    os.replace(temporary, path)
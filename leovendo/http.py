@@ -1,27 +1,49 @@
 """This module contains the ``SeleniumRequest`` class"""
 
 from scrapy import Request
+from selenium.webdriver.support import expected_conditions as EC
 
 
 class SeleniumRequest(Request):
-    """Scrapy ``Request`` subclass providing additional arguments"""
+    """Scrapy ``Request`` subclass providing additional arguments
 
-    def __init__(self, previous_response=None, wait_time=None, wait_until=None, screenshot=False, script=None,
-        spawn_driver=False, *args, **kwargs):
+    Its attributes are plain values, so the request can be serialized by the
+    disk queues of the scheduler: the condition waited for is named rather
+    than built and the subresources blocked are URL patterns.
+    """
+
+    attributes = Request.attributes + ('wait_time', 'wait_until', 'screenshot', 'script', 'click', 'block',
+        'page_load')
+
+    def __init__(self, wait_time=None, wait_until=None, screenshot=False, script=None, click=None, block=None,
+        page_load=None, *args, **kwargs):
         """Initialize a new selenium request
 
         Parameters
         ----------
         wait_time: int
             The number of seconds to wait.
-        wait_until: method
-            One of the "selenium.webdriver.support.expected_conditions". The response
-            will be returned until the given condition is fulfilled.
+        wait_until: tuple
+            The name of one of the "selenium.webdriver.support.expected_conditions"
+            followed by its arguments, e.g. ("presence_of_element_located", (By.ID, "quote")).
+            The response will be returned until the given condition is fulfilled.
         screenshot: bool
             If True, a screenshot of the page will be taken and the data of the screenshot
             will be returned in the response "meta" attribute.
         script: str
             JavaScript code to execute.
+        click: str
+            XPath of an element to click once it is clickable, within "wait_time"
+            seconds. The "wait_until" condition is checked after the click.
+        block: tuple
+            URL patterns of the subresources the browser must not load for this
+            page, where "*" matches any characters, e.g. the ``patterns`` of a
+            ``leovendo.blocking.ResourceBlocklist``. The middleware's default
+            blocklist is used when None.
+        page_load: str
+            How loaded the document must be before the "click" and "wait_until"
+            steps: "normal" waits for every subresource, "eager" for the DOM to be
+            parsed and "none" only for the new document, "eager" when None.
 
         """
 
@@ -29,12 +51,15 @@ class SeleniumRequest(Request):
         self.wait_until = wait_until
         self.screenshot = screenshot
         self.script = script
-        self.spawn_driver = spawn_driver
-        if previous_response:
-            self.driver = previous_response.meta['driver']
-        else:
-            self.driver = None
+        self.click = click
+        self.block = block
+        self.page_load = page_load
 
         super().__init__(*args, **kwargs)
 
-    
\ No newline at end of file
+
+def expected_condition(wait_until):
+    """Build the selenium condition named by the "wait_until" attribute of a request"""
+
+    name, *args = wait_until
+    return getattr(EC, name)(*args)
@@ -1,36 +1,90 @@
-from scrapy import Field, Item
-from scrapy.loader.processors import TakeFirst
-
-class Component(Item):
-    date = Field(output_processor=TakeFirst())
-    ticker = Field(output_processor=TakeFirst())
-    company_name = Field(output_processor=TakeFirst())
-    previous_close = Field(output_processor=TakeFirst())
-    pe_ratio = Field(output_processor=TakeFirst())
-    fiftytwo_week_high = Field(output_processor=TakeFirst())
-    diff_to_52_week_high = Field(output_processor=TakeFirst())
-    fair_value = Field(output_processor=TakeFirst())
-    forward_pe = Field(output_processor=TakeFirst())
-    one_year_target_est = Field(output_processor=TakeFirst())
-    diff_to_1y_target_est = Field(output_processor=TakeFirst())
-    market_cap = Field(output_processor=TakeFirst())
-    peg_ratio = Field(output_processor=TakeFirst())
-    price_over_sales = Field(output_processor=TakeFirst())
-    price_over_book = Field(output_processor=TakeFirst())
-    return_on_assets = Field(output_processor=TakeFirst())
-    return_on_equity = Field(output_processor=TakeFirst())
-    diluted_eps = Field(output_processor=TakeFirst())
-    quarterly_earnings_growth = Field(output_processor=TakeFirst())
-    fwd_annual_dividend_rate = Field(output_processor=TakeFirst())
-    fwd_annual_dividend_yield = Field(output_processor=TakeFirst())
-    ex_dividend_date = Field(output_processor=TakeFirst())
-    country = Field(output_processor=TakeFirst())
-    vanguard_holder = Field(output_processor=TakeFirst())
-    ttm_net_income_percentage = Field(output_processor=TakeFirst())
-    q1_net_income_percentage = Field(output_processor=TakeFirst())
-    q2_net_income_percentage = Field(output_processor=TakeFirst())
-    q4_net_income_percentage = Field(output_processor=TakeFirst())
-    q3_net_income_percentage = Field(output_processor=TakeFirst())
-    balance_sheet = Field(output_processor=TakeFirst())
-    net_change_in_cash = Field(output_processor=TakeFirst())
-    free_cash_flow = Field(output_processor=TakeFirst())
\ No newline at end of file
+"""This module contains the ``Component`` record and the loader of its fields"""
+
+import datetime
+from dataclasses import dataclass, fields
+
+from scrapy.loader import ItemLoader
+from itemloaders.processors import TakeFirst
+
+from leovendo.values import parse_date, parse_number
+
+
+@dataclass(slots=True)
+class Component:
+    """The figures of one ticker, parsed once into typed values
+
+    Amounts are in dollars, percentages are fractions (0.1365 for "13.65%")
+    and dates are ``datetime.date``, missing values are ``None``. Only the
+    exporters format them back for display. The metrics derived from these
+    figures are computed by ``leovendo.derived`` on whole columns.
+    """
+
+    date: datetime.date = None
+    ticker: str = None
+    company_name: str = None
+    previous_close: float = None
+    pe_ratio: float = None
+    fiftytwo_week_high: float = None
+    fair_value: str = None
+    forward_pe: float = None
+    one_year_target_est: float = None
+    market_cap: float = None
+    peg_ratio: float = None
+    price_over_sales: float = None
+    price_over_book: float = None
+    return_on_assets: float = None
+    return_on_equity: float = None
+    diluted_eps: float = None
+    quarterly_earnings_growth: float = None
+    fwd_annual_dividend_rate: float = None
+    fwd_annual_dividend_yield: float = None
+    ex_dividend_date: datetime.date = None
+    country: str = None
+    sector: str = None
+    vanguard_holder: bool = None
+    # trailing twelve months and latest quarters of the income statement
+    ttm_total_revenue: float = None
+    ttm_net_income: float = None
+    q1_total_revenue: float = None
+    q1_net_income: float = None
+    q2_total_revenue: float = None
+    q2_net_income: float = None
+    q3_total_revenue: float = None
+    q3_net_income: float = None
+    q4_total_revenue: float = None
+    q4_net_income: float = None
+    # latest quarter of the balance sheet
+    total_assets: float = None
+    total_liabilities: float = None
+    total_stockholders_equity: float = None
+    net_change_in_cash: float = None
+    free_cash_flow: float = None
+    # the page types which failed or brought no fields, sorted
+    missing_pages: list = None
+
+    @classmethod
+    def from_fields(cls, values):
+        """Build a record from the scraped fields, parsing the displayed values by field type"""
+
+        return cls(**{
+            field.name: PARSERS.get(field.type, _same)(values[field.name])
+            for field in fields(cls)
+            if field.name in values
+        })
+
+
+def _same(value):
+    return value
+
+
+PARSERS = {
+    float: parse_number,
+    datetime.date: parse_date
+}
+
+
+class ComponentLoader(ItemLoader):
+    """Loads the fields scraped from one page into a dict, keeping the first value of each"""
+
+    default_item_class = dict
+    default_output_processor = TakeFirst()
@@ -1,22 +1,67 @@
 """This module contains the ``SeleniumMiddleware`` scrapy middleware"""
 
+import json
+import logging
+import time
+import weakref
 from datetime import datetime
 from pathlib import Path
 from importlib import import_module
 
 from scrapy import signals
-from scrapy.exceptions import NotConfigured
-from scrapy.http import HtmlResponse
+from scrapy.exceptions import IgnoreRequest, NotConfigured
+from scrapy.http import Headers, HtmlResponse
+from scrapy.responsetypes import responsetypes
+from selenium.common.exceptions import WebDriverException
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.support.ui import WebDriverWait
-
-from .http import SeleniumRequest
+from twisted.internet import defer
+from twisted.python.failure import Failure
+
+from .archive import PageArchive
+from .blocking import ResourceBlocklist
+from .cache import PageCache
+from .http import SeleniumRequest, expected_condition
+from .pool import DriverPool
+from .signals import earnings_date_scraped, page_parsed
+from .supervisor import DriverSupervisor
+from .timing import observe, timed
+
+logger = logging.getLogger(__name__)
+
+# the drivers of Chrome log the DevTools network events, whose encodedDataLength is the
+# size on the wire of every response, cross-origin ones included
+PERFORMANCE_LOG_CAPABILITIES = {'goog:loggingPrefs': {'performance': 'ALL'}}
+# sums the bytes of the page and its subresources from the Resource Timing API for the other
+# drivers, cross-origin subresources without a Timing-Allow-Origin header count as 0 bytes
+PAGE_LOAD_SCRIPT = """
+var entries = performance.getEntriesByType('navigation').concat(performance.getEntriesByType('resource'));
+return [entries.length, entries.reduce(function (total, entry) { return total + (entry.transferSize || 0); }, 0)];
+"""
+# seconds between two checks of a readiness condition
+POLL_FREQUENCY = 0.1
+# the document states satisfying each page load strategy
+READY_STATES = {
+    'normal': ['complete'],
+    'eager': ['interactive', 'complete'],
+    'none': ['loading', 'interactive', 'complete']
+}
+# the previous page of a driver stays in place for a while once a navigation
+# returns early, so it is marked to tell it apart from the requested one
+MARK_PREVIOUS_PAGE_SCRIPT = "window.leovendoPreviousPage = true;"
+READY_SCRIPT = """
+return window.leovendoPreviousPage === undefined && arguments[0].indexOf(document.readyState) >= 0;
+"""
 
 
 class SeleniumMiddleware:
     """Scrapy middleware handling the requests using selenium"""
 
     def __init__(self, driver_name, driver_executable_path,
-        browser_executable_path, command_executor, driver_arguments):
+        browser_executable_path, command_executor, driver_arguments,
+        pool_size=1, blocklist=None, stats=None, page_load_strategy='normal',
+        page_load_timeout=30, max_pages=0, max_rss=0, hang_timeout=0, watchdog_interval=10):
         """Initialize the selenium webdriver
 
         Parameters
@@ -31,6 +76,25 @@ class SeleniumMiddleware:
             The path of the executable binary of the browser
         command_executor: str
             Selenium remote server endpoint
+        pool_size: int
+            The maximum number of drivers alive at the same time
+        blocklist: leovendo.blocking.ResourceBlocklist
+            The subresources blocked for the requests not setting their own "block"
+        stats: scrapy.statscollectors.StatsCollector
+            Where the bytes transferred and the load time of the pages are reported
+        page_load_strategy: str
+            When the drivers return from navigating: "normal", "eager" or "none". The
+            requests wait for their own "page_load" state unless it is "normal".
+        page_load_timeout: float
+            Seconds a request without "wait_time" waits for its "page_load" state
+        max_pages: int
+            Pages a driver renders before being restarted, 0 to keep it forever
+        max_rss: int
+            Bytes of memory used by the processes of a driver above which it is restarted
+        hang_timeout: float
+            Seconds a driver call may last before the processes of the driver are killed
+        watchdog_interval: float
+            Seconds between two checks of the memory and calls of the drivers
         """
 
         webdriver_base_path = f'selenium.webdriver.{driver_name}'
@@ -50,22 +114,38 @@ class SeleniumMiddleware:
 
         self.driver_kwargs = {
             'executable_path': driver_executable_path,
-            f'{driver_name}_options': driver_options
+            f'{driver_name}_options': driver_options,
+            'desired_capabilities': {'pageLoadStrategy': page_load_strategy, **PERFORMANCE_LOG_CAPABILITIES}
         }
-
-        # locally installed driver
-        if driver_executable_path is not None:
-            self.driver_kwargs = {
-                'executable_path': driver_executable_path,
-                f'{driver_name}_options': driver_options
-            }
-            self.driver = self.driver_klass(**self.driver_kwargs)
-        # remote driver
-        elif command_executor is not None:
+        self.driver_options = driver_options
+        self.command_executor = command_executor
+        self.page_load_strategy = page_load_strategy
+        self.page_load_timeout = page_load_timeout
+
+        self.pool = DriverPool(self.spawn_driver, pool_size)
+        self.supervisor = DriverSupervisor(self.pool, stats, max_pages, max_rss, hang_timeout, watchdog_interval)
+        self.supervisor.start()
+        self.blocklist = blocklist
+        self.stats = stats
+        # the URL patterns currently blocked by each driver
+        self.blocked = weakref.WeakKeyDictionary()
+        # the drivers which do not keep a performance log
+        self.unlogged = weakref.WeakSet()
+
+    def spawn_driver(self):
+        """Launch a new locally installed or remote driver"""
+
+        with timed(self.stats, 'driver_spawn'):
+            # locally installed driver
+            if self.driver_kwargs['executable_path'] is not None:
+                return self.driver_klass(**self.driver_kwargs)
+            # remote driver
             from selenium import webdriver
-            capabilities = driver_options.to_capabilities()
-            self.driver = webdriver.Remote(command_executor=command_executor,
-                                           desired_capabilities=capabilities)
+            capabilities = self.driver_options.to_capabilities()
+            capabilities['pageLoadStrategy'] = self.page_load_strategy
+            capabilities.update(PERFORMANCE_LOG_CAPABILITIES)
+            return webdriver.Remote(command_executor=self.command_executor,
+                                    desired_capabilities=capabilities)
 
     @classmethod
     def from_crawler(cls, crawler):
@@ -76,6 +156,17 @@ class SeleniumMiddleware:
         browser_executable_path = crawler.settings.get('SELENIUM_BROWSER_EXECUTABLE_PATH')
         command_executor = crawler.settings.get('SELENIUM_COMMAND_EXECUTOR')
         driver_arguments = crawler.settings.get('SELENIUM_DRIVER_ARGUMENTS')
+        pool_size = crawler.settings.getint('SELENIUM_POOL_SIZE', 1)
+        page_load_strategy = crawler.settings.get('SELENIUM_PAGE_LOAD_STRATEGY', 'normal')
+        page_load_timeout = crawler.settings.getfloat('SELENIUM_PAGE_LOAD_TIMEOUT', 30)
+        max_pages = crawler.settings.getint('SELENIUM_DRIVER_MAX_PAGES')
+        max_rss = crawler.settings.getint('SELENIUM_DRIVER_MAX_RSS')
+        hang_timeout = crawler.settings.getfloat('SELENIUM_DRIVER_HANG_TIMEOUT')
+        watchdog_interval = crawler.settings.getfloat('SELENIUM_WATCHDOG_INTERVAL', 10)
+        blocklist = ResourceBlocklist(
+            urls=crawler.settings.getlist('SELENIUM_BLOCKED_URLS'),
+            resource_types=crawler.settings.getlist('SELENIUM_BLOCKED_RESOURCE_TYPES')
+        )
 
         if driver_name is None:
             raise NotConfigured('SELENIUM_DRIVER_NAME must be set')
@@ -89,7 +180,16 @@ class SeleniumMiddleware:
             driver_executable_path=driver_executable_path,
             browser_executable_path=browser_executable_path,
             command_executor=command_executor,
-            driver_arguments=driver_arguments
+            driver_arguments=driver_arguments,
+            pool_size=pool_size,
+            blocklist=blocklist,
+            stats=crawler.stats,
+            page_load_strategy=page_load_strategy,
+            page_load_timeout=page_load_timeout,
+            max_pages=max_pages,
+            max_rss=max_rss,
+            hang_timeout=hang_timeout,
+            watchdog_interval=watchdog_interval
         )
 
         crawler.signals.connect(middleware.spider_closed, signals.spider_closed)
@@ -97,19 +197,57 @@ class SeleniumMiddleware:
         return middleware
 
     def process_request(self, request, spider):
-        """Process a request using the selenium driver if applicable"""
+        """Process a request using the selenium driver if applicable
+
+        The page is rendered in the driver thread pool, a ``Deferred`` firing
+        with the response is returned so the reactor keeps serving the other
+        requests meanwhile. While every driver is busy the request waits for
+        one in its download slot.
+        """
 
         if not isinstance(request, SeleniumRequest):
             return None
 
-        if request.spawn_driver:
-            driver = self.driver_klass(**self.driver_kwargs)
-        elif request.driver is not None:
-            driver = request.driver
-        else:
-            driver = self.driver
-
-        driver.get(request.url)
+        dfd = self.pool.acquire()
+        dfd.addCallback(self._render_in_pool, request, spider)
+        return dfd
+
+    def _render_in_pool(self, driver, request, spider):
+        def _release_on_failure(failure):
+            self.supervisor.rendered(driver)
+            if self.supervisor.killed(driver):
+                # retried on a fresh driver by the RetryMiddleware
+                failure = Failure(defer.TimeoutError(f"Driver hung rendering {request.url}"))
+            self.supervisor.release(driver)
+            return failure
+
+        def _release(response):
+            self.supervisor.rendered(driver)
+            self.supervisor.release(driver)
+            self._record_page_load(request, spider)
+            return response
+
+        dfd = self.supervisor.run(driver, self._render, driver, request)
+        dfd.addCallbacks(_release, _release_on_failure)
+        return dfd
+
+    def _render(self, driver, request):
+        """Load the request in the driver and build the response"""
+
+        started = time.monotonic()
+        page_type = request.meta.get('page_type')
+        self._block(driver, self.blocklist if request.block is None else ResourceBlocklist(urls=request.block))
+        if self.page_load_strategy != 'normal':
+            driver.execute_script(MARK_PREVIOUS_PAGE_SCRIPT)
+        # drops the events of the previous pages
+        self._performance_log(driver)
+        with timed(self.stats, 'driver_get', page_type):
+            driver.get(request.url)
+        if self.page_load_strategy != 'normal':
+            with timed(self.stats, 'page_load_wait', page_type):
+                WebDriverWait(driver, request.wait_time or self.page_load_timeout, POLL_FREQUENCY).until(
+                    lambda driver: driver.execute_script(READY_SCRIPT, READY_STATES[request.page_load or 'eager'])
+                )
 
         for cookie_name, cookie_value in request.cookies.items():
             driver.add_cookie(
@@ -118,10 +256,17 @@ class SeleniumMiddleware:
                     'value': cookie_value
                 }
             ).get_screenshot_as_png()
+        if request.click:
+            with timed(self.stats, 'click', page_type):
+                WebDriverWait(driver, request.wait_time, POLL_FREQUENCY).until(
+                    EC.element_to_be_clickable((By.XPATH, request.click))
+                ).click()
+
         if request.wait_until:
-            WebDriverWait(driver, request.wait_time).until(
-                request.wait_until
-            )
+            with timed(self.stats, 'wait_until', page_type):
+                WebDriverWait(driver, request.wait_time, POLL_FREQUENCY).until(
+                    expected_condition(request.wait_until)
+                )
 
         if request.script:
             driver.execute_script(request.script)
@@ -129,37 +274,295 @@ class SeleniumMiddleware:
         if request.screenshot:
             request.meta['screenshot'] = driver.get_screenshot_as_png()
 
-        body = str.encode(driver.page_source)
+        with timed(self.stats, 'page_source', page_type):
+            body = str.encode(driver.page_source)
+        entries = self._performance_log(driver)
+        if entries is not None:
+            requests, transferred = logged_page_load(entries)
+        else:
+            requests, transferred = driver.execute_script(PAGE_LOAD_SCRIPT)
+        request.meta['page_load'] = {
+            'seconds': time.monotonic() - started,
+            'requests': requests,
+            'bytes': transferred
+        }
+
+        with timed(self.stats, 'html_response', page_type):
+            return HtmlResponse(
+                driver.current_url,
+                body=body,
+                encoding='utf-8',
+                request=request
+            )
+
+    def _performance_log(self, driver):
+        """The performance log entries since the previous call, None when the driver keeps no such log"""
+
+        if driver in self.unlogged:
+            return None
+        try:
+            return driver.get_log('performance')
+        except (AttributeError, WebDriverException):
+            self.unlogged.add(driver)
+            return None
+
+    def _block(self, driver, blocklist):
+        """Make the driver block the subresources of ``blocklist`` through DevTools"""
+
+        patterns = blocklist.patterns if blocklist else ()
+        if self.blocked.get(driver, ()) == patterns:
+            return
+        if not hasattr(driver, 'execute_cdp_cmd'):
+            # only the local chromium drivers talk DevTools
+            if patterns:
+                logger.warning(f"{type(driver).__name__} cannot block resources, loading them all")
+                self.blocked[driver] = patterns
+            return
+        driver.execute_cdp_cmd('Network.enable', {})
+        driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': list(patterns)})
+        self.blocked[driver] = patterns
+
+    def _record_page_load(self, request, spider):
+        page_load = request.meta.get('page_load')
+        if page_load is None or self.stats is None:
+            return
+        logger.debug(f"Loaded {request.url} in {page_load['seconds']:.2f}s, "
+                     f"{page_load['bytes']} bytes over {page_load['requests']} requests")
+        prefixes = ['selenium/page_load']
+        if request.meta.get('page_type'):
+            prefixes.append(f"selenium/page_load/{request.meta['page_type']}")
+        for prefix in prefixes:
+            self.stats.inc_value(f'{prefix}/count', spider=spider)
+            self.stats.inc_value(f'{prefix}/seconds', page_load['seconds'], spider=spider)
+            self.stats.inc_value(f'{prefix}/bytes', page_load['bytes'], spider=spider)
+            self.stats.inc_value(f'{prefix}/requests', page_load['requests'], spider=spider)
+
+    def spider_closed(self):
+        """Shutdown the drivers when spider is closed"""
+
+        return self.supervisor.close()
+
 
-        # Expose the driver via the "meta" attribute
-        request.meta.update({'driver': driver})
+class RenderedPageCacheMiddleware:
+    """Scrapy middleware serving selenium requests from a disk cache of rendered pages
+
+    Pages are cached by URL, and by the element clicked before the snapshot,
+    for as long as the TTL of their "page_type" meta key allows. A page is
+    only stored once its callback extracted fields from it, so a page
+    rendered before its content is not served again.
+    """
+
+    def __init__(self, cache, stats):
+        self.cache = cache
+        self.stats = stats
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        """Initialize the middleware with the crawler settings"""
+
+        settings = crawler.settings
+        if not settings.getbool('SELENIUM_CACHE_ENABLED'):
+            raise NotConfigured('SELENIUM_CACHE_ENABLED is not set')
+
+        cache = PageCache(
+            settings.get('SELENIUM_CACHE_PATH'),
+            max_size=settings.getint('SELENIUM_CACHE_MAX_SIZE'),
+            ttls=settings.getdict('SELENIUM_CACHE_TTLS'),
+            earnings_fallback_ttl=settings.getint('SELENIUM_CACHE_EARNINGS_FALLBACK_TTL', 86400)
+        )
+        middleware = cls(cache, crawler.stats)
+
+        crawler.signals.connect(middleware.spider_closed, signals.spider_closed)
+        crawler.signals.connect(middleware.record_earnings_date, earnings_date_scraped)
+        crawler.signals.connect(middleware.page_parsed, page_parsed)
+
+        return middleware
+
+    def _cacheable(self, request):
+        return (
+            isinstance(request, SeleniumRequest)
+            and self.cache.cacheable(request.meta.get('page_type'))
+        )
+
+    def process_request(self, request, spider):
+        """Return the cached page of the request if it is still fresh"""
+
+        if not self._cacheable(request):
+            return None
+
+        page_type = request.meta['page_type']
+        body = self.cache.get(self.cache.key(request.url, request.click), page_type, request.meta.get('ticker'))
+        if body is None:
+            self.stats.inc_value('selenium_cache/miss', spider=spider)
+            self.stats.inc_value(f'selenium_cache/miss/{page_type}', spider=spider)
+            return None
 
+        self.stats.inc_value('selenium_cache/hit', spider=spider)
+        self.stats.inc_value(f'selenium_cache/hit/{page_type}', spider=spider)
         return HtmlResponse(
-            driver.current_url,
+            request.url,
             body=body,
             encoding='utf-8',
-            request=request
+            request=request,
+            flags=['cached']
         )
 
+    def page_parsed(self, response, fields):
+        """Store a page rendered by selenium once its callback extracted fields from it"""
+
+        request = response.request
+        if (not fields or {'cached', 'archived'} & set(response.flags) or response.status != 200
+                or not self._cacheable(request)):
+            return
+
+        evicted = self.cache.set(self.cache.key(request.url, request.click), request.url,
+                                 request.meta['page_type'], request.meta.get('ticker'), response.body)
+        self.stats.inc_value('selenium_cache/store')
+        self.stats.inc_value('selenium_cache/evicted', evicted)
+        self.stats.set_value('selenium_cache/size', self.cache.size)
+
+    def record_earnings_date(self, ticker, earnings_date):
+        """Remember the earnings date invalidating the statements of a ticker"""
+
+        self.cache.set_earnings_date(ticker, datetime.combine(earnings_date, datetime.min.time()).timestamp())
+
+    def spider_closed(self):
+        self.cache.close()
+
+
+class PageArchiveMiddleware:
+    """Scrapy middleware recording the pages of a crawl into an archive or replaying them
+
+    In "replay" mode the crawl is served from the archive without any browser
+    nor network, the pages missing from the archive are ignored.
+    """
+
+    def __init__(self, archive, stats):
+        self.archive = archive
+        self.stats = stats
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        """Initialize the middleware with the crawler settings"""
+
+        mode = crawler.settings.get('PAGE_ARCHIVE_MODE')
+        if not mode:
+            raise NotConfigured('PAGE_ARCHIVE_MODE is not set')
+
+        middleware = cls(PageArchive(crawler.settings.get('PAGE_ARCHIVE_PATH'), mode), crawler.stats)
+        crawler.signals.connect(middleware.spider_closed, signals.spider_closed)
+        return middleware
+
+    def _key(self, request):
+        # pages are archived as rendered, after the click of their request
+        return self.archive.key(request.url, getattr(request, 'click', None))
+
+    def process_request(self, request, spider):
+        """Serve the request from the archive in "replay" mode"""
+
+        if self.archive.mode != 'replay' or not request.url.startswith('http'):
+            return None
+
+        key = self._key(request)
+        if key not in self.archive:
+            self.stats.inc_value('page_archive/miss', spider=spider)
+            raise IgnoreRequest(f"{request.url} is not archived")
+
+        entry, body = self.archive.replay(key)
+        self.stats.inc_value('page_archive/hit', spider=spider)
+        headers = Headers(entry['headers'])
+        response_klass = responsetypes.from_args(headers=headers, url=entry['url'], body=body)
+        return response_klass(
+            entry['url'],
+            status=entry['status'],
+            headers=headers,
+            body=body,
+            request=request,
+            flags=['archived']
+        )
+
+    def process_response(self, request, response, spider):
+        """Archive the response in "record" mode"""
+
+        if self.archive.mode != 'record' or 'archived' in response.flags or not request.url.startswith('http'):
+            return response
+
+        if self.archive.record(self._key(request), response.url, response.status,
+                               dict(response.headers.to_unicode_dict()), response.body):
+            self.stats.inc_value('page_archive/recorded', spider=spider)
+        return response
+
     def spider_closed(self):
-        """Shutdown the driver when spider is closed"""
+        self.archive.close()
+
+
+class StageTimingMiddleware:
+    """Spider middleware timing the callbacks, per page type, into the stats histograms
 
-        self.driver.quit()
+    Only the time spent producing each output of the callback is counted, not
+    the time the output spends in the rest of the chain.
+    """
+
+    def __init__(self, stats):
+        self.stats = stats
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        return cls(crawler.stats)
+
+    def process_spider_output(self, response, result, spider):
+        elapsed = 0
+        iterator = iter(result)
+        try:
+            while True:
+                started = time.perf_counter()
+                try:
+                    output = next(iterator)
+                except StopIteration:
+                    break
+                finally:
+                    elapsed += time.perf_counter() - started
+                yield output
+        finally:
+            observe(self.stats, 'parse', elapsed, response.meta.get('page_type'))
 
 
 class SpiderExceptionHandler():
 
+    def __init__(self, crawler):
+        self.crawler = crawler
+
     @classmethod
     def from_crawler(cls, crawler):
-        return cls()
+        return cls(crawler)
 
     def process_spider_exception(self, response, exception, spider):
-        driver = response.meta['driver']
+        screenshot = response.meta.get('screenshot')
+        if screenshot is not None:
+            save_screenshot(screenshot)
+
+        # the page brought no fields, its item is completed without waiting for its timeout
+        parse_failed = getattr(spider, 'parse_failed', None)
+        if parse_failed is not None:
+            return parse_failed(response, exception)
+        return None
+
+
+def save_screenshot(png):
+    """Write a PNG screenshot to the screenshots folder"""
+
+    Path('screenshots').mkdir(exist_ok=True)
+    with open(f'screenshots/ss_{datetime.today().strftime("%m-%d-%Y_%H:%M:%S.%f")}.png', 'wb') as screenshot:
+        screenshot.write(png)
+
 
-        # take screenshot
-        Path('screenshots').mkdir(exist_ok=True)
-        with open(f'screenshots/ss_{datetime.today().strftime("%m-%d-%Y_%H:%M:%S.%f")}.png', 'wb') as screenshot:
-            screenshot.write(driver.get_screenshot_as_png())
+def logged_page_load(entries):
+    """Count the responses of the network events of a performance log and sum their bytes on the wire"""
 
-        # close driver of problematic response
-        driver.close()
\ No newline at end of file
+    requests = transferred = 0
+    for entry in entries:
+        message = json.loads(entry['message'])['message']
+        if message['method'] == 'Network.loadingFinished':
+            requests += 1
+            transferred += message['params'].get('encodedDataLength', 0)
+    return requests, int(transferred)
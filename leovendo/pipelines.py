@@ -1,11 +1,68 @@
-from leovendo.exporters import GoogleSheetItemExporter
+from scrapy.exceptions import NotConfigured
+
+from leovendo.exporters import GoogleSheetItemExporter, ParquetItemExporter
+from leovendo.history import SnapshotStore
+from leovendo.timing import timed
 
 
 class GoogleSheetExportPipeline:
+    @classmethod
+    def from_crawler(cls, crawler):
+        # a replayed crawl serves archived pages, its items must not reach the live sheet
+        if crawler.settings.get('PAGE_ARCHIVE_MODE') == 'replay':
+            raise NotConfigured('the Google Sheet export is disabled while replaying a page archive')
+        return cls()
+
+    def open_spider(self, spider):
+        settings = spider.settings
+        spreadsheet = settings.get('SPREADSHEET_NAME')
+        worksheet = settings.get('WORKSHEET_NAME')
+        self.exporter = GoogleSheetItemExporter(
+            spreadsheet,
+            worksheet,
+            batch_size=settings.getint('GOOGLE_SHEET_BATCH_SIZE', 100),
+            flush_interval=settings.getfloat('GOOGLE_SHEET_FLUSH_INTERVAL', 10),
+            max_pending=settings.getint('GOOGLE_SHEET_MAX_PENDING', 1000),
+            native_numbers=settings.getbool('GOOGLE_SHEET_NATIVE_NUMBERS'),
+            stats=spider.crawler.stats
+        )
+        self.exporter.start_exporting()
+
+    def close_spider(self, spider):
+        return self.exporter.finish_exporting()
+
+    def process_item(self, item, spider):
+        dfd = self.exporter.export_item(item)
+        dfd.addCallback(lambda _: item)
+        return dfd
+
+
+class ParquetExportPipeline:
+    def __init__(self, export_dir, row_group_size, stats=None):
+        self.export_dir = export_dir
+        self.row_group_size = row_group_size
+        self.stats = stats
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        export_dir = crawler.settings.get('PARQUET_EXPORT_DIR')
+        if not export_dir:
+            raise NotConfigured('PARQUET_EXPORT_DIR must be set')
+        return cls(export_dir, crawler.settings.getint('PARQUET_ROW_GROUP_SIZE', 1000), crawler.stats)
+
     def open_spider(self, spider):
-        spreadsheet = spider.settings.get('SPREADSHEET_NAME')
-        worksheet = spider.settings.get('WORKSHEET_NAME')
-        self.exporter = GoogleSheetItemExporter(spreadsheet, worksheet)
+        name = spider.name
+        # a shard, a worker or a resumed run only exports a part of the universe
+        universe = not getattr(spider, 'resume', False)
+        if getattr(spider, 'shards', None) is not None:
+            name = f"{name}-shard{spider.shard}of{spider.shards}"
+            universe = False
+        if getattr(spider, 'work_queue', None) is not None:
+            name = f"{name}-{spider.worker}"
+            universe = False
+        path = ParquetItemExporter.partition_path(self.export_dir, name)
+        self.exporter = ParquetItemExporter(path, row_group_size=self.row_group_size, stats=self.stats,
+                                            universe=universe)
         self.exporter.start_exporting()
 
     def close_spider(self, spider):
@@ -13,4 +70,41 @@ class GoogleSheetExportPipeline:
 
     def process_item(self, item, spider):
         self.exporter.export_item(item)
-        return item
\ No newline at end of file
+        return item
+
+
+class HistoryStorePipeline:
+    """Appends the snapshot of each component to the local ``SnapshotStore``, a batch at a time"""
+
+    def __init__(self, directory, batch_size, stats=None):
+        self.directory = directory
+        self.batch_size = batch_size
+        self.stats = stats
+        self.items = []
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        directory = crawler.settings.get('HISTORY_STORE_DIR')
+        if not directory:
+            raise NotConfigured('HISTORY_STORE_DIR must be set')
+        return cls(directory, crawler.settings.getint('HISTORY_BATCH_SIZE', 1000), crawler.stats)
+
+    def open_spider(self, spider):
+        self.store = SnapshotStore(self.directory)
+
+    def close_spider(self, spider):
+        self.flush()
+        # sorted once here rather than by the first reader
+        with timed(self.stats, 'history_index'):
+            self.store.build_indexes()
+
+    def process_item(self, item, spider):
+        self.items.append(item)
+        if len(self.items) >= self.batch_size:
+            self.flush()
+        return item
+
+    def flush(self):
+        with timed(self.stats, 'history_append'):
+            self.store.append(self.items)
+        self.items = []
@@ -0,0 +1,121 @@
+"""This module contains the ``DriverPool`` class"""
+
+import logging
+
+from twisted.internet import defer, reactor, threads
+from twisted.python.failure import Failure
+from twisted.python.threadpool import ThreadPool
+
+logger = logging.getLogger(__name__)
+
+
+class DriverPool:
+    """Bounded pool of reusable selenium webdrivers
+
+    Every interaction with a driver blocks until chromedriver answers, so the
+    pool owns a thread pool with one thread per driver and all driver calls go
+    through ``run``. The bookkeeping itself only happens on the reactor thread.
+    While the pool is exhausted, the leases wait in line for a driver to be
+    released or for a slot to be freed.
+    """
+
+    def __init__(self, driver_factory, size):
+        """Initialize an empty pool
+
+        Parameters
+        ----------
+        driver_factory: callable
+            Called without arguments to launch a new driver.
+        size: int
+            The maximum number of drivers alive at the same time.
+        """
+
+        self.driver_factory = driver_factory
+        self.size = size
+        self.idle = []
+        self.leased = set()
+        self.launching = 0
+        # the Deferreds of the leases waiting for a driver, first come first served
+        self.waiters = []
+        self.threadpool = ThreadPool(minthreads=0, maxthreads=size, name='selenium')
+        self.threadpool.start()
+
+    @property
+    def exhausted(self):
+        """True if every driver is leased and no new one may be launched"""
+
+        return not self.idle and len(self.leased) + self.launching >= self.size
+
+    def run(self, func, *args, **kwargs):
+        """Call ``func`` in the driver thread pool and return a ``Deferred``"""
+
+        return threads.deferToThreadPool(reactor, self.threadpool, func, *args, **kwargs)
+
+    def acquire(self):
+        """Lease a driver, launching one if the pool has room
+
+        Returns a ``Deferred`` firing with the driver, once one is released
+        or a slot is freed when the pool is exhausted.
+        """
+
+        if self.idle:
+            driver = self.idle.pop()
+            self.leased.add(driver)
+            return defer.succeed(driver)
+        if self.exhausted:
+            waiter = defer.Deferred(self.waiters.remove)
+            self.waiters.append(waiter)
+            return waiter
+        return self._launch()
+
+    def _launch(self):
+        self.launching += 1
+        logger.debug(f"Launching driver {len(self.leased) + self.launching}/{self.size}")
+        dfd = self.run(self.driver_factory)
+        dfd.addBoth(self._launched)
+        return dfd
+
+    def _launched(self, result):
+        self.launching -= 1
+        if not isinstance(result, Failure):
+            self.leased.add(result)
+        return result
+
+    def release(self, driver):
+        """Give a leased driver back to the pool, or to the first lease waiting for one"""
+
+        if driver not in self.leased:
+            return
+        if self.waiters:
+            self.waiters.pop(0).callback(driver)
+            return
+        self.leased.remove(driver)
+        self.idle.append(driver)
+
+    def discard(self, driver):
+        """Quit a leased driver and free its slot for a fresh one"""
+
+        self.leased.discard(driver)
+        if self.waiters:
+            self._launch().chainDeferred(self.waiters.pop(0))
+        return self.run(self._quit, driver)
+
+    def close(self):
+        """Quit every driver of the pool and stop its threads"""
+
+        for waiter in self.waiters:
+            waiter.errback(defer.CancelledError("The driver pool was closed"))
+        self.waiters = []
+        drivers = self.idle + list(self.leased)
+        self.idle = []
+        self.leased = set()
+        dfd = defer.DeferredList([self.run(self._quit, driver) for driver in drivers])
+        dfd.addBoth(lambda _: self.threadpool.stop())
+        return dfd
+
+    @staticmethod
+    def _quit(driver):
+        try:
+            driver.quit()
+        except Exception:
+            logger.warning("Failed to quit driver", exc_info=True)
@@ -0,0 +1,109 @@
+"""Screens of the snapshots of a ``SnapshotStore`` on the values of their fields"""
+
+import re
+from collections import namedtuple
+
+import numpy as np
+
+from leovendo.values import parse_number
+
+Filter = namedtuple('Filter', ['column', 'operator', 'value'])
+
+FILTER = re.compile(r'^\s*(\w+)\s*(<=|>=|==|=|<|>)\s*(.+?)\s*$')
+OPERATORS = {
+    '<': np.less,
+    '<=': np.less_equal,
+    '>': np.greater,
+    '>=': np.greater_equal,
+    '=': np.equal,
+    '==': np.equal
+}
+BOOLEANS = {'true': 1.0, 'yes': 1.0, 'y': 1.0, 'false': 0.0, 'no': 0.0, 'n': 0.0}
+
+
+def parse_filter(text, columns):
+    """Parse a filter such as "pe_ratio < 15", "fwd_annual_dividend_yield > 2%" or "vanguard_holder = yes"
+
+    The values are read like the displayed ones, percentages as fractions and
+    with their magnitude suffix.
+    """
+
+    match = FILTER.match(text)
+    if match is None:
+        raise ValueError(f"Invalid filter {text!r}, expected '<column> <operator> <value>'")
+    column, operator, value = match.groups()
+    if column not in columns:
+        raise ValueError(f"Unknown column {column!r} in filter {text!r}")
+    number = BOOLEANS.get(value.lower(), parse_number(value))
+    if number is None:
+        raise ValueError(f"Invalid value {value!r} in filter {text!r}")
+    return Filter(column, operator, number)
+
+
+def _between(store, condition):
+    value = condition.value
+    if condition.operator in ('<', '<='):
+        return store.rows_between(condition.column, high=value, include_high=condition.operator == '<=')
+    if condition.operator in ('>', '>='):
+        return store.rows_between(condition.column, low=value, include_low=condition.operator == '>=')
+    return store.rows_between(condition.column, value, value)
+
+
+def _most_selective(store, filters):
+    """The rows matching the filter which matches the fewest, found in its index, and the other filters"""
+
+    candidates = [_between(store, condition) for condition in filters]
+    selective = min(range(len(filters)), key=lambda index: len(candidates[index]))
+    return np.asarray(candidates[selective]), filters[:selective] + filters[selective + 1:]
+
+
+def _keep(store, rows, condition):
+    return rows[OPERATORS[condition.operator](store.column(condition.column)[rows], condition.value)]
+
+
+def screen(store, filters, day, since=None, within=None):
+    """The rows of the snapshots matching every filter
+
+    Parameters
+    ----------
+    store: leovendo.history.SnapshotStore
+        The snapshots screened.
+    filters: list
+        The ``Filter`` each snapshot must match.
+    day: datetime.date
+        The snapshots screened are the latest of each ticker on or before ``day``.
+    since: datetime.date
+        Screen every daily snapshot from ``since`` to ``day`` instead.
+    within: int
+        Days before ``day`` the latest snapshot of a ticker may be taken to be
+        screened, no limit when None. Ignored with ``since``.
+
+    Returns
+    -------
+    numpy.ndarray
+        The matching rows, sorted by ticker then day.
+    """
+
+    if since is None:
+        latest = store.rows_as_of(day, within)
+        rows, remaining = latest[latest >= 0], filters
+        if filters:
+            matching, others = _most_selective(store, filters)
+            if len(matching) < len(rows):
+                # the rows matching the most selective filter, found in its index, which are the
+                # latest of their ticker are checked against the others
+                rows, remaining = matching[latest[store.ticker_ids[matching]] == matching], others
+    else:
+        if filters:
+            # the rows matching the most selective filter, found in its index, are checked against the others
+            rows, remaining = _most_selective(store, filters)
+            days = store.days[rows]
+            rows = rows[(days >= since.toordinal()) & (days <= day.toordinal())]
+        else:
+            rows = np.flatnonzero((store.days >= since.toordinal()) & (store.days <= day.toordinal()))
+            remaining = []
+        # a ticker exported several times a day keeps its latest row
+        rows = rows[store.latest()[rows]]
+    for condition in remaining:
+        rows = _keep(store, rows, condition)
+    return rows[np.lexsort((store.days[rows], store.ticker_ids[rows]))]
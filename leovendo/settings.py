@@ -3,14 +3,17 @@ from multiprocessing import cpu_count
 from pathlib import Path
 from shutil import which
 
+from leovendo.blocking import YAHOO_BLOCKED_RESOURCE_TYPES, YAHOO_BLOCKED_URLS
+
 BOT_NAME = 'leovendo'
 
 SPIDER_MODULES = ['leovendo.spiders']
 NEWSPIDER_MODULE = 'leovendo.spiders'
+COMMANDS_MODULE = 'leovendo.commands'
 
 
 # Crawl responsibly by identifying yourself (and your website) on the user-agent
-# USER_AGENT = 'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/80.0.3987.122 Safari/537.36'
+USER_AGENT = 'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/80.0.3987.122 Safari/537.36'
 
 # Obey robots.txt rules
 ROBOTSTXT_OBEY = True
@@ -39,12 +42,15 @@ CONCURRENT_REQUESTS = cpu_count()
 #}
 
 # Enable or disable spider middlewares
-# SPIDER_MIDDLEWARES = {
-#    'leovendo.middlewares.SpiderExceptionHandler': 543,
-# }
+SPIDER_MIDDLEWARES = {
+   'leovendo.middlewares.SpiderExceptionHandler': 543,
+   'leovendo.middlewares.StageTimingMiddleware': 950,
+}
 
 # Enable or disable downloader middlewares
 DOWNLOADER_MIDDLEWARES = {
+    'leovendo.middlewares.PageArchiveMiddleware': 740,
+    'leovendo.middlewares.RenderedPageCacheMiddleware': 750,
     'leovendo.middlewares.SeleniumMiddleware': 800,
     'scrapy.downloadermiddlewares.retry.RetryMiddleware': 500
 }
@@ -57,6 +63,8 @@ DOWNLOADER_MIDDLEWARES = {
 # Configure item pipelines
 ITEM_PIPELINES = {
    'leovendo.pipelines.GoogleSheetExportPipeline': 300,
+   'leovendo.pipelines.ParquetExportPipeline': 310,
+   'leovendo.pipelines.HistoryStorePipeline': 320,
 }
 
 # Enable and configure the AutoThrottle extension (disabled by default)
@@ -86,10 +94,114 @@ SELENIUM_DRIVER_NAME = 'chrome'
 PROJECT_DRIVER_PATH = str(Path('leovendo/drivers/windows/chromedriver.exe').resolve())
 SELENIUM_DRIVER_EXECUTABLE_PATH = which('chromedriver') or PROJECT_DRIVER_PATH
 SELENIUM_DRIVER_ARGUMENTS = ['--headless', '--disable-gpu', '--start-maximized', '--window-size=1366,768']
+# maximum number of browsers alive at the same time, each page leases one while it renders
+SELENIUM_POOL_SIZE = cpu_count()
+# subresources the browsers never load: URL patterns where "*" matches anything and
+# kinds among 'image', 'font', 'media' and 'stylesheet'
+SELENIUM_BLOCKED_URLS = YAHOO_BLOCKED_URLS
+SELENIUM_BLOCKED_RESOURCE_TYPES = YAHOO_BLOCKED_RESOURCE_TYPES
+# when the browsers return from loading a page: 'normal' once every subresource loaded,
+# 'eager' once the DOM is parsed or 'none' right away, the spider then waits for the
+# elements it needs on each page type
+SELENIUM_PAGE_LOAD_STRATEGY = 'none'
+# seconds a page waits to be loaded when its request sets no wait time
+SELENIUM_PAGE_LOAD_TIMEOUT = 30
+# pages a browser renders before being restarted, restarting keeps its memory from growing
+SELENIUM_DRIVER_MAX_PAGES = 200
+# bytes of memory used by the processes of a browser above which it is restarted
+SELENIUM_DRIVER_MAX_RSS = 1024 * 1024 * 1024
+# seconds a browser call may last before the processes of the browser are killed, must be
+# longer than a page takes to load, 0 never kills them
+SELENIUM_DRIVER_HANG_TIMEOUT = 120
+# seconds between two checks of the memory and calls of the browsers
+SELENIUM_WATCHDOG_INTERVAL = 10
+# screenshot every rendered page so the page of a failing callback is saved to screenshots/,
+# the driver has rendered other pages by then, so every page pays for a screenshot round-trip
+# and carries the PNG in its meta: enable it to debug failing callbacks
+SELENIUM_FAILURE_SCREENSHOTS = False
+# 'record' archives every page of the crawl, 'replay' serves the crawl from the archive
+# without browser nor network (e.g. "-s PAGE_ARCHIVE_MODE=replay") nor export to the Google Sheet
+PAGE_ARCHIVE_MODE = None
+PAGE_ARCHIVE_PATH = 'archives/yahoo_finance.zip'
+# keeps histograms of the duration of the crawl stages per page type, their p50/p95/p99
+# end up in the stats and they are written every METRICS_INTERVAL seconds to
+# METRICS_FILE in the Prometheus text format
+STATS_CLASS = 'leovendo.statscollectors.HistogramStatsCollector'
+METRICS_FILE = 'metrics/leovendo.prom'
+METRICS_INTERVAL = 15
+
+# how the spider extracts the pages: 'selenium' renders them in Chrome, 'http' downloads
+# them with scrapy and reads the data Yahoo embeds in them (overridden by "-a engine=...")
+YAHOO_FINANCE_ENGINE = 'selenium'
+
+# disk cache of the pages rendered by selenium, the TTLs are in seconds per page type,
+# 0 never caches the page type and 'earnings' keeps it until the ticker's next earnings date
+SELENIUM_CACHE_ENABLED = True
+SELENIUM_CACHE_PATH = '.selenium_cache/pages.sqlite'
+SELENIUM_CACHE_MAX_SIZE = 512 * 1024 * 1024
+SELENIUM_CACHE_TTLS = {
+    'summary': 0,
+    'statistics': 0,
+    'profile': 30 * 86400,
+    # rendered without waiting for its table, which some tickers lack, a holders page
+    # missing it still brings a field and is cached, but only for a day
+    'holders': 86400,
+    'financials': 'earnings',
+    'balance_sheet': 'earnings',
+    'cash_flow': 'earnings',
+}
+# how long 'earnings' pages stay fresh while the ticker's earnings date is unknown
+SELENIUM_CACHE_EARNINGS_FALLBACK_TTL = 86400
+
+# seconds after the first page of a ticker arrived before its component is exported
+# with the pages scraped so far
+COMPONENT_TIMEOUT = 600
 
 # Google Sheet settings
 SPREADSHEET_NAME = 'Stocks Value'
 WORKSHEET_NAME = 'test'
+# rows are appended in batches of GOOGLE_SHEET_BATCH_SIZE or every GOOGLE_SHEET_FLUSH_INTERVAL seconds,
+# items wait once GOOGLE_SHEET_MAX_PENDING rows are buffered
+GOOGLE_SHEET_BATCH_SIZE = 100
+GOOGLE_SHEET_FLUSH_INTERVAL = 10
+GOOGLE_SHEET_MAX_PENDING = 1000
+# write the numbers as numbers in base units (fractions for percentages) instead of the
+# strings the sheet has always shown
+GOOGLE_SHEET_NATIVE_NUMBERS = False
+
+# local Parquet export, one file per run under PARQUET_EXPORT_DIR/date=YYYY-MM-DD/
+PARQUET_EXPORT_DIR = 'exports/parquet'
+PARQUET_ROW_GROUP_SIZE = 1000
+# where "scrapy merge_shards" writes the merged export of each run date
+PARQUET_MERGED_DIR = 'exports/merged'
+
+# local store of the daily figures of every ticker, appended HISTORY_BATCH_SIZE components at a time
+HISTORY_STORE_DIR = 'exports/history'
+HISTORY_BATCH_SIZE = 1000
+
+# the work queue of "scrapy crawl_queue", whose spider processes lease the tickers for
+# WORK_QUEUE_LEASE_TIMEOUT seconds and renew their leases while they are alive
+WORK_QUEUE_PATH = '.work_queue/tickers.sqlite'
+WORK_QUEUE_LEASE_TIMEOUT = 300
+
+# fields scraped from each page, checkpointed by ticker and run date: running the spider again the
+# same day with "-a resume=1" (or with "-a run_date=YYYY-MM-DD") skips the tickers already exported
+# and only requests the pages missing for the others, without it every ticker is crawled again,
+# set to None to not checkpoint at all
+CHECKPOINT_PATH = '.checkpoints/pages.sqlite'
+# days the checkpoints of a run are kept
+CHECKPOINT_KEEP_DAYS = 7
+# the requests only hold plain values, so "-s JOBDIR=<dir>" keeps the pending ones in disk queues
+# and a crawl stopped with Ctrl-C (or killed) resumes where it was when started again with it and
+# "-a resume=1"
+
+# tickers crawled at the same time, the next ones are only read from the universe as they
+# complete (default: SELENIUM_POOL_SIZE, or CONCURRENT_REQUESTS for the http engine)
+TICKERS_IN_FLIGHT = None
+
+# file, glob of files (e.g. 'universe/*.csv') or '-' for stdin listing the tickers to scrape,
+# one per line or as the first cell of CSV rows, TICKERS is used when None
+UNIVERSE = None
 
 # tickers to scrape
 TICKERS = [
@@ -0,0 +1,112 @@
+"""Helpers splitting the ticker universe into shards and merging their exports"""
+
+import hashlib
+import json
+from datetime import datetime
+from pathlib import Path
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from leovendo.derived import derive_table
+
+# the schema metadata key of the time a Parquet file was exported
+EXPORTED_AT = b'leovendo.exported_at'
+
+def shard_of(ticker, shards):
+    """Return the shard of a ticker, stable across processes, hosts and Python versions"""
+
+    digest = hashlib.sha1(ticker.strip().upper().encode()).digest()
+    return int.from_bytes(digest[:8], 'big') % shards
+
+
+def parse_shard(shard, shards):
+    """Validate the "shard" and "shards" spider arguments, return them as ints"""
+
+    if shard is None and shards is None:
+        return None, None
+    try:
+        shard, shards = int(shard), int(shards)
+    except (TypeError, ValueError):
+        raise ValueError(f"shard and shards must both be integers, got {shard!r} and {shards!r}")
+    if not 0 <= shard < shards:
+        raise ValueError(f"shard must be in [0, {shards}), got {shard}")
+    return shard, shards
+
+
+def merge_shards(partition_dir, output_path, universe, shards=1):
+    """Merge the Parquet files of a date partition into one file and report its completeness
+
+    When a ticker was exported several times, e.g. by a shard that was run
+    again, the row of the file exported last is kept. The files of a shard and
+    of the whole universe are merged alike, the columns missing from some are
+    null in their rows. The cross-sectional metrics,
+    which the shards cannot compute alone, are computed on the merged universe.
+
+    Parameters
+    ----------
+    partition_dir: str
+        The ``date=YYYY-MM-DD`` directory holding the files of every shard.
+    output_path: str
+        The merged Parquet file.
+    universe: list
+        The tickers that should have been exported.
+    shards: int
+        The number of shards the universe was split into, for the report.
+
+    Returns
+    -------
+    dict
+        The completeness report, also written next to the merged file.
+    """
+
+    files = sorted(Path(partition_dir).glob('*.parquet'), key=_exported_at)
+    if not files:
+        raise FileNotFoundError(f"No Parquet file in {partition_dir}")
+    table = pa.concat_tables([pq.read_table(path) for path in files], promote_options='default')
+
+    latest = {}
+    for index, ticker in enumerate(table.column('ticker').to_pylist()):
+        latest[ticker] = index
+    merged = derive_table(table.take(sorted(latest.values())))
+
+    output_path = Path(output_path)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    pq.write_table(merged, output_path)
+
+    rows = merged.to_pylist()
+    exported = {row['ticker'] for row in rows}
+    universe = sorted(set(universe))
+    # the spider records the pages which failed on each row
+    incomplete = {row['ticker']: row['missing_pages'] for row in rows if row.get('missing_pages')}
+
+    report = {
+        'files': [path.name for path in files],
+        'rows': merged.num_rows,
+        'duplicates': table.num_rows - merged.num_rows,
+        'expected': len(universe),
+        'missing': [ticker for ticker in universe if ticker not in exported],
+        'unexpected': sorted(exported - set(universe)),
+        'incomplete': incomplete,
+        'shards': {}
+    }
+    for shard in range(shards):
+        expected = [ticker for ticker in universe if shard_of(ticker, shards) == shard]
+        report['shards'][shard] = {
+            'expected': len(expected),
+            'exported': sum(ticker in exported for ticker in expected),
+            'missing': [ticker for ticker in expected if ticker not in exported]
+        }
+    report['complete'] = not report['missing'] and not incomplete
+
+    output_path.with_suffix('.report.json').write_text(json.dumps(report, indent=2))
+    return report
+
+
+def _exported_at(path):
+    """The time a Parquet file was exported, its modification time for the files exported before it was recorded"""
+
+    exported_at = (pq.read_schema(path).metadata or {}).get(EXPORTED_AT)
+    if exported_at is not None:
+        return datetime.fromisoformat(exported_at.decode()).timestamp()
+    return path.stat().st_mtime
@@ -0,0 +1,6 @@
+"""Signals sent between the leovendo spiders and middlewares"""
+
+# sent with ``ticker`` and ``earnings_date`` arguments when a quote page shows the next earnings date
+earnings_date_scraped = object()
+# sent with ``response`` and ``fields`` arguments once a callback extracted the fields of a page
+page_parsed = object()
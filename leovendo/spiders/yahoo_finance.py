@@ -1,311 +1,477 @@
-import locale
+import os
 import re
-from datetime import datetime
-from decimal import Decimal
-from pathlib import Path
+import socket
+import uuid
+from datetime import date, datetime
 
-from scrapy import Request, Spider
-from scrapy.loader import ItemLoader
-from scrapy.loader.processors import TakeFirst
+from scrapy import Request, Spider, signals
+from scrapy.exceptions import DontCloseSpider
+from twisted.internet import task
 
 from selenium.webdriver.common.by import By
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.webdriver.support.ui import WebDriverWait
 
 
+from leovendo import embedded
+from leovendo.aggregator import ItemAggregator
+from leovendo.checkpoint import CheckpointStore
+from leovendo.extractors import label_value_index, normalize_label, statement_columns
 from leovendo.http import SeleniumRequest
-from leovendo.items import Component
+from leovendo.items import Component, ComponentLoader
+from leovendo.sharding import parse_shard, shard_of
+from leovendo.signals import earnings_date_scraped, page_parsed
+from leovendo.universe import load_universe
+from leovendo.workqueue import WorkQueue
+from leovendo.values import parse_date, parse_number
 
 class YahooFinanceSpider(Spider):
     name = 'yahoo_finance'
     base_url = 'https://finance.yahoo.com'
     allowed_domains = ['finance.yahoo.com']
-    locale.setlocale(locale.LC_ALL, 'en_US.UTF-8')
+    QUARTERLY_BUTTON = "//button[div[span[text()='Quarterly']]]"
+    ENGINES = ('selenium', 'http')
+    # "-a engine=http" reads the data embedded in the pages instead of rendering them
+    engine = None
+    # "-a universe=path" reads the tickers from a file, a glob of files or stdin ("-")
+    # instead of the UNIVERSE or TICKERS settings
+    universe = None
+    # "-a shard=i -a shards=N" crawls the i-th of N disjoint slices of the tickers
+    shard = None
+    shards = None
+    # "-a queue=path" leases the tickers from a work queue shared with other processes,
+    # see "scrapy crawl_queue"
+    queue = None
+    worker = None
+    work_queue = None
+    # "-a resume=1" skips the tickers exported earlier the same day and only requests the pages
+    # missing for the others, "-a run_date=YYYY-MM-DD" resumes the run of an earlier day
+    resume = None
+    run_date = None
+    checkpoints = None
+    PAGES = {
+        "summary": "/quote/{ticker}?p={ticker}",
+        "statistics": "/quote/{ticker}/key-statistics?p={ticker}",
+        "profile": "/quote/{ticker}/profile?p={ticker}",
+        "holders": "/quote/{ticker}/holders?p={ticker}",
+        "financials": "/quote/{ticker}/financials?p={ticker}",
+        "balance_sheet": "/quote/{ticker}/balance-sheet?p={ticker}",
+        "cash_flow": "/quote/{ticker}/cash-flow?p={ticker}"
+    }
+    CALLBACKS = {
+        "summary": "parse_summary",
+        "statistics": "parse_statistics",
+        "profile": "parse_profile",
+        "holders": "parse_holders",
+        "financials": "parse_income_statement",
+        "balance_sheet": "parse_balance_sheet",
+        "cash_flow": "parse_cash_flow"
+    }
+    # fields read from the statement tables by line item title
+    INCOME_STATEMENT_FIELDS = {
+        "Total Revenue": "total_revenue",
+        "Net Income": "net_income"
+    }
+    BALANCE_SHEET_FIELDS = {
+        "Total Assets": "total_assets",
+        "Total Liabilities": "total_liabilities",
+        "Total stockholders' equity": "total_stockholders_equity"
+    }
+    # fields read from the key-statistics tables by row label
+    STATISTICS_LABELS = {
+        "fiftytwo_week_high": "52 Week High",
+        "forward_pe": "Forward P/E",
+        "peg_ratio": "PEG Ratio",
+        "price_over_sales": "Price/Sales",
+        "price_over_book": "Price/Book",
+        "return_on_assets": "Return on Assets",
+        "return_on_equity": "Return on Equity",
+        "diluted_eps": "Diluted EPS",
+        "quarterly_earnings_growth": "Quarterly Earnings Growth",
+        "fwd_annual_dividend_rate": "Forward Annual Dividend Rate",
+        "fwd_annual_dividend_yield": "Forward Annual Dividend Yield",
+        "ex_dividend_date": "Ex-Dividend Date"
+    }
+    # how the selenium engine renders each page type, the pages are snapshot as soon
+    # as the elements the callbacks read are in the DOM, the conditions are named so
+    # the requests can be serialized
+    RENDER_OPTIONS = {
+        "summary": {
+            "page_load": "none",
+            "wait_time": 10,
+            # the last row of the quote table
+            "wait_until": ("presence_of_element_located", (By.CSS_SELECTOR, "[data-test=ONE_YEAR_TARGET_PRICE-value]"))
+        },
+        "statistics": {
+            "page_load": "none",
+            "wait_time": 20,
+            "wait_until": ("presence_of_element_located", (By.XPATH, "//body[.//tr/td/span[text()='Forward P/E']]"
+                                                                    "[.//tr/td/span[contains(text(), 'Ex-Dividend Date')]]"
+                                                                    "[.//tr/td/span[contains(text(), 'Diluted EPS')]]"))
+        },
+        "profile": {
+            "page_load": "none",
+            "wait_time": 10,
+            "wait_until": ("presence_of_element_located", (By.XPATH, "//div[@data-test='asset-profile']/div/div/p"))
+        },
+        # the holders table is missing for some tickers, the parsed DOM is enough
+        "holders": {
+            "page_load": "eager"
+        },
+        # the Quarterly button only works once the scripts of the page ran
+        "financials": {
+            "page_load": "eager",
+            "click": QUARTERLY_BUTTON,
+            "wait_time": 10,
+            "wait_until": ("presence_of_element_located", (By.XPATH, "//div[span[contains(text(), 'Breakdown')]]/following-sibling::div[2]/span"))
+        },
+        "balance_sheet": {
+            "page_load": "eager",
+            "click": QUARTERLY_BUTTON,
+            "wait_time": 10,
+            "wait_until": ("presence_of_element_located", (By.XPATH, "//div[span[contains(text(), 'Breakdown')]]/following-sibling::div[1]/span"))
+        },
+        "cash_flow": {
+            "page_load": "none",
+            "wait_time": 10,
+            "wait_until": ("presence_of_element_located", (By.XPATH, "//div[span[contains(text(), 'Breakdown')]]/following-sibling::div[1]/span"))
+        }
+    }
+
+    @classmethod
+    def from_crawler(cls, crawler, *args, **kwargs):
+        spider = super().from_crawler(crawler, *args, **kwargs)
+        spider.engine = spider.engine or crawler.settings.get('YAHOO_FINANCE_ENGINE', 'selenium')
+        if spider.engine not in cls.ENGINES:
+            raise ValueError(f"Unknown engine {spider.engine!r}, expected one of {cls.ENGINES}")
+        spider.shard, spider.shards = parse_shard(spider.shard, spider.shards)
+        # the tickers crawled at the same time, enough to keep every driver or download slot busy
+        spider.tickers_in_flight = crawler.settings.getint('TICKERS_IN_FLIGHT') or crawler.settings.getint(
+            'SELENIUM_POOL_SIZE' if spider.engine == 'selenium' else 'CONCURRENT_REQUESTS')
+        spider.in_flight = set()
+        # tells the requests of this process from those restored from a JOBDIR
+        spider.crawl_id = uuid.uuid4().hex
+        spider.tickers = iter(())
+        if spider.queue:
+            spider.work_queue = WorkQueue(spider.queue, crawler.settings.getfloat('WORK_QUEUE_LEASE_TIMEOUT', 300))
+            spider.worker = spider.worker or f"{socket.gethostname()}-{os.getpid()}"
+            spider.lease_renewal = task.LoopingCall(spider.work_queue.renew, spider.worker)
+            crawler.signals.connect(spider.ticker_done, signals.item_scraped)
+            crawler.signals.connect(spider.ticker_done, signals.item_dropped)
+            crawler.signals.connect(spider.release_tickers, signals.spider_closed)
+        checkpoint_path = crawler.settings.get('CHECKPOINT_PATH')
+        spider.resume = spider.run_date is not None or spider.resume not in (None, '', '0', 'false')
+        if spider.resume and not checkpoint_path:
+            raise ValueError("Resuming a run needs the CHECKPOINT_PATH setting")
+        if checkpoint_path:
+            run_date = date.fromisoformat(spider.run_date) if spider.run_date else date.today()
+            spider.checkpoints = CheckpointStore(checkpoint_path, run_date,
+                                                 crawler.settings.getint('CHECKPOINT_KEEP_DAYS', 7))
+            crawler.signals.connect(spider.checkpoint_done, signals.item_scraped)
+            crawler.signals.connect(spider.checkpoints.close, signals.spider_closed)
+        spider.aggregator = ItemAggregator(cls.PAGES, spider._build_component,
+                                           crawler.settings.getfloat('COMPONENT_TIMEOUT', 600))
+        crawler.signals.connect(spider.spider_idle, signals.spider_idle)
+        return spider
 
     def start_requests(self):
-        tickers = self.settings.get('TICKERS')
-        self.logger.debug(f"Tickers settings: {tickers}")
-        for ticker in tickers:
-            url = f"{self.base_url}/quote/{ticker}?p={ticker}"
-            nav_urls = {
-                "statistics_url": f"{self.base_url}/quote/{ticker}/key-statistics?p={ticker}",
-                "profile_url": f"{self.base_url}/quote/{ticker}/profile?p={ticker}",
-                "holders_url": f"{self.base_url}/quote/{ticker}/holders?p={ticker}",
-                "financials_url": f"{self.base_url}/quote/{ticker}/financials?p={ticker}",
-                "balance_sheet_url": f"{self.base_url}/quote/{ticker}/balance-sheet?p={ticker}",
-                "cash_flow_url": f"{self.base_url}/quote/{ticker}/cash-flow?p={ticker}"
-            }
-            yield SeleniumRequest(
-                url=url,
-                callback=self.parse_summary,
-                cb_kwargs= { "ticker": ticker },
-                spawn_driver=True,
-                meta = { "nav_urls": nav_urls }
+        if self.work_queue is not None:
+            # renew the leases well before they expire
+            self.lease_renewal.start(self.work_queue.lease_timeout / 3, now=False)
+            self.tickers = self._leased_tickers()
+        else:
+            self.tickers = self._universe_tickers()
+        # the next tickers are requested as the first ones complete, see _collect
+        yield from self._next_requests()
+
+    def _universe_tickers(self):
+        tickers = load_universe(self.settings, self.universe)
+        if self.shards is not None:
+            self.logger.info(f"Crawling shard {self.shard}/{self.shards}")
+            tickers = (ticker for ticker in tickers if shard_of(ticker, self.shards) == self.shard)
+        return tickers
+
+    def _leased_tickers(self):
+        # a ticker is only leased once there is room to crawl it
+        while True:
+            tickers = self.work_queue.lease(self.worker)
+            if not tickers:
+                return
+            yield from tickers
+
+    def _next_requests(self):
+        """Request the next tickers while fewer than ``tickers_in_flight`` are crawled"""
+
+        while len(self.in_flight) < self.tickers_in_flight:
+            ticker = next(self.tickers, None)
+            if ticker is None:
+                return
+            if self.resume and self.checkpoints.is_complete(ticker):
+                self.logger.debug(f"Skipping {ticker}, exported earlier in the run")
+                if self.work_queue is not None:
+                    self.work_queue.complete(ticker, self.worker)
+                continue
+            self.in_flight.add(ticker)
+            yield from self._ticker_requests(ticker)
+
+    def _ticker_requests(self, ticker):
+        checkpointed = self.checkpoints.pages(ticker) if self.resume else {}
+        if checkpointed.keys() >= self.PAGES.keys():
+            # the component is built from the checkpoints in a callback, which may return items
+            yield Request('data:,', callback=self.resume_ticker, cb_kwargs={'ticker': ticker, 'parts': checkpointed},
+                          dont_filter=True, meta={'dont_obey_robotstxt': True})
+            return
+        if checkpointed:
+            self.logger.info(f"Resuming {ticker}, missing pages: {sorted(self.PAGES.keys() - checkpointed.keys())}")
+        for page_type, fields in checkpointed.items():
+            self.aggregator.add(ticker, page_type, fields)
+        # every missing page of the ticker is requested at once, the aggregator merges them
+        for page_type, path in self.PAGES.items():
+            if page_type in checkpointed:
+                continue
+            yield self._request(
+                url=f"{self.base_url}{path.format(ticker=ticker)}",
+                callback=getattr(self, self.CALLBACKS[page_type]),
+                errback=self.page_failed,
+                cb_kwargs={ "ticker": ticker },
+                meta={ "page_type": page_type, "ticker": ticker, "crawl_id": self.crawl_id },
+                **self.RENDER_OPTIONS.get(page_type, {})
             )
 
     def parse_summary(self, response, ticker):
-        nav_urls = response.meta['nav_urls']
-        loader = ItemLoader(item=Component(), response=response)
-        component_name = response.css("div#quote-header-info h1::text").get()
-        self.logger.debug(f"Component name: {component_name}")
-        if component_name:
-            match = re.match(r'(.+\S)\s?\((.+)\)', component_name)
-            loader.add_value('company_name', match.group(1))
-        else:
-            loader.add_value('company_name', '')
+        loader = ComponentLoader(response=response)
         loader.add_value('ticker', ticker)
-        loader.add_value('date', datetime.today().strftime('%d/%m/%Y'))
-        loader.add_css('previous_close', "[data-test=PREV_CLOSE-value] > span::text")
-        loader.add_css('pe_ratio', '[data-test=PE_RATIO-value] > span::text')
-        fair_value = response.xpath("//div[span[h5[contains(text(), 'Fair Value')]]]/following-sibling::div[1]/div[2]/text()").get()
+        loader.add_value('date', datetime.today().date())
+        if self.engine == 'http':
+            loader.add_value(None, embedded.summary(response))
+            earnings_date = embedded.earnings_date(response)
+        else:
+            component_name = loader.selector.css("div#quote-header-info h1::text").get()
+            self.logger.debug(f"Component name: {component_name}")
+            if component_name:
+                match = re.match(r'(.+\S)\s?\((.+)\)', component_name)
+                loader.add_value('company_name', match.group(1))
+            else:
+                loader.add_value('company_name', '')
+            loader.add_css('previous_close', "[data-test=PREV_CLOSE-value] > span::text")
+            loader.add_css('pe_ratio', '[data-test=PE_RATIO-value] > span::text')
+            loader.add_css('one_year_target_est', "[data-test=ONE_YEAR_TARGET_PRICE-value] > span::text")
+            earnings_date = parse_date(loader.selector.css("[data-test=EARNINGS_DATE-value] span::text").get(),
+                                       ('%b %d, %Y',))
+        if earnings_date:
+            # lets the page cache keep the statements until the next report
+            self.crawler.signals.send_catch_log(earnings_date_scraped, ticker=ticker, earnings_date=earnings_date)
+        # the fair value widget is server-side rendered on both engines
+        fair_value = loader.selector.xpath("//div[span[h5[contains(text(), 'Fair Value')]]]/following-sibling::div[1]/div[2]/text()").get()
         fair_value = fair_value if not None else 'N/A'
         loader.add_value('fair_value', fair_value)
-        loader.add_css('one_year_target_est', "[data-test=ONE_YEAR_TARGET_PRICE-value] > span::text")
-        
-        statistics_url = nav_urls['statistics_url']
-        yield SeleniumRequest(
-            url=statistics_url,
-            callback=self.parse_statistics,
-            previous_response=response,
-            meta={
-                "loader": loader,
-                "nav_urls": nav_urls
-            }
-        )
+
+        yield from self._collect(ticker, 'summary', loader, response.request)
     
-    def parse_statistics(self, response):
-        driver = response.meta['driver']
-        nav_urls = response.meta['nav_urls']
-        parent_loader = response.meta['loader']
-        loader = ItemLoader(parent=parent_loader, response=response)
-        fiftytwo_week_high = response.xpath("//tr/td/span[text()='52 Week High']/parent::td/following-sibling::td[1]/text()").get()
-        loader.add_value('fiftytwo_week_high', fiftytwo_week_high)
-        previous_close = locale.atof(loader.get_output_value('previous_close'))
-        one_year_target_est = locale.atof(loader.get_output_value('one_year_target_est'))
-        diff_to_52_week_high = 1 - (previous_close - locale.atof(fiftytwo_week_high))
-        diff_to_1y_target_est = 1 - (one_year_target_est - previous_close)
-        loader.add_value('diff_to_52_week_high', f"{self._round_off_2_decimal(diff_to_52_week_high)}%")
-        loader.add_value('diff_to_1y_target_est', f"{self._round_off_2_decimal(diff_to_1y_target_est)}%")
-
-        forward_pe = self._wait_and_find_elem(driver, "//tr/td/span[text()='Forward P/E']/parent::td/following-sibling::td[1]").text
-        loader.add_xpath('forward_pe', forward_pe)
-        market_cap = response.xpath("//tr/td/span[contains(text(), 'Market Cap')]/parent::td/following-sibling::td[1]/text()").get()
-        unit = market_cap[-1]
-        if unit == 'B':
-            multiplier = 1000
-        elif unit == 'T':
-            multiplier = 1000000
+    def parse_statistics(self, response, ticker):
+        loader = self._loader(response)
+        if self.engine == 'http':
+            fields = embedded.statistics(response)
+            market_cap = fields.pop('market_cap')
+            loader.add_value(None, fields)
         else:
-            multiplier = 1
-        market_cap = float(market_cap[0:-1]) * multiplier
-        loader.add_value('market_cap', market_cap)
-        peg_ratio = response.xpath("//tr/td/span[contains(text(), 'PEG Ratio')]/parent::td/following-sibling::td[1]/text()").get() or \
-            response.xpath("//tr/td/span[contains(text(), 'PEG Ratio')]/parent::td/following-sibling::td[1]/span/text()").get()
-        loader.add_value('peg_ratio', peg_ratio)
-        loader.add_xpath('price_over_sales', "//tr/td/span[contains(text(), 'Price/Sales')]/parent::td/following-sibling::td[1]/text()")
-        price_over_book = response.xpath("//tr/td/span[contains(text(), 'Price/Book')]/parent::td/following-sibling::td[1]/text()").get() or \
-            response.xpath("//tr/td/span[contains(text(), 'Price/Book')]/parent::td/following-sibling::td[1]/span/text()").get()
-        loader.add_value('price_over_book', price_over_book)
-        return_on_assets = response.xpath("//tr/td/span[contains(text(), 'Return on Assets')]/parent::td/following-sibling::td[1]/text()").get() or \
-            response.xpath("//tr/td/span[contains(text(), 'Return on Assets')]/parent::td/following-sibling::td[1]/span/text()").get()
-        loader.add_value('return_on_assets', return_on_assets)
-        return_on_equity = response.xpath("//tr/td/span[contains(text(), 'Return on Equity')]/parent::td/following-sibling::td[1]/text()").get() or \
-            response.xpath("//tr/td/span[contains(text(), 'Return on Equity')]/parent::td/following-sibling::td[1]/span/text()").get()
-        loader.add_value('return_on_equity', return_on_equity)
-        loader.add_xpath('diluted_eps', "//tr/td/span[contains(text(), 'Diluted EPS')]/parent::td/following-sibling::td[1]/text()")
-        quarterly_earnings_growth = response.xpath("//tr/td/span[contains(text(), 'Quarterly Earnings Growth')]/parent::td/following-sibling::td[1]/text()").get() or \
-            response.xpath("//tr/td/span[contains(text(), 'Quarterly Earnings Growth')]/parent::td/following-sibling::td[1]/span/text()").get()
-        loader.add_value('quarterly_earnings_growth', quarterly_earnings_growth)
-        fwd_annual_dividend_rate = response.xpath("//tr/td/span[contains(text(), 'Forward Annual Dividend Rate')]/parent::td/following-sibling::td[1]/text()").get() or \
-            response.xpath("//tr/td/span[contains(text(), 'Forward Annual Dividend Rate')]/parent::td/following-sibling::td[1]/span/text()").get()
-        loader.add_value('fwd_annual_dividend_rate', fwd_annual_dividend_rate)
-        fwd_annual_dividend_yield = response.xpath("//tr/td/span[contains(text(), 'Forward Annual Dividend Yield')]/parent::td/following-sibling::td[1]/text()").get() or \
-            response.xpath("//tr/td/span[contains(text(), 'Forward Annual Dividend Yield')]/parent::td/following-sibling::td[1]/span/text()").get()
-        loader.add_value('fwd_annual_dividend_yield', fwd_annual_dividend_yield)
-        ex_dividend_date = response.xpath("//tr/td/span[contains(text(), 'Ex-Dividend Date')]/parent::td/following-sibling::td[1]/text()").get() or \
-            response.xpath("//tr/td/span[contains(text(), 'Ex-Dividend Date')]/parent::td/following-sibling::td[1]/span/text()").get()
-        loader.add_value('ex_dividend_date', ex_dividend_date)
-        
-        yield SeleniumRequest(
-            url=nav_urls['profile_url'],
-            callback=self.parse_profile,
-            previous_response=response,
-            meta={
-                "loader": loader,
-                "nav_urls": nav_urls
-            }
-        )
-
-    def parse_profile(self, response):
-        nav_urls = response.meta['nav_urls']
-        parent_loader = response.meta['loader']
-        loader = ItemLoader(parent=parent_loader, response=response)
-        address = response.xpath("//div[@data-test='asset-profile']/div/div/p/text()").extract()
-        filtered = [addr for addr in address if addr != ':\xa0']
-        loader.add_value('country', filtered[-1])
-        yield SeleniumRequest(
-            url=nav_urls['holders_url'],
-            callback=self.parse_holders,
-            previous_response=response,
-            meta={
-                "loader": loader,
-                "nav_urls": nav_urls
-            }
-        )
-
-    def parse_holders(self, response):
-        nav_urls = response.meta['nav_urls']
-        parent_loader = response.meta['loader']
-        loader = ItemLoader(parent=parent_loader, response=response)
-        vanguard_node = response.xpath("//h3/span[contains(text(), 'Top Institutional Holders')]/parent::h3/following-sibling::table/tbody/tr[1]//td[1][contains(text(), 'Vanguard')]")
-        vanguard_holder = 'Y' if vanguard_node else 'N/A'
-        loader.add_value('vanguard_holder', vanguard_holder)
-
-        yield SeleniumRequest(
-            url=nav_urls['financials_url'],
-            callback=self.parse_income_statement,
-            previous_response=response,
-            meta={
-                "loader": loader,
-                "nav_urls": nav_urls
-            }
-        )
-
-    def parse_income_statement(self, response):
-        driver = response.meta['driver']
-        nav_urls = response.meta['nav_urls']
-        parent_loader = response.meta['loader']
-        loader = ItemLoader(parent=parent_loader, response=response)
-
-        self.logger.debug(f"Current URL: {driver.current_url}")
-        quarterly_btn = driver.find_element_by_xpath("//button[div[span[text()='Quarterly']]]")
-        quarterly_btn.click()
-
-        q1_date = WebDriverWait(driver, 10).until(
-            EC.presence_of_element_located((By.XPATH, "//div[span[contains(text(), 'Breakdown')]]/following-sibling::div[2]/span"))
-        ).text
-
-        income_statement = {
-            "TTM": {
-                "date": driver.find_element_by_xpath("//div[span[contains(text(), 'Breakdown')]]/following-sibling::div[1]/span").text,
-                "total_revenue": driver.find_element_by_xpath("//div[@title='Total Revenue']/parent::div/following-sibling::div[1]/span").text,
-                "net_income": driver.find_element_by_xpath("//div[@title='Net Income']/parent::div/following-sibling::div[1]/span").text
-            },
-            "Q1": {
-                "date": q1_date,
-                "total_revenue": driver.find_element_by_xpath("//div[@title='Total Revenue']/parent::div/following-sibling::div[2]/span").text,
-                "net_income": driver.find_element_by_xpath("//div[@title='Net Income']/parent::div/following-sibling::div[2]/span").text
-            },
-            "Q2": {
-                "date": driver.find_element_by_xpath("//div[span[contains(text(), 'Breakdown')]]/following-sibling::div[3]/span").text,
-                "total_revenue": driver.find_element_by_xpath("//div[@title='Total Revenue']/parent::div/following-sibling::div[3]/span").text,
-                "net_income": driver.find_element_by_xpath("//div[@title='Net Income']/parent::div/following-sibling::div[3]/span").text
-            },
-            "Q3": {
-                "date": driver.find_element_by_xpath("//div[span[contains(text(), 'Breakdown')]]/following-sibling::div[4]/span").text,
-                "total_revenue": driver.find_element_by_xpath("//div[@title='Total Revenue']/parent::div/following-sibling::div[4]/span").text,
-                "net_income": driver.find_element_by_xpath("//div[@title='Net Income']/parent::div/following-sibling::div[4]/span").text
-            },
-            "Q4": {
-                "date": driver.find_element_by_xpath("//div[span[contains(text(), 'Breakdown')]]/following-sibling::div[5]/span").text,
-                "total_revenue": driver.find_element_by_xpath("//div[@title='Total Revenue']/parent::div/following-sibling::div[5]/span").text,
-                "net_income": driver.find_element_by_xpath("//div[@title='Net Income']/parent::div/following-sibling::div[5]/span").text
-            },
-        }
-        for key in income_statement.keys():
-            self.logger.debug(f"Current key: {key}")
-            income_statement[key]['net_income_percentage'] = \
-                locale.atoi(income_statement[key]['net_income']) / locale.atoi(income_statement[key]['total_revenue'])
-            income_statement[key]['net_income_percentage'] = f"{self._round_off_2_decimal(income_statement[key]['net_income_percentage'])}%"
-        # loader.add_value('income_statement', income_statement)
-        loader.add_value('ttm_net_income_percentage', income_statement['TTM']['net_income_percentage'])
-        loader.add_value('q1_net_income_percentage', income_statement['Q1']['net_income_percentage'])
-        loader.add_value('q2_net_income_percentage', income_statement['Q2']['net_income_percentage'])
-        loader.add_value('q3_net_income_percentage', income_statement['Q3']['net_income_percentage'])
-        loader.add_value('q4_net_income_percentage', income_statement['Q4']['net_income_percentage'])
-        yield SeleniumRequest(
-            url=nav_urls['balance_sheet_url'],
-            callback=self.parse_balance_sheet,
-            previous_response=response,
-            meta={
-                "loader": loader,
-                "nav_urls": nav_urls
-            }
-        )
-
-    def parse_balance_sheet(self, response):
-        driver = response.meta['driver']
-        nav_urls = response.meta['nav_urls']
-        parent_loader = response.meta['loader']
-        loader = ItemLoader(parent=parent_loader, response=response)
-
-        quarterly_btn = driver.find_element_by_xpath("//button[div[span[text()='Quarterly']]]")
-        quarterly_btn.click()
-
-        q1_date = WebDriverWait(driver, 10).until(
-            EC.presence_of_element_located((By.XPATH, "//div[span[contains(text(), 'Breakdown')]]/following-sibling::div[1]/span"))
-        ).text
-        balance_sheet = {
-            "Q1": {
-                "date": q1_date,
-                "total_assets": driver.find_element_by_xpath("//div[@title='Total Assets']/parent::div/following-sibling::div[1]/span").text,
-                "total_liabilities": driver.find_element_by_xpath("//div[@title='Total Liabilities']/parent::div/following-sibling::div[1]/span").text,
-                "total_stockholders_equity": driver.find_element_by_xpath("//div[@title=\"Total stockholders' equity\"]/parent::div/following-sibling::div[1]/span").text
-            },
-            "Q2": {
-                "date": driver.find_element_by_xpath("//div[span[contains(text(), 'Breakdown')]]/following-sibling::div[2]/span").text,
-                "total_assets": driver.find_element_by_xpath("//div[@title='Total Assets']/parent::div/following-sibling::div[2]/span").text,
-                "total_liabilities": driver.find_element_by_xpath("//div[@title='Total Liabilities']/parent::div/following-sibling::div[2]/span").text,
-                "total_stockholders_equity": driver.find_element_by_xpath("//div[@title=\"Total stockholders' equity\"]/parent::div/following-sibling::div[2]/span").text
-            },
-            "Q3": {
-                "date": driver.find_element_by_xpath("//div[span[contains(text(), 'Breakdown')]]/following-sibling::div[3]/span").text,
-                "total_assets": driver.find_element_by_xpath("//div[@title='Total Assets']/parent::div/following-sibling::div[3]/span").text,
-                "total_liabilities": driver.find_element_by_xpath("//div[@title='Total Liabilities']/parent::div/following-sibling::div[3]/span").text,
-                "total_stockholders_equity": driver.find_element_by_xpath("//div[@title=\"Total stockholders' equity\"]/parent::div/following-sibling::div[3]/span").text
-            },
-            "Q4": {
-                "date": driver.find_element_by_xpath("//div[span[contains(text(), 'Breakdown')]]/following-sibling::div[4]/span").text,
-                "total_assets": driver.find_element_by_xpath("//div[@title='Total Assets']/parent::div/following-sibling::div[4]/span").text,
-                "total_liabilities": driver.find_element_by_xpath("//div[@title='Total Liabilities']/parent::div/following-sibling::div[4]/span").text,
-                "total_stockholders_equity": driver.find_element_by_xpath("//div[@title=\"Total stockholders' equity\"]/parent::div/following-sibling::div[4]/span").text
+            statistics = label_value_index(loader.selector)
+            for field, label in self.STATISTICS_LABELS.items():
+                loader.add_value(field, statistics.get(normalize_label(label)) or None)
+            market_cap = statistics.get(normalize_label('Market Cap'))
+        # displayed with a magnitude suffix, e.g. "2.13T", the embedded value is already a number
+        loader.add_value('market_cap', parse_number(market_cap))
+
+        yield from self._collect(ticker, 'statistics', loader, response.request)
+
+    def parse_profile(self, response, ticker):
+        loader = self._loader(response)
+        if self.engine == 'http':
+            loader.add_value(None, embedded.profile(response))
+        else:
+            address = loader.selector.xpath("//div[@data-test='asset-profile']/div/div/p/text()").extract()
+            filtered = [addr for addr in address if addr != ':\xa0']
+            loader.add_value('country', filtered[-1])
+            loader.add_xpath('sector', "//div[@data-test='asset-profile']//span[text()='Sector(s)']"
+                                       "/following-sibling::span[1]/text()")
+        yield from self._collect(ticker, 'profile', loader, response.request)
+
+    def parse_holders(self, response, ticker):
+        loader = self._loader(response)
+        if self.engine == 'http':
+            loader.add_value(None, embedded.holders(response))
+        else:
+            vanguard_node = loader.selector.xpath("//h3/span[contains(text(), 'Top Institutional Holders')]/parent::h3/following-sibling::table/tbody/tr[1]//td[1][contains(text(), 'Vanguard')]")
+            loader.add_value('vanguard_holder', bool(vanguard_node))
+
+        yield from self._collect(ticker, 'holders', loader, response.request)
+
+    def parse_income_statement(self, response, ticker):
+        loader = self._loader(response)
+
+        self.logger.debug(f"Current URL: {response.url}")
+        if self.engine == 'http':
+            income_statement = embedded.income_statement(response)
+        else:
+            columns = statement_columns(loader.selector, self.INCOME_STATEMENT_FIELDS)
+            # the first column holds the trailing twelve months
+            income_statement = {
+                'TTM' if number == 0 else f"Q{number}": self._figures(column, self.INCOME_STATEMENT_FIELDS)
+                for number, column in enumerate(columns)
+                if self._complete(column, self.INCOME_STATEMENT_FIELDS)
             }
-        }
-        for key in balance_sheet.keys():
-            total_assets = locale.atoi(balance_sheet[key]['total_assets'])
-            total_liabilities = locale.atoi(balance_sheet[key]['total_liabilities'])
-            total_stockholders_equity = locale.atoi(balance_sheet[key]['total_stockholders_equity'])
-            balance_sheet[key]['net_tangible_assets'] = locale.format("%d", (total_assets - total_liabilities), grouping=True)
-            balance_sheet[key]['debt_to_equity_ratio'] = f"{self._round_off_2_decimal(total_liabilities / total_stockholders_equity)}%"
-        loader.add_value('balance_sheet', balance_sheet)
-        yield SeleniumRequest(
-            url=nav_urls['cash_flow_url'],
-            callback=self.parse_cash_flow,
-            previous_response=response,
-            meta={
-                "loader": loader
+        for period in ('TTM', 'Q1', 'Q2', 'Q3', 'Q4'):
+            if period in income_statement:
+                column = income_statement[period]
+                loader.add_value(f"{period.lower()}_total_revenue", column['total_revenue'])
+                loader.add_value(f"{period.lower()}_net_income", column['net_income'])
+        yield from self._collect(ticker, 'financials', loader, response.request)
+
+    def parse_balance_sheet(self, response, ticker):
+        loader = self._loader(response)
+
+        if self.engine == 'http':
+            balance_sheet = embedded.balance_sheet(response)
+        else:
+            columns = statement_columns(loader.selector, self.BALANCE_SHEET_FIELDS)
+            balance_sheet = {
+                f"Q{number}": self._figures(column, self.BALANCE_SHEET_FIELDS)
+                for number, column in enumerate(columns, 1)
+                if self._complete(column, self.BALANCE_SHEET_FIELDS)
             }
-        )
-
-    def parse_cash_flow(self, response):
-        parent_loader = response.meta['loader']
-        response.meta['driver'].quit()
-        loader = ItemLoader(parent=parent_loader, response=response)
-        net_change_in_cash = response.xpath("//div[div[@title='Net change in cash']]/following-sibling::div[1]/span/text()").get()
-        free_cash_flow = response.xpath("//div[div[@title='Free Cash Flow']]/following-sibling::div[1]/span/text()").get()
-        loader.add_value('net_change_in_cash', net_change_in_cash if net_change_in_cash else 'N/A')
-        loader.add_value('free_cash_flow', free_cash_flow if free_cash_flow else 'N/A')
-        return loader.load_item()
-
-    def _wait_and_find_elem(self, driver, xpath, wait_time=20):
-        return WebDriverWait(driver, wait_time).until(
-            EC.presence_of_element_located((By.XPATH, xpath))
-        )
-
-    def _round_off_2_decimal(self, num):
-        return Decimal(num).quantize(Decimal('.01'), rounding='ROUND_UP')
-
-    def _save_screenshot(self, screenshot):
-        Path('screenshots').mkdir(exist_ok=True)
-        with open(f'screenshots/ss_{datetime.today().strftime("%m-%d-%Y_%H:%M:%S.%f")}.png', 'wb') as ss_file:
-            ss_file.write(screenshot)
+        # only the latest quarter is exported
+        latest = balance_sheet.get('Q1')
+        if latest:
+            for field in self.BALANCE_SHEET_FIELDS.values():
+                loader.add_value(field, latest[field])
+        yield from self._collect(ticker, 'balance_sheet', loader, response.request)
+
+    def parse_cash_flow(self, response, ticker):
+        loader = self._loader(response)
+        if self.engine == 'http':
+            fields = embedded.cash_flow(response)
+            net_change_in_cash = fields['net_change_in_cash']
+            free_cash_flow = fields['free_cash_flow']
+        else:
+            net_change_in_cash = self._thousands(loader.selector.xpath("//div[div[@title='Net change in cash']]/following-sibling::div[1]/span/text()").get())
+            free_cash_flow = self._thousands(loader.selector.xpath("//div[div[@title='Free Cash Flow']]/following-sibling::div[1]/span/text()").get())
+        loader.add_value('net_change_in_cash', net_change_in_cash)
+        loader.add_value('free_cash_flow', free_cash_flow)
+        yield from self._collect(ticker, 'cash_flow', loader, response.request)
+
+    def page_failed(self, failure):
+        request = failure.request
+        self.logger.error(f"Failed to scrape {request.url}: {failure.value!r}")
+        # an empty part completes the ticker without waiting for its timeout
+        yield from self._collect(request.cb_kwargs['ticker'], request.meta['page_type'], None, request)
+
+    def parse_failed(self, response, exception):
+        """Complete the ticker of a page whose callback raised, called by ``SpiderExceptionHandler``"""
+
+        self.logger.error(f"Failed to parse {response.url}: {exception!r}", exc_info=exception)
+        self.crawler.stats.inc_value(f"spider_exceptions/{type(exception).__name__}", spider=self)
+        yield from self._collect(response.meta['ticker'], response.meta['page_type'], None, response.request)
+
+    def spider_idle(self):
+        # nothing is in flight anymore, the pending components will not get their missing parts
+        if self.aggregator.pending:
+            self.crawler.engine.crawl(Request('data:,', callback=self.flush_components, dont_filter=True,
+                                              meta={'dont_obey_robotstxt': True}))
+            raise DontCloseSpider
+        if self.work_queue is not None:
+            # pick up the tickers of the workers which crashed
+            self.tickers = self._leased_tickers()
+        requests = list(self._next_requests())
+        for request in requests:
+            self.crawler.engine.crawl(request)
+        if requests or (self.work_queue is not None and self.work_queue.unfinished()):
+            raise DontCloseSpider
+
+    def resume_ticker(self, response, ticker, parts):
+        for page_type, fields in parts.items():
+            component = self.aggregator.add(ticker, page_type, fields)
+            if component is not None:
+                yield component
+        yield from self._next_requests()
+
+    def checkpoint_done(self, item, **kwargs):
+        # a component missing pages is crawled again by the next resumed run of the day
+        if not item.missing_pages:
+            self.checkpoints.complete(item.ticker)
+
+    def ticker_done(self, item, **kwargs):
+        self.work_queue.complete(item.ticker, self.worker)
+
+    def release_tickers(self):
+        if self.lease_renewal.running:
+            self.lease_renewal.stop()
+        self.work_queue.release(self.worker)
+        self.work_queue.close()
+
+    def flush_components(self, response):
+        yield from self.aggregator.flush()
+        yield from self._next_requests()
+
+    def _loader(self, response):
+        # the pages are only parsed into a DOM when the engine reads them with selectors
+        if self.engine == 'http':
+            return ComponentLoader()
+        return ComponentLoader(response=response)
+
+    def _collect(self, ticker, page_type, loader, request):
+        # only the plain values of the fields outlive the page, its DOM goes with the loader
+        fields = dict(loader.load_item()) if loader is not None else {}
+        if loader is not None:
+            # lets the page cache keep the pages which brought fields
+            self.crawler.signals.send_catch_log(page_parsed, response=loader.context['response'], fields=fields)
+        if self._restored(request, ticker):
+            # a page queued on disk before the crawl restarted, its other pages come from the checkpoints
+            self.in_flight.add(ticker)
+            for checkpointed_type, checkpointed in self.checkpoints.pages(ticker).items():
+                if checkpointed_type != page_type:
+                    self.aggregator.add(ticker, checkpointed_type, checkpointed)
+        # a page which brought no fields is missing, the next resumed run requests it again
+        if fields and self.checkpoints is not None:
+            self.checkpoints.save(ticker, page_type, fields)
+        component = self.aggregator.add(ticker, page_type, fields)
+        if component is not None:
+            yield component
+        yield from self.aggregator.expired()
+        # the completed tickers made room for the next ones
+        yield from self._next_requests()
+
+    def _restored(self, request, ticker):
+        """True for the first page of a ticker requested by an earlier process of a JOBDIR crawl"""
+
+        if not self.resume or request.meta.get('crawl_id', self.crawl_id) == self.crawl_id:
+            return False
+        return (ticker not in self.in_flight and ticker not in self.aggregator.built
+                and not self.checkpoints.is_complete(ticker))
+
+    def _build_component(self, ticker, parts):
+        missing = self.PAGES.keys() - {page_type for page_type, fields in parts.items() if fields}
+        if missing:
+            self.logger.warning(f"Incomplete component {ticker}, missing pages: {sorted(missing)}")
+        self.in_flight.discard(ticker)
+        values = {'ticker': ticker, 'missing_pages': sorted(missing)}
+        for fields in parts.values():
+            values.update(fields)
+        return Component.from_fields(values)
+
+    def _request(self, url, callback, wait_time=None, wait_until=None, click=None, page_load=None, **kwargs):
+        if self.engine == 'http':
+            return Request(url, callback=callback, **kwargs)
+        return SeleniumRequest(url=url, callback=callback, wait_time=wait_time, wait_until=wait_until, click=click,
+                               page_load=page_load,
+                               screenshot=self.settings.getbool('SELENIUM_FAILURE_SCREENSHOTS'), **kwargs)
+
+    def _complete(self, column, fields):
+        # older periods of young companies show "-" instead of figures
+        return all(parse_number(column.get(field)) is not None for field in fields.values())
+
+    def _figures(self, column, fields):
+        # the embedded statements already hold the figures in base units
+        return {field: self._thousands(column[field]) for field in fields.values()}
+
+    def _thousands(self, value):
+        # statement figures are displayed in thousands
+        value = parse_number(value)
+        return value * 1000 if value is not None else None
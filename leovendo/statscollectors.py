@@ -0,0 +1,111 @@
+"""This module contains the ``HistogramStatsCollector`` class"""
+
+import logging
+import os
+import threading
+from pathlib import Path
+
+from scrapy.statscollectors import MemoryStatsCollector
+from twisted.internet import task
+
+from .timing import Histogram
+
+logger = logging.getLogger(__name__)
+
+PERCENTILES = (50, 95, 99)
+
+
+class HistogramStatsCollector(MemoryStatsCollector):
+    """Stats collector also keeping histograms of the duration of each crawl stage
+
+    Durations are recorded per stage and page type from any thread. The
+    histograms are written every ``METRICS_INTERVAL`` seconds to the
+    ``METRICS_FILE`` in the Prometheus text format, along with the numeric
+    stats, and their percentiles are added to the stats when the spider closes.
+    """
+
+    def __init__(self, crawler):
+        super().__init__(crawler)
+        self.metrics_file = crawler.settings.get('METRICS_FILE')
+        self.metrics_interval = crawler.settings.getfloat('METRICS_INTERVAL', 15)
+        self.metrics_loop = None
+        self.histograms = {}
+        self.lock = threading.Lock()
+
+    def observe_timing(self, stage, seconds, page_type=None):
+        """Record the duration in seconds of a stage, from any thread"""
+
+        with self.lock:
+            histogram = self.histograms.get((stage, page_type))
+            if histogram is None:
+                histogram = self.histograms[(stage, page_type)] = Histogram()
+            histogram.observe(seconds)
+
+    def stage_histograms(self):
+        """Return the histograms by stage, every page type merged"""
+
+        with self.lock:
+            stages = {}
+            for (stage, _), histogram in self.histograms.items():
+                stages.setdefault(stage, Histogram()).merge(histogram)
+            return stages
+
+    def open_spider(self, spider):
+        super().open_spider(spider)
+        if self.metrics_file:
+            self.metrics_loop = task.LoopingCall(self.write_metrics)
+            self.metrics_loop.start(self.metrics_interval, now=False)
+
+    def close_spider(self, spider, reason):
+        if self.metrics_loop is not None and self.metrics_loop.running:
+            self.metrics_loop.stop()
+        self._set_percentiles(spider)
+        if self.metrics_file:
+            self.write_metrics()
+        super().close_spider(spider, reason)
+
+    def _set_percentiles(self, spider):
+        with self.lock:
+            histograms = dict(self.histograms)
+        for (stage, page_type), histogram in histograms.items():
+            if page_type:
+                self._set_histogram_stats(f'timing/{stage}/{page_type}', histogram, spider)
+        for stage, histogram in self.stage_histograms().items():
+            self._set_histogram_stats(f'timing/{stage}', histogram, spider)
+
+    def _set_histogram_stats(self, prefix, histogram, spider):
+        self.set_value(f'{prefix}/count', histogram.count, spider=spider)
+        self.set_value(f'{prefix}/seconds', round(histogram.sum, 3), spider=spider)
+        for percent in PERCENTILES:
+            self.set_value(f'{prefix}/p{percent}', round(histogram.percentile(percent), 4), spider=spider)
+
+    def write_metrics(self):
+        """Write the histograms and the numeric stats in the Prometheus text format"""
+
+        lines = [
+            '# HELP leovendo_stage_seconds Duration of the crawl stages',
+            '# TYPE leovendo_stage_seconds histogram'
+        ]
+        with self.lock:
+            for (stage, page_type), histogram in sorted(self.histograms.items(), key=lambda entry: str(entry[0])):
+                labels = f'stage="{stage}",page_type="{page_type or ""}"'
+                for bound, count in histogram.cumulative_counts():
+                    le = '+Inf' if bound == float('inf') else f'{bound:.6g}'
+                    lines.append(f'leovendo_stage_seconds_bucket{{{labels},le="{le}"}} {count}')
+                lines.append(f'leovendo_stage_seconds_sum{{{labels}}} {histogram.sum:.6f}')
+                lines.append(f'leovendo_stage_seconds_count{{{labels}}} {histogram.count}')
+
+        lines += [
+            '# HELP leovendo_stat Numeric values of the scrapy stats',
+            '# TYPE leovendo_stat gauge'
+        ]
+        for key, value in sorted(self.get_stats().items()):
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                lines.append(f'leovendo_stat{{key="{key}"}} {value}')
+
+        path = Path(self.metrics_file)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        partial = path.with_name(f'{path.name}.partial')
+        partial.write_text('\n'.join(lines) + '\n')
+        # scrapers never read a half written file
+        os.replace(partial, path)
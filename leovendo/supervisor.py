@@ -0,0 +1,247 @@
+"""This module contains the ``DriverSupervisor`` class"""
+
+import logging
+import time
+
+import psutil
+from twisted.internet import task, threads
+
+logger = logging.getLogger(__name__)
+
+
+class SupervisedDriver:
+    """What the supervisor knows about one driver"""
+
+    def __init__(self, slot, pid):
+        self.slot = slot
+        self.pid = pid
+        self.pages = 0
+        self.rss = 0
+        self.busy_since = None
+        self.killed = False
+
+
+class DriverSupervisor:
+    """Recycles the drivers of a ``DriverPool`` and kills the hung ones
+
+    A driver is quit, and replaced by a fresh one the next time the pool needs
+    it, once it rendered ``max_pages`` pages or its processes use more than
+    ``max_rss`` bytes. A driver stuck in one call for more than
+    ``hang_timeout`` seconds has its whole process tree killed, which fails
+    the blocked call and frees its slot. The processes surviving the quit of a
+    driver are killed as well. Each driver holds one of the ``pool.size``
+    slots, the stats report the restarts and memory of each slot under
+    "selenium/driver/<slot>/".
+    """
+
+    def __init__(self, pool, stats=None, max_pages=0, max_rss=0, hang_timeout=0, interval=10):
+        """Supervise the drivers of ``pool``
+
+        Parameters
+        ----------
+        pool: leovendo.pool.DriverPool
+            The pool launching and quitting the drivers.
+        stats: scrapy.statscollectors.StatsCollector
+            Where the restarts and memory of the drivers are reported.
+        max_pages: int
+            Pages rendered before a driver is recycled, 0 to never recycle on pages.
+        max_rss: int
+            Bytes of resident memory of a driver's processes above which it is
+            recycled, 0 to never recycle on memory.
+        hang_timeout: float
+            Seconds a driver call may last before the driver is killed, 0 to never kill.
+        interval: float
+            Seconds between two checks of the memory and calls of the drivers.
+        """
+
+        self.pool = pool
+        self.stats = stats
+        self.max_pages = max_pages
+        self.max_rss = max_rss
+        self.hang_timeout = hang_timeout
+        self.interval = interval
+        self.drivers = {}
+        self.watchdog = task.LoopingCall(self.check)
+
+    def start(self):
+        self.watchdog.start(self.interval, now=False)
+
+    def run(self, driver, func, *args, **kwargs):
+        """Call ``func`` in the driver thread pool while watching ``driver`` for hangs"""
+
+        state = self._track(driver)
+        state.busy_since = time.monotonic()
+
+        def _done(result):
+            state.busy_since = None
+            return result
+
+        return self.pool.run(func, *args, **kwargs).addBoth(_done)
+
+    def rendered(self, driver):
+        """Count a page rendered by ``driver``"""
+
+        state = self._track(driver)
+        state.pages += 1
+        self._set_value(f'selenium/driver/{state.slot}/pages', state.pages)
+
+    def killed(self, driver):
+        """True if ``driver`` was killed by the watchdog"""
+
+        state = self.drivers.get(driver)
+        return state is not None and state.killed
+
+    def release(self, driver):
+        """Give ``driver`` back to the pool, or quit it if it is due for a restart"""
+
+        state = self.drivers.get(driver)
+        reason = self._restart_reason(state) if state is not None else None
+        if reason is None:
+            self.pool.release(driver)
+            return None
+        return self.discard(driver, reason)
+
+    def _restart_reason(self, state):
+        if state.killed:
+            return 'hung'
+        if self.max_pages and state.pages >= self.max_pages:
+            return 'pages'
+        if self.max_rss and state.rss > self.max_rss:
+            return 'rss'
+        return None
+
+    def discard(self, driver, reason):
+        """Quit ``driver``, kill the processes it leaves behind and free its slot"""
+
+        state = self.drivers.pop(driver, None)
+        if state is not None:
+            logger.info(f"Restarting driver {state.slot} ({reason}) after {state.pages} pages, "
+                        f"{state.rss / 2 ** 20:.0f} MiB")
+            self._inc_value('selenium/driver/restarts')
+            self._inc_value(f'selenium/driver/restarts/{reason}')
+            self._inc_value(f'selenium/driver/{state.slot}/restarts')
+        processes = process_tree(state.pid) if state is not None else []
+        dfd = self.pool.discard(driver)
+        dfd.addCallback(lambda _: threads.deferToThread(reap, processes))
+        dfd.addCallback(self._reaped)
+        return dfd
+
+    def _reaped(self, killed):
+        if killed:
+            logger.warning(f"Killed {killed} processes left behind by a driver")
+            self._inc_value('selenium/driver/zombies_killed', killed)
+
+    def check(self):
+        """Kill the hung drivers and sample the memory of the others"""
+
+        now = time.monotonic()
+        for driver, state in list(self.drivers.items()):
+            if (self.hang_timeout and not state.killed and state.busy_since is not None
+                    and now - state.busy_since > self.hang_timeout):
+                self._kill(state)
+        pids = {driver: state.pid for driver, state in self.drivers.items() if state.pid is not None}
+        dfd = threads.deferToThread(lambda: {driver: tree_rss(process_tree(pid)) for driver, pid in pids.items()})
+        dfd.addCallback(self._sampled)
+        dfd.addErrback(lambda failure: logger.error(f"Failed to sample the drivers memory: {failure.value!r}"))
+        return dfd
+
+    def _kill(self, state):
+        logger.error(f"Driver {state.slot} hung for more than {self.hang_timeout}s, killing it")
+        state.killed = True
+        self._inc_value('selenium/driver/hung')
+        if state.pid is None:
+            # nothing to kill for a remote driver, its slot is freed once the call times out
+            return
+        threads.deferToThread(reap, process_tree(state.pid), timeout=0)
+
+    def _sampled(self, rss):
+        total = 0
+        for driver, driver_rss in rss.items():
+            state = self.drivers.get(driver)
+            if state is None:
+                continue
+            state.rss = driver_rss
+            total += driver_rss
+            self._set_value(f'selenium/driver/{state.slot}/rss', driver_rss)
+            self._max_value(f'selenium/driver/{state.slot}/rss_max', driver_rss)
+        self._set_value('selenium/driver/rss', total)
+        self._max_value('selenium/driver/rss_max', total)
+
+    def close(self):
+        """Quit every driver and kill the processes they leave behind"""
+
+        if self.watchdog.running:
+            self.watchdog.stop()
+        processes = [process for state in self.drivers.values() for process in process_tree(state.pid)]
+        self.drivers = {}
+        dfd = self.pool.close()
+        dfd.addCallback(lambda _: threads.deferToThread(reap, processes))
+        dfd.addCallback(self._reaped)
+        return dfd
+
+    def _track(self, driver):
+        state = self.drivers.get(driver)
+        if state is None:
+            used = {other.slot for other in self.drivers.values()}
+            slot = next(slot for slot in range(len(used) + 1) if slot not in used)
+            state = self.drivers[driver] = SupervisedDriver(slot, driver_pid(driver))
+        return state
+
+    def _inc_value(self, key, count=1):
+        if self.stats is not None:
+            self.stats.inc_value(key, count)
+
+    def _set_value(self, key, value):
+        if self.stats is not None:
+            self.stats.set_value(key, value)
+
+    def _max_value(self, key, value):
+        if self.stats is not None:
+            self.stats.max_value(key, value)
+
+
+def driver_pid(driver):
+    """The pid of the process of a local driver, ``None`` for a remote one"""
+
+    process = getattr(getattr(driver, 'service', None), 'process', None)
+    return getattr(process, 'pid', None)
+
+
+def process_tree(pid):
+    """The running process ``pid`` and its descendants"""
+
+    if pid is None:
+        return []
+    try:
+        root = psutil.Process(pid)
+        return [root] + root.children(recursive=True)
+    except psutil.Error:
+        return []
+
+
+def tree_rss(processes):
+    """The resident memory of ``processes``, in bytes"""
+
+    rss = 0
+    for process in processes:
+        try:
+            rss += process.memory_info().rss
+        except psutil.Error:
+            pass
+    return rss
+
+
+def reap(processes, timeout=5):
+    """Kill the ``processes`` still running and return how many were"""
+
+    killed = []
+    for process in processes:
+        try:
+            if process.status() != psutil.STATUS_ZOMBIE:
+                process.kill()
+                killed.append(process)
+        except psutil.Error:
+            pass
+    # waiting also collects the exit status of our own children
+    psutil.wait_procs(processes, timeout=timeout)
+    return len(killed)
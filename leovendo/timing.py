@@ -0,0 +1,85 @@
+"""Helpers timing the stages of a crawl into histograms"""
+
+import bisect
+import math
+import time
+from contextlib import contextmanager
+
+# upper bounds in seconds of the histogram buckets, from 1ms to about 3 minutes
+BUCKETS = tuple(0.001 * 2 ** (exponent / 2) for exponent in range(36))
+
+
+class Histogram:
+    """Counts of observed durations in exponential buckets"""
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        # the last count holds the values above every bound
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+    def merge(self, other):
+        """Add the observations of another histogram with the same buckets"""
+
+        for index, count in enumerate(other.counts):
+            self.counts[index] += count
+        self.count += other.count
+        self.sum += other.sum
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    def percentile(self, percent):
+        """Estimate a percentile by interpolating within its bucket"""
+
+        if not self.count:
+            return None
+        rank = self.count * percent / 100
+        seen = 0
+        for index, count in enumerate(self.counts):
+            if count and seen + count >= rank:
+                lower = self.buckets[index - 1] if index else 0.0
+                upper = self.buckets[index] if index < len(self.buckets) else self.max
+                lower, upper = max(lower, self.min), min(upper, self.max)
+                return lower + (upper - lower) * (rank - seen) / count
+            seen += count
+        return self.max
+
+    def cumulative_counts(self):
+        """Pairs of bucket upper bounds and the number of values below them"""
+
+        total = 0
+        for bound, count in zip(self.buckets + (math.inf,), self.counts):
+            total += count
+            yield bound, total
+
+    def __repr__(self):
+        return f"{type(self).__name__}(count={self.count}, sum={self.sum:.3f})"
+
+
+def observe(stats, stage, seconds, page_type=None):
+    """Record the duration of a stage if the stats collector keeps histograms"""
+
+    observe_timing = getattr(stats, 'observe_timing', None)
+    if observe_timing is not None:
+        observe_timing(stage, seconds, page_type)
+
+
+@contextmanager
+def timed(stats, stage, page_type=None):
+    """Time the enclosed block as a stage, failures included"""
+
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(stats, stage, time.perf_counter() - started, page_type)
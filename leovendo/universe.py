@@ -0,0 +1,55 @@
+"""Helpers streaming the ticker universe from files, globs or stdin"""
+
+import glob
+import sys
+
+# first cells of the header row of index constituent files
+HEADERS = {'symbol', 'ticker', 'code'}
+
+
+def read_universe(source):
+    """Yield the unique tickers of a file, a glob of files or "-" for stdin
+
+    Lines hold one ticker, or CSV rows whose first cell is the ticker, blank
+    lines, comments starting with "#" and header rows are skipped. The files
+    are read lazily, only the tickers already seen are kept in memory.
+    """
+
+    if source == '-':
+        return unique(parse_lines(sys.stdin))
+    paths = sorted(glob.glob(source)) if glob.has_magic(source) else [source]
+    if not paths:
+        raise FileNotFoundError(f"No universe file matches {source}")
+    return unique(ticker for path in paths for ticker in _read_file(path))
+
+
+def _read_file(path):
+    with open(path, encoding='utf-8') as lines:
+        yield from parse_lines(lines)
+
+
+def parse_lines(lines):
+    for line in lines:
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        ticker = line.split(',', 1)[0].strip().strip('"').upper()
+        if ticker and ticker.lower() not in HEADERS:
+            yield ticker
+
+
+def unique(tickers):
+    seen = set()
+    for ticker in tickers:
+        if ticker not in seen:
+            seen.add(ticker)
+            yield ticker
+
+
+def load_universe(settings, source=None):
+    """Stream the universe of ``source``, the UNIVERSE setting or else the TICKERS setting"""
+
+    source = source or settings.get('UNIVERSE')
+    if source:
+        return read_universe(source)
+    return unique(settings.getlist('TICKERS'))
@@ -0,0 +1,49 @@
+"""Helpers turning the values displayed on Yahoo pages into numbers"""
+
+from datetime import date, datetime
+
+MISSING = {'', 'N/A', 'n/a', '-', '--', 'NaN', 'None'}
+SUFFIXES = {'k': 1e3, 'K': 1e3, 'M': 1e6, 'B': 1e9, 'T': 1e12}
+
+
+def parse_number(value):
+    """Parse a displayed value such as "1,234.5", "12.34%", "-7.40%" or "2.01T"
+
+    Percentages are returned as fractions and magnitude suffixes are applied.
+    Returns ``None`` for missing values.
+    """
+
+    if value is None:
+        return None
+    if isinstance(value, (int, float)):
+        # the raw numbers of the embedded data store
+        return float(value)
+    text = str(value).strip().replace(',', '')
+    if text in MISSING:
+        return None
+    scale = 1
+    if text.endswith('%'):
+        text, scale = text[:-1], 0.01
+    elif text[-1] in SUFFIXES:
+        text, scale = text[:-1], SUFFIXES[text[-1]]
+    if text.startswith('(') and text.endswith(')'):
+        text = f"-{text[1:-1]}"
+    try:
+        return float(text) * scale
+    except ValueError:
+        return None
+
+
+def parse_date(value, formats=('%d/%m/%Y', '%b %d, %Y', '%m/%d/%Y', '%Y-%m-%d')):
+    """Parse a date in one of the formats used by the spider and the pages"""
+
+    if isinstance(value, date):
+        return value
+    if not value or value in MISSING:
+        return None
+    for date_format in formats:
+        try:
+            return datetime.strptime(value, date_format).date()
+        except ValueError:
+            continue
+    return None
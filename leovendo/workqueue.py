@@ -0,0 +1,93 @@
+"""This module contains the ``WorkQueue`` class"""
+
+import sqlite3
+import time
+from pathlib import Path
+
+
+class WorkQueue:
+    """SQLite queue of tickers leased by the spider processes of one host
+
+    A worker leases tickers for ``lease_timeout`` seconds and renews its
+    leases while it is alive, the tickers of a worker that crashed are leased
+    again once their lease expired.
+    """
+
+    def __init__(self, path, lease_timeout=300):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        # autocommit, the transactions are opened explicitly
+        self.db = sqlite3.connect(path, timeout=60, isolation_level=None)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute('''
+            CREATE TABLE IF NOT EXISTS tickers (
+                ticker TEXT PRIMARY KEY,
+                status TEXT NOT NULL DEFAULT 'pending',
+                worker TEXT,
+                leased_until REAL,
+                attempts INTEGER NOT NULL DEFAULT 0
+            )
+        ''')
+        self.lease_timeout = lease_timeout
+
+    def fill(self, tickers, reset=False):
+        """Queue the tickers not queued yet, or every ticker again if ``reset``"""
+
+        self.db.execute('BEGIN IMMEDIATE')
+        if reset:
+            self.db.execute('DELETE FROM tickers')
+        self.db.executemany('INSERT OR IGNORE INTO tickers (ticker) VALUES (?)', ((ticker,) for ticker in tickers))
+        self.db.execute('COMMIT')
+
+    def lease(self, worker, count=1, now=None):
+        """Lease up to ``count`` pending or expired tickers, return them"""
+
+        now = now or time.time()
+        self.db.execute('BEGIN IMMEDIATE')
+        try:
+            tickers = [row[0] for row in self.db.execute(
+                "SELECT ticker FROM tickers WHERE status = 'pending' OR (status = 'leased' AND leased_until < ?) "
+                "ORDER BY attempts, rowid LIMIT ?", (now, count)
+            )]
+            self.db.executemany(
+                "UPDATE tickers SET status = 'leased', worker = ?, leased_until = ?, attempts = attempts + 1 "
+                "WHERE ticker = ?", ((worker, now + self.lease_timeout, ticker) for ticker in tickers)
+            )
+            self.db.execute('COMMIT')
+        except BaseException:
+            self.db.execute('ROLLBACK')
+            raise
+        return tickers
+
+    def renew(self, worker, now=None):
+        """Extend the leases of a worker, return how many it holds"""
+
+        now = now or time.time()
+        return self.db.execute(
+            "UPDATE tickers SET leased_until = ? WHERE worker = ? AND status = 'leased'",
+            (now + self.lease_timeout, worker)
+        ).rowcount
+
+    def complete(self, ticker, worker):
+        """Mark a ticker done, unless its lease was lost to another worker"""
+
+        self.db.execute("UPDATE tickers SET status = 'done', leased_until = NULL WHERE ticker = ? AND worker = ?",
+                        (ticker, worker))
+
+    def release(self, worker):
+        """Give the unfinished tickers of a worker back to the queue"""
+
+        self.db.execute("UPDATE tickers SET status = 'pending', leased_until = NULL "
+                        "WHERE worker = ? AND status = 'leased'", (worker,))
+
+    def counts(self):
+        """Return the number of tickers by status"""
+
+        return dict(self.db.execute('SELECT status, COUNT(*) FROM tickers GROUP BY status'))
+
+    def unfinished(self):
+        """True while some ticker is pending or leased"""
+
+        return self.db.execute("SELECT EXISTS (SELECT 1 FROM tickers WHERE status != 'done')").fetchone()[0] == 1
+
+    def close(self):
+        self.db.close()
@@ -0,0 +1,29 @@
+from leovendo.aggregator import ItemAggregator
+
+
+def build(key, parts):
+    return key, dict(parts)
+
+
+def test_item_built_once_every_part_arrived():
+    aggregator = ItemAggregator(['a', 'b'], build, timeout=60)
+    assert aggregator.add('AAPL', 'a', {'x': 1}) is None
+    assert aggregator.add('AAPL', 'b', {'y': 2}) == ('AAPL', {'a': {'x': 1}, 'b': {'y': 2}})
+    assert not aggregator.pending
+
+
+def test_late_parts_are_dropped():
+    aggregator = ItemAggregator(['a', 'b'], build, timeout=0)
+    aggregator.add('AAPL', 'a', {'x': 1})
+    assert aggregator.expired() == [('AAPL', {'a': {'x': 1}})]
+    assert aggregator.add('AAPL', 'b', {'y': 2}) is None
+    assert not aggregator.pending
+    assert aggregator.flush() == []
+
+
+def test_flush_builds_the_pending_items():
+    aggregator = ItemAggregator(['a', 'b'], build, timeout=60)
+    aggregator.add('AAPL', 'a', {})
+    assert aggregator.expired() == []
+    assert aggregator.flush() == [('AAPL', {'a': {}})]
+    assert aggregator.add('AAPL', 'b', {}) is None
@@ -0,0 +1,54 @@
+import shutil
+
+import pytest
+from scrapy import Request
+from scrapy.exceptions import IgnoreRequest
+from scrapy.http import HtmlResponse
+from scrapy.statscollectors import MemoryStatsCollector
+from scrapy.utils.test import get_crawler
+
+from leovendo.archive import PageArchive
+from leovendo.middlewares import PageArchiveMiddleware
+
+URL = 'https://finance.yahoo.com/quote/AAPL'
+
+
+def test_recorded_pages_are_replayed(tmp_path):
+    path = tmp_path / 'crawl.zip'
+    stats = MemoryStatsCollector(get_crawler())
+    recording = PageArchiveMiddleware(PageArchive(path, 'record'), stats)
+    request = Request(URL)
+    response = HtmlResponse(URL, body=b'<html>AAPL</html>', headers={'Content-Type': 'text/html'}, request=request)
+
+    assert recording.process_response(request, response, None) is response
+    recording.spider_closed()
+
+    replaying = PageArchiveMiddleware(PageArchive(path, 'replay'), stats)
+    replayed = replaying.process_request(Request(URL), None)
+
+    assert replayed.body == b'<html>AAPL</html>'
+    assert replayed.status == 200
+    assert replayed.headers['Content-Type'] == b'text/html'
+    assert 'archived' in replayed.flags
+    with pytest.raises(IgnoreRequest):
+        replaying.process_request(Request(f'{URL}/profile'), None)
+
+
+def test_killed_recording_is_replayed_up_to_its_last_complete_page(tmp_path):
+    archive = PageArchive(tmp_path / 'crawl.zip', 'record')
+    for number in range(3):
+        archive.record(f'page{number}', f'{URL}/{number}', 200, {}, f'<html>{number}</html>'.encode() * 100)
+    # the zip directory is only written on close, the last page was being written
+    killed = tmp_path / 'killed.zip'
+    shutil.copy(tmp_path / 'crawl.zip', killed)
+    with open(killed, 'r+b') as file:
+        file.truncate(killed.stat().st_size - 10)
+    archive.close()
+
+    replayed = PageArchive(killed, 'replay')
+
+    assert len(replayed) == 2
+    assert replayed.replay('page1') == (
+        {'key': 'page1', 'name': 'pages/page1', 'url': f'{URL}/1', 'status': 200, 'headers': {}},
+        b'<html>1</html>' * 100
+    )
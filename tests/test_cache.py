@@ -0,0 +1,65 @@
+import os
+
+from scrapy.http import HtmlResponse
+from scrapy.statscollectors import MemoryStatsCollector
+from scrapy.utils.test import get_crawler
+
+from leovendo.cache import PageCache
+from leovendo.http import SeleniumRequest
+from leovendo.middlewares import RenderedPageCacheMiddleware
+
+URL = 'https://finance.yahoo.com/quote/AAPL/holders?p=AAPL'
+DAY = 86400
+
+
+def test_page_is_only_cached_once_its_callback_brought_fields(tmp_path):
+    cache = PageCache(tmp_path / 'pages.sqlite', 2 ** 20, {'holders': DAY})
+    middleware = RenderedPageCacheMiddleware(cache, MemoryStatsCollector(get_crawler()))
+    request = SeleniumRequest(url=URL, meta={'page_type': 'holders', 'ticker': 'AAPL'})
+    response = HtmlResponse(URL, body=b'<html>Vanguard</html>', request=request)
+
+    # a page rendered before its content
+    middleware.page_parsed(response, {})
+    assert middleware.process_request(request, None) is None
+
+    middleware.page_parsed(response, {'vanguard_holder': True})
+    cached = middleware.process_request(request, None)
+    assert cached.body == b'<html>Vanguard</html>'
+    assert 'cached' in cached.flags
+
+
+def test_page_expires_after_the_ttl_of_its_type(tmp_path):
+    cache = PageCache(tmp_path / 'pages.sqlite', 2 ** 20, {'holders': DAY, 'quote': 0})
+    key = PageCache.key(URL)
+
+    cache.set(key, URL, 'holders', 'AAPL', b'<html>Vanguard</html>', now=DAY)
+
+    assert cache.get(key, 'holders', 'AAPL', now=2 * DAY - 1) == b'<html>Vanguard</html>'
+    assert cache.get(key, 'holders', 'AAPL', now=2 * DAY) is None
+    assert not cache.cacheable('quote')
+
+
+def test_least_recently_used_page_is_evicted(tmp_path):
+    # random bytes do not compress, each page takes 1000 bytes
+    cache = PageCache(tmp_path / 'pages.sqlite', 2500, {'holders': DAY})
+    pages = {ticker: os.urandom(1000) for ticker in ('AAPL', 'MSFT', 'KO')}
+
+    assert cache.set('AAPL', URL, 'holders', 'AAPL', pages['AAPL'], now=1) == 0
+    assert cache.set('MSFT', URL, 'holders', 'MSFT', pages['MSFT'], now=2) == 0
+    cache.get('AAPL', 'holders', 'AAPL', now=3)
+    assert cache.set('KO', URL, 'holders', 'KO', pages['KO'], now=4) == 1
+
+    assert cache.get('MSFT', 'holders', 'MSFT', now=5) is None
+    assert cache.get('AAPL', 'holders', 'AAPL', now=5) == pages['AAPL']
+    assert cache.size <= 2500
+
+
+def test_earnings_page_is_stale_once_the_ticker_reported(tmp_path):
+    cache = PageCache(tmp_path / 'pages.sqlite', 2 ** 20, {'analysis': 'earnings'}, earnings_fallback_ttl=DAY)
+    cache.set('AAPL', URL, 'analysis', 'AAPL', b'<html>EPS</html>', now=DAY)
+
+    # without a known earnings date the fallback TTL applies
+    assert cache.get('AAPL', 'analysis', 'AAPL', now=3 * DAY) is None
+    cache.set_earnings_date('AAPL', 30 * DAY)
+    assert cache.get('AAPL', 'analysis', 'AAPL', now=29 * DAY) == b'<html>EPS</html>'
+    assert cache.get('AAPL', 'analysis', 'AAPL', now=31 * DAY) is None
@@ -0,0 +1,49 @@
+from datetime import date
+
+import pytest
+
+from leovendo.checkpoint import CheckpointStore
+
+RUN_DATE = date(2021, 4, 28)
+
+
+@pytest.fixture
+def checkpoints(tmp_path):
+    checkpoints = CheckpointStore(tmp_path / 'checkpoints.sqlite', RUN_DATE)
+    yield checkpoints
+    checkpoints.close()
+
+
+def test_checkpointed_pages_are_restored(checkpoints):
+    checkpoints.save('AAPL', 'quote', {'pe_ratio': 34.5, 'ex_dividend_date': date(2021, 2, 5)})
+    checkpoints.save('AAPL', 'holders', {'vanguard_holder': True})
+    checkpoints.save('AAPL', 'holders', {'vanguard_holder': False})
+
+    assert checkpoints.pages('AAPL') == {
+        'quote': {'pe_ratio': 34.5, 'ex_dividend_date': '2021-02-05'},
+        'holders': {'vanguard_holder': False}
+    }
+    assert checkpoints.pages('MSFT') == {}
+
+
+def test_page_checkpointed_without_fields_is_missing(checkpoints):
+    checkpoints.save('AAPL', 'cash_flow', {})
+
+    assert checkpoints.pages('AAPL') == {}
+
+
+def test_checkpoints_belong_to_their_run_date(tmp_path, checkpoints):
+    checkpoints.save('AAPL', 'quote', {'pe_ratio': 34.5})
+    checkpoints.complete('AAPL')
+    assert checkpoints.is_complete('AAPL')
+    assert not checkpoints.is_complete('MSFT')
+
+    next_day = CheckpointStore(tmp_path / 'checkpoints.sqlite', date(2021, 4, 29))
+    assert next_day.pages('AAPL') == {}
+    assert not next_day.is_complete('AAPL')
+    next_day.close()
+
+    # opening a run a week later deletes the older checkpoints
+    CheckpointStore(tmp_path / 'checkpoints.sqlite', date(2021, 5, 6)).close()
+    assert checkpoints.pages('AAPL') == {}
+    assert not checkpoints.is_complete('AAPL')
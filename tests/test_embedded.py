@@ -0,0 +1,140 @@
+import json
+from datetime import date
+
+import pytest
+from scrapy.http import HtmlResponse
+
+from leovendo import embedded
+
+QUOTE_SUMMARY = {
+    'price': {'shortName': 'Apple Inc.', 'longName': 'Apple Inc.'},
+    'summaryDetail': {
+        'previousClose': {'raw': 125.91, 'fmt': '125.91'},
+        'trailingPE': {'raw': 34.54, 'fmt': '34.54'},
+        'fiftyTwoWeekHigh': {'raw': 145.09, 'fmt': '145.09'},
+        'marketCap': {'raw': 2135123456789, 'fmt': '2.135T'},
+        'priceToSalesTrailing12Months': {'raw': 7.29, 'fmt': '7.29'},
+        'dividendRate': {'raw': 0.82, 'fmt': '0.82'},
+        'dividendYield': {'raw': 0.0065, 'fmt': '0.65%'},
+        'exDividendDate': {'raw': 1612483200, 'fmt': '2021-02-05'}
+    },
+    'defaultKeyStatistics': {
+        'forwardPE': {'raw': 28.74, 'fmt': '28.74'},
+        'pegRatio': {'raw': 1.56, 'fmt': '1.56'},
+        'priceToBook': {'raw': 31.89, 'fmt': '31.89'},
+        'trailingEps': {'raw': 3.69, 'fmt': '3.69'},
+        'earningsQuarterlyGrowth': {'raw': 0.293, 'fmt': '29.30%'}
+    },
+    'financialData': {
+        'targetMeanPrice': {'raw': 151.75, 'fmt': '151.75'},
+        'returnOnAssets': {'raw': 0.1365, 'fmt': '13.65%'},
+        'returnOnEquity': {'raw': 0.8209, 'fmt': '82.09%'}
+    },
+    'calendarEvents': {'earnings': {'earningsDate': [{'raw': 1619568000, 'fmt': '2021-04-28'}]}},
+    'assetProfile': {'country': 'United States', 'sector': 'Technology'},
+    'institutionOwnership': {'ownershipList': [{'organization': 'Vanguard Group, Inc. (The)'},
+                                              {'organization': 'Blackrock Inc.'}]}
+}
+
+
+def point(as_of_date, value):
+    return {'asOfDate': as_of_date, 'reportedValue': {'raw': value, 'fmt': f"{value / 1e9:.2f}B"}}
+
+
+TIME_SERIES = {
+    'trailingTotalRevenue': [point('2020-12-31', 294135000000)],
+    'trailingNetIncome': [point('2020-12-31', 63930000000)],
+    # the oldest point first, one quarter without figures
+    'quarterlyTotalRevenue': [point('2020-09-30', 64698000000), None, point('2020-12-31', 111439000000)],
+    'quarterlyNetIncome': [point('2020-09-30', 12673000000), None, point('2020-12-31', 28755000000)],
+    'quarterlyTotalAssets': [point('2020-12-31', 354054000000)],
+    'quarterlyTotalLiabilitiesNetMinorityInterest': [point('2020-12-31', 287830000000)],
+    'quarterlyStockholdersEquity': [point('2020-12-31', 66224000000)],
+    'trailingChangesInCash': [point('2020-12-31', -10435123456)],
+    'trailingFreeCashFlow': [point('2020-12-31', 80219000000)]
+}
+
+
+def page(stores):
+    state = {'context': {'dispatcher': {'stores': stores}}}
+    body = f"<html><script>root.App.main = {json.dumps(state)};</script></html>"
+    return HtmlResponse('https://finance.yahoo.com/quote/AAPL', body=body, encoding='utf-8')
+
+
+FULL = page({'QuoteSummaryStore': QUOTE_SUMMARY, 'QuoteTimeSeriesStore': {'timeSeries': TIME_SERIES}})
+# the stores of a delisted ticker
+EMPTY = page({'QuoteSummaryStore': {'price': None, 'summaryDetail': None}, 'QuoteTimeSeriesStore': {'timeSeries': {
+    key: [] for key in TIME_SERIES
+}}})
+MISSING = page({})
+
+
+def test_page_without_store_raises():
+    with pytest.raises(ValueError):
+        embedded.page_stores(HtmlResponse('https://finance.yahoo.com/quote/AAPL', body=b'<html></html>'))
+
+
+def test_summary():
+    assert embedded.summary(FULL) == {
+        'company_name': 'Apple Inc.',
+        'previous_close': 125.91,
+        'pe_ratio': 34.54,
+        'one_year_target_est': 151.75
+    }
+    for response in (EMPTY, MISSING):
+        assert embedded.summary(response) == {
+            'company_name': '', 'previous_close': None, 'pe_ratio': None, 'one_year_target_est': None
+        }
+
+
+def test_earnings_date():
+    assert embedded.earnings_date(FULL) == date(2021, 4, 28)
+    assert embedded.earnings_date(EMPTY) is None
+    assert embedded.earnings_date(MISSING) is None
+
+
+def test_statistics_keeps_the_raw_values():
+    statistics = embedded.statistics(FULL)
+
+    assert statistics['market_cap'] == 2135123456789
+    assert statistics['fwd_annual_dividend_yield'] == 0.0065
+    assert statistics['quarterly_earnings_growth'] == 0.293
+    assert statistics['ex_dividend_date'] == date(2021, 2, 5)
+    for response in (EMPTY, MISSING):
+        assert set(embedded.statistics(response).values()) == {None}
+
+
+def test_profile():
+    assert embedded.profile(FULL) == {'country': 'United States', 'sector': 'Technology'}
+    assert embedded.profile(MISSING) == {'country': None, 'sector': None}
+
+
+def test_holders():
+    assert embedded.holders(FULL) == {'vanguard_holder': True}
+    assert embedded.holders(EMPTY) == {'vanguard_holder': False}
+    assert embedded.holders(MISSING) == {'vanguard_holder': False}
+
+
+def test_income_statement_sorts_the_quarters_latest_first():
+    assert embedded.income_statement(FULL) == {
+        'TTM': {'date': 'ttm', 'total_revenue': 294135000000, 'net_income': 63930000000},
+        'Q1': {'date': '12/31/2020', 'total_revenue': 111439000000, 'net_income': 28755000000},
+        'Q2': {'date': '9/30/2020', 'total_revenue': 64698000000, 'net_income': 12673000000}
+    }
+    assert embedded.income_statement(EMPTY) == {}
+    assert embedded.income_statement(MISSING) == {}
+
+
+def test_balance_sheet():
+    assert embedded.balance_sheet(FULL) == {
+        'Q1': {'date': '12/31/2020', 'total_assets': 354054000000, 'total_liabilities': 287830000000,
+               'total_stockholders_equity': 66224000000}
+    }
+    assert embedded.balance_sheet(EMPTY) == {}
+    assert embedded.balance_sheet(MISSING) == {}
+
+
+def test_cash_flow_keeps_negative_figures_exact():
+    assert embedded.cash_flow(FULL) == {'net_change_in_cash': -10435123456, 'free_cash_flow': 80219000000}
+    assert embedded.cash_flow(EMPTY) == {'net_change_in_cash': None, 'free_cash_flow': None}
+    assert embedded.cash_flow(MISSING) == {'net_change_in_cash': None, 'free_cash_flow': None}
@@ -0,0 +1,135 @@
+from datetime import date
+
+import pytest
+from twisted.internet import defer, task
+
+from leovendo import exporters
+from leovendo.exporters import GoogleSheetItemExporter
+from leovendo.items import Component
+
+
+class FakeWorksheet:
+    def __init__(self):
+        self.batches = []
+        self.failures = 0
+
+    def append_rows(self, rows):
+        if self.failures:
+            self.failures -= 1
+            raise RuntimeError('RATE_LIMIT_EXCEEDED')
+        self.batches.append([row[1] for row in rows])
+
+
+class FakeClient:
+    """A gspread client whose spreadsheet has a single worksheet"""
+
+    def __init__(self, worksheet):
+        self.sheet = worksheet
+
+    def open(self, spreadsheet):
+        return self
+
+    def worksheet(self, name):
+        return self.sheet
+
+
+class FakeThreads:
+    """Runs the writes on the reactor thread, or holds them until ``finish`` while ``held``"""
+
+    def __init__(self):
+        self.held = False
+        self.calls = []
+
+    def deferToThread(self, func, *args, **kwargs):
+        if not self.held:
+            return defer.maybeDeferred(func, *args, **kwargs)
+        dfd = defer.Deferred()
+        self.calls.append((dfd, func, args, kwargs))
+        return dfd
+
+    def finish(self):
+        calls, self.calls = self.calls, []
+        for dfd, func, args, kwargs in calls:
+            defer.maybeDeferred(func, *args, **kwargs).chainDeferred(dfd)
+
+
+@pytest.fixture
+def threads(monkeypatch):
+    threads = FakeThreads()
+    monkeypatch.setattr(exporters, 'threads', threads)
+    return threads
+
+
+@pytest.fixture
+def clock():
+    return task.Clock()
+
+
+@pytest.fixture
+def worksheet():
+    return FakeWorksheet()
+
+
+def exporter_of(worksheet, clock, **kwargs):
+    exporter = GoogleSheetItemExporter('leovendo', 'components', client=FakeClient(worksheet), flush_interval=10,
+                                       **kwargs)
+    exporter.flush_loop.clock = clock
+    exporter.start_exporting()
+    return exporter
+
+
+def component(ticker):
+    return Component(ticker=ticker, date=date(2021, 4, 28), pe_ratio=20.0)
+
+
+def test_rows_are_appended_in_batches(threads, clock, worksheet):
+    exporter = exporter_of(worksheet, clock, batch_size=2)
+
+    for ticker in ('AAPL', 'MSFT', 'KO', 'PEP', 'V'):
+        exporter.export_item(component(ticker))
+
+    assert worksheet.batches == [['AAPL', 'MSFT'], ['KO', 'PEP']]
+    clock.advance(10)
+    assert worksheet.batches == [['AAPL', 'MSFT'], ['KO', 'PEP'], ['V']]
+
+
+def test_failed_batch_is_retried_with_the_next_flush(threads, clock, worksheet):
+    exporter = exporter_of(worksheet, clock, batch_size=2)
+    worksheet.failures = 1
+
+    exporter.export_item(component('AAPL'))
+    exporter.export_item(component('MSFT'))
+
+    assert worksheet.batches == []
+    assert len(exporter.rows) == 2
+    clock.advance(10)
+    assert worksheet.batches == [['AAPL', 'MSFT']]
+    assert exporter.rows == []
+
+
+def test_export_waits_while_the_buffer_is_full(threads, clock, worksheet):
+    exporter = exporter_of(worksheet, clock, batch_size=2, max_pending=3)
+    threads.held = True
+
+    exported = [exporter.export_item(component(ticker)) for ticker in ('AAPL', 'MSFT', 'KO', 'PEP', 'V')]
+
+    # AAPL and MSFT are being written, KO and PEP wait for them with V
+    assert [dfd.called for dfd in exported] == [True, True, True, True, False]
+    threads.finish()
+    assert exported[-1].called
+    assert worksheet.batches == [['AAPL', 'MSFT']]
+
+
+def test_finish_exporting_writes_every_buffered_row(threads, clock, worksheet):
+    exporter = exporter_of(worksheet, clock, batch_size=10)
+    threads.held = True
+    for ticker in ('AAPL', 'MSFT', 'KO'):
+        exporter.export_item(component(ticker))
+
+    finished = exporter.finish_exporting()
+
+    assert not exporter.flush_loop.running
+    assert not finished.called
+    threads.finish()
+    assert finished.called
+    assert worksheet.batches == [['AAPL', 'MSFT', 'KO']]
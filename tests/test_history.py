@@ -0,0 +1,66 @@
+import math
+from datetime import date
+
+from leovendo.history import SnapshotStore
+from leovendo.items import Component
+
+COLUMNS = ('pe_ratio', 'vanguard_holder')
+
+
+def test_snapshots_are_looked_up_by_ticker_and_day(tmp_path):
+    store = SnapshotStore(tmp_path, COLUMNS)
+    store.append([
+        Component(ticker='AAPL', date=date(2021, 4, 27), pe_ratio=10.0, vanguard_holder=True),
+        Component(ticker='MSFT', date=date(2021, 4, 27), pe_ratio=20.0)
+    ])
+    store.append([Component(ticker='AAPL', date=date(2021, 4, 28), pe_ratio=11.0)])
+
+    assert len(store) == 3
+    assert store.lookup('AAPL', date(2021, 4, 27)) == {'pe_ratio': 10.0, 'vanguard_holder': 1.0}
+    assert math.isnan(store.lookup('MSFT', date(2021, 4, 27))['vanguard_holder'])
+    assert store.lookup('AAPL', date(2021, 4, 29)) is None
+    assert store.lookup('KO', date(2021, 4, 27)) is None
+
+
+def test_snapshot_keeps_the_latest_row_of_each_ticker(tmp_path):
+    store = SnapshotStore(tmp_path, COLUMNS)
+    store.append([Component(ticker='AAPL', date=date(2021, 4, 27), pe_ratio=10.0)])
+    store.append([Component(ticker='MSFT', date=date(2021, 4, 28), pe_ratio=20.0)])
+    # AAPL exported twice on the 28th
+    store.append([Component(ticker='AAPL', date=date(2021, 4, 28), pe_ratio=11.0)])
+    store.append([Component(ticker='AAPL', date=date(2021, 4, 28), pe_ratio=12.0)])
+
+    assert list(store.snapshot(date(2021, 4, 28))['pe_ratio']) == [12.0, 20.0]
+    assert list(store.snapshot(date(2021, 4, 27))['pe_ratio'])[0] == 10.0
+    assert math.isnan(store.snapshot(date(2021, 4, 27))['pe_ratio'][1])
+    assert store.lookup('AAPL', date(2021, 4, 28))['pe_ratio'] == 12.0
+    assert list(store.latest()) == [True, True, False, True]
+
+
+def test_rows_appended_by_another_process_are_seen_once_refreshed(tmp_path):
+    reader = SnapshotStore(tmp_path, COLUMNS)
+    writer = SnapshotStore(tmp_path, COLUMNS)
+
+    writer.append([Component(ticker='AAPL', date=date(2021, 4, 28), pe_ratio=10.0)])
+    assert len(reader) == 0
+    reader.refresh()
+
+    assert reader.lookup('AAPL', date(2021, 4, 28))['pe_ratio'] == 10.0
+
+
+def test_column_added_later_is_missing_from_the_older_rows(tmp_path):
+    SnapshotStore(tmp_path, ('pe_ratio',)).append([Component(ticker='AAPL', date=date(2021, 4, 27), pe_ratio=10.0)])
+    store = SnapshotStore(tmp_path, COLUMNS)
+    store.append([Component(ticker='AAPL', date=date(2021, 4, 28), pe_ratio=11.0, vanguard_holder=True)])
+
+    assert math.isnan(store.lookup('AAPL', date(2021, 4, 27))['vanguard_holder'])
+    assert store.lookup('AAPL', date(2021, 4, 28))['vanguard_holder'] == 1.0
+
+
+def test_rows_between_finds_the_rows_within_a_range_of_values(tmp_path):
+    store = SnapshotStore(tmp_path, COLUMNS)
+    store.append([Component(ticker=ticker, date=date(2021, 4, 28), pe_ratio=pe_ratio)
+                  for ticker, pe_ratio in (('AAPL', 30.0), ('MSFT', 20.0), ('KO', None), ('PEP', 25.0))])
+
+    assert list(store.rows_between('pe_ratio', 20.0, 30.0, include_high=False)) == [1, 3]
+    assert list(store.rows_between('pe_ratio', low=25.0)) == [3, 0]
@@ -0,0 +1,124 @@
+import json
+import pickle
+import weakref
+
+from scrapy.http import HtmlResponse
+from scrapy.utils.request import request_from_dict
+
+from leovendo.http import SeleniumRequest
+from leovendo.middlewares import SeleniumMiddleware, SpiderExceptionHandler
+
+
+class FakeDriver:
+    current_url = 'https://finance.yahoo.com/quote/AAPL'
+    page_source = '<html><body>AAPL</body></html>'
+
+    def get(self, url):
+        self.current_url = url
+
+    def execute_script(self, script, *args):
+        return [1, 100]
+
+    def get_screenshot_as_png(self):
+        return b'PNG'
+
+
+def event(method, **params):
+    return {'message': json.dumps({'message': {'method': method, 'params': params}}), 'level': 'INFO'}
+
+
+class LoggingDriver(FakeDriver):
+    """A driver of Chrome, keeping the network events in its performance log"""
+
+    def __init__(self):
+        # the previous page was still loading a subresource
+        self.log = [event('Network.loadingFinished', requestId='0', encodedDataLength=5000)]
+
+    def get(self, url):
+        super().get(url)
+        self.log += [
+            event('Network.requestWillBeSent', requestId='1'),
+            event('Network.loadingFinished', requestId='1', encodedDataLength=20000),
+            # a cross-origin script, which the Resource Timing API reports as 0 bytes
+            event('Network.loadingFinished', requestId='2', encodedDataLength=300000),
+            event('Network.loadingFailed', requestId='3')
+        ]
+
+    def get_log(self, log_type):
+        entries, self.log = self.log, []
+        return entries
+
+
+def render(request, driver=None):
+    middleware = SeleniumMiddleware.__new__(SeleniumMiddleware)
+    middleware.blocklist = None
+    middleware.blocked = {}
+    middleware.unlogged = weakref.WeakSet()
+    middleware.page_load_strategy = 'normal'
+    middleware.stats = None
+    return middleware._render(driver or FakeDriver(), request)
+
+
+def test_render_captures_the_screenshot_when_requested():
+    assert render(SeleniumRequest(url='https://finance.yahoo.com/quote/AAPL', screenshot=True)).meta['screenshot'] == b'PNG'
+    assert 'screenshot' not in render(SeleniumRequest(url='https://finance.yahoo.com/quote/AAPL')).meta
+
+
+def test_render_sums_the_bytes_of_the_network_events_of_the_page():
+    page_load = render(SeleniumRequest(url='https://finance.yahoo.com/quote/AAPL'), LoggingDriver()).meta['page_load']
+
+    assert (page_load['requests'], page_load['bytes']) == (2, 320000)
+
+
+def test_render_falls_back_to_resource_timing_without_performance_log():
+    page_load = render(SeleniumRequest(url='https://finance.yahoo.com/quote/AAPL')).meta['page_load']
+
+    assert (page_load['requests'], page_load['bytes']) == (1, 100)
+
+
+class DevToolsDriver(FakeDriver):
+    """A local driver of Chrome, blocking subresources through DevTools"""
+
+    def __init__(self):
+        self.commands = []
+
+    def execute_cdp_cmd(self, command, arguments):
+        self.commands.append((command, arguments))
+
+
+def test_request_blocking_its_own_subresources_survives_the_disk_queues():
+    request = SeleniumRequest(url='https://finance.yahoo.com/quote/AAPL/holders', block=('*.png', '*doubleclick.net*'))
+    restored = request_from_dict(pickle.loads(pickle.dumps(request.to_dict())))
+    driver = DevToolsDriver()
+
+    render(restored, driver)
+
+    assert driver.commands[-1] == ('Network.setBlockedURLs', {'urls': ['*.png', '*doubleclick.net*']})
+
+
+def test_failing_callback_saves_the_screenshot_of_its_page(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    request = SeleniumRequest(url='https://finance.yahoo.com/quote/AAPL', meta={'screenshot': b'PNG'})
+    response = HtmlResponse(request.url, body=b'<html></html>', request=request)
+
+    assert SpiderExceptionHandler(None).process_spider_exception(response, ValueError(), object()) is None
+
+    screenshots = list((tmp_path / 'screenshots').iterdir())
+    assert [path.read_bytes() for path in screenshots] == [b'PNG']
+
+
+def test_failing_callback_completes_its_page(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+
+    class Spider:
+        def parse_failed(self, response, exception):
+            return [('failed', response.url, exception)]
+
+    request = SeleniumRequest(url='https://finance.yahoo.com/quote/AAPL')
+    response = HtmlResponse(request.url, body=b'<html></html>', request=request)
+    exception = ValueError()
+
+    assert SpiderExceptionHandler(None).process_spider_exception(response, exception, Spider()) == [
+        ('failed', request.url, exception)
+    ]
+    assert not (tmp_path / 'screenshots').exists()
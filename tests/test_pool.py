@@ -0,0 +1,127 @@
+from types import SimpleNamespace
+
+import pytest
+from scrapy.statscollectors import MemoryStatsCollector
+from scrapy.utils.test import get_crawler
+from twisted.internet import defer
+
+from leovendo import supervisor as supervisor_module
+from leovendo.pool import DriverPool
+from leovendo.supervisor import DriverSupervisor
+
+
+class FakeDriver:
+    quit_count = 0
+
+    def quit(self):
+        self.quit_count += 1
+
+
+@pytest.fixture
+def pool():
+    pool = DriverPool(FakeDriver, 1)
+    # the drivers are called on the reactor thread
+    pool.run = lambda func, *args, **kwargs: defer.maybeDeferred(func, *args, **kwargs)
+    yield pool
+    pool.close()
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    # the time of the supervisor, whose threads run on the reactor thread
+    clock = SimpleNamespace(now=0.0)
+    monkeypatch.setattr(supervisor_module, 'time', SimpleNamespace(monotonic=lambda: clock.now))
+    monkeypatch.setattr(supervisor_module, 'threads', SimpleNamespace(
+        deferToThread=lambda func, *args, **kwargs: defer.maybeDeferred(func, *args, **kwargs)
+    ))
+    return clock
+
+
+@pytest.fixture
+def stats():
+    return MemoryStatsCollector(get_crawler())
+
+
+def lease(pool):
+    leased = []
+    pool.acquire().addBoth(leased.append)
+    return leased
+
+
+def test_released_driver_is_reused(pool):
+    driver, = lease(pool)
+    pool.release(driver)
+
+    assert lease(pool) == [driver]
+    assert pool.exhausted
+
+
+def test_exhausted_pool_hands_the_released_driver_to_the_first_waiting_lease(pool):
+    driver, = lease(pool)
+    first, second = lease(pool), lease(pool)
+    assert first == second == []
+
+    pool.release(driver)
+    assert first == [driver] and second == []
+    pool.release(driver)
+    assert second == [driver]
+    assert pool.leased == {driver} and not pool.idle
+
+
+def test_discarded_driver_frees_its_slot_for_a_waiting_lease(pool):
+    driver, = lease(pool)
+    waiting = lease(pool)
+
+    pool.discard(driver)
+
+    assert driver.quit_count == 1
+    assert len(waiting) == 1 and waiting[0] is not driver
+    assert pool.leased == {waiting[0]}
+
+
+def test_cancelled_lease_stops_waiting(pool):
+    driver, = lease(pool)
+    waiter = pool.acquire()
+    waiter.addErrback(lambda failure: failure.trap(defer.CancelledError))
+
+    waiter.cancel()
+    pool.release(driver)
+
+    assert pool.waiters == [] and pool.idle == [driver]
+
+
+def test_supervisor_recycles_a_driver_after_max_pages(pool, clock, stats):
+    supervisor = DriverSupervisor(pool, stats, max_pages=2)
+    driver, = lease(pool)
+    supervisor.rendered(driver)
+    supervisor.release(driver)
+    assert lease(pool) == [driver]
+
+    supervisor.rendered(driver)
+    supervisor.release(driver)
+
+    assert driver.quit_count == 1
+    assert lease(pool) != [driver]
+    assert stats.get_value('selenium/driver/restarts/pages') == 1
+    assert stats.get_value('selenium/driver/0/restarts') == 1
+
+
+def test_supervisor_kills_a_hung_driver(pool, clock, stats):
+    supervisor = DriverSupervisor(pool, stats, hang_timeout=60)
+    driver, = lease(pool)
+    # chromedriver never answers
+    call = supervisor.run(driver, defer.Deferred)
+
+    clock.now = 30.0
+    supervisor.check()
+    assert not supervisor.killed(driver)
+    clock.now = 61.0
+    supervisor.check()
+    assert supervisor.killed(driver)
+    assert stats.get_value('selenium/driver/hung') == 1
+
+    call.cancel()
+    call.addErrback(lambda failure: failure.trap(defer.CancelledError))
+    supervisor.release(driver)
+    assert driver.quit_count == 1
+    assert stats.get_value('selenium/driver/restarts/hung') == 1
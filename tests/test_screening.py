@@ -0,0 +1,59 @@
+from datetime import date
+
+import pytest
+
+from leovendo.history import SnapshotStore
+from leovendo.items import Component
+from leovendo.screening import parse_filter, screen
+
+COLUMNS = ('pe_ratio', 'vanguard_holder', 'fwd_annual_dividend_yield')
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = SnapshotStore(tmp_path, COLUMNS)
+    store.append([
+        Component(ticker='AAPL', date=date(2021, 4, 27), pe_ratio=10.0, vanguard_holder=True),
+        Component(ticker='MSFT', date=date(2021, 4, 27), pe_ratio=20.0, vanguard_holder=True),
+        Component(ticker='KO', date=date(2021, 4, 27), pe_ratio=12.0, vanguard_holder=False,
+                  fwd_annual_dividend_yield=0.03)
+    ])
+    # AAPL was exported twice on the 28th, the second export is kept
+    store.append([Component(ticker='AAPL', date=date(2021, 4, 28), pe_ratio=11.0, vanguard_holder=True)])
+    store.append([Component(ticker='AAPL', date=date(2021, 4, 28), pe_ratio=16.0, vanguard_holder=True)])
+    return store
+
+
+def filters(store, *texts):
+    return [parse_filter(text, store.columns) for text in texts]
+
+
+def tickers(store, rows):
+    return [(store.tickers[store.ticker_ids[row]], date.fromordinal(int(store.days[row]))) for row in rows]
+
+
+def test_parse_filter_reads_displayed_values(store):
+    assert parse_filter('fwd_annual_dividend_yield > 2%', store.columns).value == pytest.approx(0.02)
+    assert parse_filter('vanguard_holder = yes', store.columns).value == 1.0
+    with pytest.raises(ValueError):
+        parse_filter('pe < 15', store.columns)
+    with pytest.raises(ValueError):
+        parse_filter('pe_ratio < cheap', store.columns)
+
+
+def test_screen_matches_the_latest_snapshot_of_each_ticker(store):
+    assert tickers(store, screen(store, filters(store, 'pe_ratio < 15'), date(2021, 4, 27))) == [
+        ('AAPL', date(2021, 4, 27)), ('KO', date(2021, 4, 27))
+    ]
+    assert tickers(store, screen(store, filters(store, 'pe_ratio < 15', 'vanguard_holder = yes'),
+                                 date(2021, 4, 28))) == []
+    assert tickers(store, screen(store, filters(store, 'pe_ratio < 13', 'vanguard_holder = no'),
+                                 date(2021, 4, 28))) == [('KO', date(2021, 4, 27))]
+    assert tickers(store, screen(store, filters(store, 'pe_ratio < 15'), date(2021, 5, 28), within=7)) == []
+
+
+def test_screen_since_keeps_the_latest_row_of_a_day(store):
+    assert tickers(store, screen(store, filters(store, 'pe_ratio < 15'), date(2021, 4, 28), date(2021, 4, 1))) == [
+        ('AAPL', date(2021, 4, 27)), ('KO', date(2021, 4, 27))
+    ]
+    assert tickers(store, screen(store, [], date(2021, 4, 28), date(2021, 4, 28))) == [('AAPL', date(2021, 4, 28))]
@@ -0,0 +1,47 @@
+import json
+
+import pyarrow.parquet as pq
+
+from leovendo.exporters import ParquetItemExporter
+from leovendo.items import Component
+from leovendo.sharding import merge_shards, shard_of
+
+
+def export(path, items, universe=False):
+    exporter = ParquetItemExporter(path, universe=universe)
+    exporter.start_exporting()
+    for item in items:
+        exporter.export_item(item)
+    exporter.finish_exporting()
+
+
+def test_merge_shards_reports_the_pages_missing_from_each_row(tmp_path):
+    partition = tmp_path / 'date=2021-04-28'
+    partition.mkdir()
+    # the values legitimately missing, e.g. the forward P/E, do not make a row incomplete
+    export(partition / 'shard-0.parquet', [Component(ticker='AAPL', pe_ratio=34.5, missing_pages=[])])
+    export(partition / 'shard-1.parquet', [Component(ticker='MSFT', missing_pages=['balance_sheet', 'holders'])])
+
+    report = merge_shards(partition, tmp_path / 'merged.parquet', ['AAPL', 'MSFT', 'KO'], 2)
+
+    assert report['incomplete'] == {'MSFT': ['balance_sheet', 'holders']}
+    assert report['missing'] == ['KO']
+    assert not report['complete']
+    assert report['shards'][shard_of('KO', 2)]['missing'] == ['KO']
+    assert json.loads((tmp_path / 'merged.report.json').read_text())['incomplete'] == report['incomplete']
+
+
+def test_merge_shards_keeps_the_rows_of_the_file_exported_last(tmp_path):
+    partition = tmp_path / 'date=2021-04-28'
+    partition.mkdir()
+    # a shard run again after a full run of the universe, whose file name sorts first
+    export(partition / 'yahoo_finance-093000.parquet',
+           [Component(ticker='AAPL', pe_ratio=30.0), Component(ticker='MSFT', pe_ratio=35.0)], universe=True)
+    export(partition / 'yahoo_finance-shard0of2-080000.parquet', [Component(ticker='AAPL', pe_ratio=31.0)])
+
+    report = merge_shards(partition, tmp_path / 'merged.parquet', ['AAPL', 'MSFT'], 2)
+    rows = {row['ticker']: row for row in pq.read_table(tmp_path / 'merged.parquet').to_pylist()}
+
+    assert report['duplicates'] == 1
+    assert rows['AAPL']['pe_ratio'] == 31.0
+    assert rows['MSFT']['pe_ratio_rank'] == 1.0
@@ -0,0 +1,58 @@
+import pytest
+
+from leovendo.workqueue import WorkQueue
+
+
+@pytest.fixture
+def queue(tmp_path):
+    queue = WorkQueue(tmp_path / 'queue.sqlite', lease_timeout=300)
+    queue.fill(['AAPL', 'MSFT', 'KO'])
+    yield queue
+    queue.close()
+
+
+def test_tickers_are_leased_once(queue):
+    assert queue.lease('worker-1', 2, now=1000) == ['AAPL', 'MSFT']
+    assert queue.lease('worker-2', 2, now=1000) == ['KO']
+    assert queue.lease('worker-2', 2, now=1000) == []
+    assert queue.counts() == {'leased': 3}
+
+
+def test_expired_lease_goes_to_another_worker(queue):
+    queue.lease('worker-1', 2, now=1000)
+    queue.complete('AAPL', 'worker-1')
+
+    # worker-1 crashed before its lease on MSFT expired
+    assert queue.lease('worker-2', 3, now=1200) == ['KO']
+    assert queue.lease('worker-2', 3, now=1301) == ['MSFT']
+    queue.complete('MSFT', 'worker-1')
+    assert queue.counts() == {'done': 1, 'leased': 2}
+
+
+def test_renewed_lease_does_not_expire(queue):
+    queue.lease('worker-1', 3, now=1000)
+
+    assert queue.renew('worker-1', now=1200) == 3
+    assert queue.lease('worker-2', 3, now=1301) == []
+
+
+def test_released_tickers_are_queued_again(queue):
+    queue.lease('worker-1', 2, now=1000)
+    queue.complete('AAPL', 'worker-1')
+    queue.release('worker-1')
+
+    assert queue.counts() == {'done': 1, 'pending': 2}
+    # the tickers leased fewer times come first
+    assert queue.lease('worker-2', 1, now=1000) == ['KO']
+    assert queue.unfinished()
+
+
+def test_fill_keeps_the_progress_unless_reset(queue):
+    for ticker in queue.lease('worker-1', 3, now=1000):
+        queue.complete(ticker, 'worker-1')
+    assert not queue.unfinished()
+
+    queue.fill(['AAPL', 'PEP'])
+    assert queue.counts() == {'done': 3, 'pending': 1}
+    queue.fill(['AAPL', 'PEP'], reset=True)
+    assert queue.counts() == {'pending': 2}